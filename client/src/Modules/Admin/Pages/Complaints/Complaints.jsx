@@ -6,7 +6,9 @@ import "react-toastify/dist/ReactToastify.css";
 
 const Complaints = () => {
   const [complaints, setComplaints] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [error, setError] = useState("");
 
   const API_URL = `/complaints/`; // ✅ base handled by API instance
@@ -16,7 +18,8 @@ const Complaints = () => {
     try {
       setLoading(true);
       const response = await API.get(API_URL);
-      setComplaints(response.data);
+      setComplaints(response.data.results);
+      setNextCursor(cursorFrom(response.data.next));
       setError("");
     } catch (err) {
       console.error(err);
@@ -27,6 +30,25 @@ const Complaints = () => {
     }
   };
 
+  // 🔹 Next page (the API returns a full URL; only its cursor is needed)
+  const cursorFrom = (next) =>
+    next ? new URL(next).searchParams.get("cursor") : null;
+
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await API.get(API_URL, { params: { cursor: nextCursor } });
+      setComplaints((prev) => [...prev, ...response.data.results]);
+      setNextCursor(cursorFrom(response.data.next));
+    } catch (err) {
+      console.error(err);
+      toast.error("❌ Failed to load complaints!");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   // 🔹 Delete complaint
   const handleDelete = async (id) => {
     try {
@@ -144,6 +166,18 @@ const Complaints = () => {
           </table>
         </div>
       )}
+
+      {nextCursor && (
+        <div className="flex justify-center mt-6">
+          <button
+            disabled={loadingMore}
+            onClick={loadMore}
+            className="px-5 py-2 bg-blue-600 text-white text-sm rounded hover:bg-blue-700 disabled:opacity-60"
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
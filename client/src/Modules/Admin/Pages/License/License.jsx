@@ -8,7 +8,9 @@ export default function LicenseAdmin() {
   const API_URL = `/license/`;
 
   const [licenses, setLicenses] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [processing, setProcessing] = useState(false);
   const [deleteTarget, setDeleteTarget] = useState(null);
 
@@ -16,7 +18,8 @@ export default function LicenseAdmin() {
   const fetchLicenses = async () => {
     try {
       const res = await API.get(API_URL);
-      setLicenses(res.data);
+      setLicenses(res.data.results);
+      setNextCursor(res.data.next);
       setLoading(false);
     } catch (err) {
       setLoading(false);
@@ -24,6 +27,20 @@ export default function LicenseAdmin() {
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const res = await API.get(API_URL, { params: { after: nextCursor } });
+      setLicenses((prev) => [...prev, ...res.data.results]);
+      setNextCursor(res.data.next);
+    } catch (err) {
+      toast.error("❌ Failed to fetch licenses", { className: "toast-error" });
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchLicenses();
   }, []);
@@ -231,6 +248,18 @@ export default function LicenseAdmin() {
         </div>
       )}
 
+      {nextCursor && (
+        <div className="flex justify-center mt-8">
+          <button
+            disabled={loadingMore}
+            onClick={loadMore}
+            className="px-5 py-2 text-white text-sm rounded-lg bg-gradient-to-r from-[#0033A0] via-[#D62828] to-black hover:opacity-90 disabled:opacity-60"
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
+
       {/* Delete Confirmation */}
       {deleteTarget && (
         <div className="fixed inset-0 bg-black/50 flex items-center justify-center z-50">
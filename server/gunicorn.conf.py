@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+"""
+Gunicorn hooks, loaded automatically from the working directory.
+
+Only used for Prometheus multiprocess mode (see putsf_backend/metrics.py):
+when ``PROMETHEUS_MULTIPROC_DIR`` is set, the directory is emptied when
+the master starts, and a dead worker's live gauges are dropped.
+"""
+import os
+import shutil
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+BASE_DIR = Path(__file__).resolve().parent
+load_dotenv(BASE_DIR / ".env")
+load_dotenv(BASE_DIR / ".env.local", override=True)
+
+
+def on_starting(server):
+    path = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        # Samples left by a previous run would be added to this one's
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,14 +1,18 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from putsf_backend.throttling import IPTokenBucket, ThrottleMixin
 from .serializers import AdminLoginSerializer
 
-class AdminLoginAPIView(APIView):
+class AdminLoginAPIView(ThrottleMixin, APIView):
     """
     POST /api/admin/login/
     Request: { "email": "...", "password": "..." }
     Response: { "refresh": "...", "access": "...", "user": { ... } }
     """
+    throttle_classes = [IPTokenBucket]
+    throttle_scope = "admin_login"
+
     def post(self, request):
         serializer = AdminLoginSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'putsf_backend.settings')
 
 application = get_asgi_application()
+
+# Background threads (server processes only)
+from putsf_backend import background  # noqa: E402
+
+background.start()
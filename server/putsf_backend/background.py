@@ -0,0 +1,30 @@
+# putsf_backend/background.py
+"""
+Background threads that only server processes need.
+
+``start()`` is called from wsgi.py and asgi.py, which only gunicorn
+workers and ``runserver`` import. It is not called from
+``AppConfig.ready()``, because that also runs for ``migrate``, ``shell``
+and every other one-shot management command. Each thread's own
+``start()`` checks the pid, so a forked worker gets fresh threads the
+first time it uses them.
+"""
+
+
+def start():
+    from django.conf import settings
+
+    from putsf_backend import mongo
+    from putsf_backend.complaints import outbox
+    from putsf_backend.core import indexes
+    from putsf_backend.license import phones
+
+    if settings.MONGO_WARM_UP:
+        mongo.warm_up_in_background()
+    # Optional: reconcile Mongo indexes when the server starts
+    if settings.MONGO_ENSURE_INDEXES:
+        indexes.ensure_indexes_in_background()
+    # Sync complaints queued before this process started
+    outbox.start()
+    # Load the phone registry before the first check_phone
+    phones.start()
@@ -1,3 +1,88 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from bson import ObjectId
+
+from putsf_backend.testing import MongoTestCase
+
+
+class BannerListingCacheTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.banner_id = self.db.banners.insert_one(
+            {"image_url": "http://testserver/media/a.jpg", "created_at": "2024-01-01T00:00:00"}
+        ).inserted_id
+
+    def listed_ids(self):
+        response = self.client.get("/api/banners/")
+        self.assertEqual(response.status_code, 200)
+        return [banner["_id"] for banner in response.json()]
+
+    def test_listing_is_served_from_cache(self):
+        self.assertEqual(self.listed_ids(), [str(self.banner_id)])
+        # Written behind the views' back: not visible until the next invalidation
+        self.db.banners.insert_one({"image_url": "http://testserver/media/b.jpg", "created_at": "2024-01-02T00:00:00"})
+        self.assertEqual(self.listed_ids(), [str(self.banner_id)])
+
+    def test_delete_invalidates_listing(self):
+        other_id = self.db.banners.insert_one(
+            {"image_url": "http://testserver/media/b.jpg", "created_at": "2024-01-02T00:00:00"}
+        ).inserted_id
+        self.assertEqual(self.listed_ids(), [str(other_id), str(self.banner_id)])
+
+        response = self.client.delete(f"/api/banners/{other_id}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.listed_ids(), [str(self.banner_id)])
+
+    def test_missing_banner(self):
+        response = self.client.delete(f"/api/banners/{ObjectId()}/")
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.banner_id = self.db.banners.insert_one(
+            {"image_url": "http://testserver/media/a.jpg", "created_at": "2024-01-01T00:00:00"}
+        ).inserted_id
+
+    def test_validators_on_200(self):
+        response = self.client.get("/api/banners/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].startswith('"banners-'))
+        self.assertIn("Last-Modified", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertIn("public", response["Cache-Control"])
+
+    def test_matching_etag_gets_304_without_mongo(self):
+        etag = self.client.get("/api/banners/")["ETag"]
+        with mock.patch("putsf_backend.banner.views.get_collection") as get_collection:
+            response = self.client.get("/api/banners/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        get_collection.assert_not_called()
+
+    def test_if_modified_since_gets_304(self):
+        last_modified = self.client.get("/api/banners/")["Last-Modified"]
+        response = self.client.get("/api/banners/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get("/api/banners/")["ETag"]
+        self.client.delete(f"/api/banners/{self.banner_id}/")
+        response = self.client.get("/api/banners/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json(), [])
+
+    def test_etag_depends_on_path(self):
+        listing = self.client.get("/api/banners/")["ETag"]
+        detail = self.client.get(f"/api/banners/{self.banner_id}/")
+        self.assertEqual(detail.status_code, 200)
+        self.assertNotEqual(detail["ETag"], listing)
+        response = self.client.get(f"/api/banners/{self.banner_id}/", HTTP_IF_NONE_MATCH=listing)
+        self.assertEqual(response.status_code, 200)
+
+    def test_errors_have_no_validators(self):
+        response = self.client.get(f"/api/banners/{ObjectId()}/")
+        self.assertEqual(response.status_code, 404)
+        self.assertNotIn("ETag", response)
@@ -0,0 +1,7 @@
+from pymongo import DESCENDING, IndexModel
+
+MONGO_INDEXES = {
+    "blog_posts": [
+        IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+    ],
+}
@@ -2,34 +2,36 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.conf import settings
 from django.utils import timezone
-from putsf_backend.mongo import db
+from putsf_backend.mongo import get_collection
+from putsf_backend.cache import read_through, invalidate, conditional
+from putsf_backend import images, media
+from putsf_backend.uploads import UploadLimitMixin, UploadLimits
 from bson.objectid import ObjectId
-import os
 
 
-class BlogPostAPIView(APIView):
+class BlogPostAPIView(UploadLimitMixin, APIView):
     parser_classes = (MultiPartParser, FormParser)
+    upload_limits = UploadLimits("blog")
 
+    @conditional("blog_posts")
     def get(self, request, post_id=None):
         """
         GET all posts or a single post by ID
         """
-        posts_collection = db["blog_posts"]
+        posts_collection = get_collection("blog_posts")
 
         try:
             if post_id:
                 post = posts_collection.find_one({"_id": ObjectId(post_id)})
                 if not post:
                     return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
-                post["_id"] = str(post["_id"])
                 return Response(post)
             else:
-                posts = list(posts_collection.find({}).sort("created_at", -1))
-                for post in posts:
-                    post["_id"] = str(post["_id"])
-                return Response(posts)
+                def load():
+                    return list(posts_collection.find({}).sort("created_at", -1))
+
+                return Response(read_through("blog_posts", load))
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -37,7 +39,7 @@ class BlogPostAPIView(APIView):
         """
         Create a new blog post
         """
-        posts_collection = db["blog_posts"]
+        posts_collection = get_collection("blog_posts")
 
         title = request.data.get("title")
         subtitle = request.data.get("subtitle")
@@ -48,21 +50,15 @@ class BlogPostAPIView(APIView):
         if not title or not content or not image_file:
             return Response({"error": "Title, content, and image are required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Save image to media/blog/
-        media_dir = os.path.join(settings.MEDIA_ROOT, "blog")
-        os.makedirs(media_dir, exist_ok=True)
-        file_path = os.path.join(media_dir, image_file.name)
-
+        # Save image to the shared blob store
+        post_id = ObjectId()
         try:
-            with open(file_path, "wb+") as f:
-                for chunk in image_file.chunks():
-                    f.write(chunk)
+            file_path, image_url = media.store(image_file, media.owner("blog_posts", post_id))
         except Exception as e:
             return Response({"error": f"Failed to save image: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        image_url = request.build_absolute_uri(f"/media/blog/{image_file.name}")
-
         post_data = {
+            "_id": post_id,
             "title": title,
             "subtitle": subtitle,
             "content": content,
@@ -72,6 +68,8 @@ class BlogPostAPIView(APIView):
         }
 
         result = posts_collection.insert_one(post_data)
+        invalidate("blog_posts")
+        images.schedule("blog_posts", result.inserted_id, file_path, image_url)
         post_data["_id"] = str(result.inserted_id)
 
         return Response({"message": "Blog post created successfully!", "post": post_data}, status=status.HTTP_201_CREATED)
@@ -80,7 +78,7 @@ class BlogPostAPIView(APIView):
         """
         PATCH: Partially update blog post (title, subtitle, content, status, image)
         """
-        posts_collection = db["blog_posts"]
+        posts_collection = get_collection("blog_posts")
 
         try:
             obj_id = ObjectId(post_id)
@@ -107,31 +105,28 @@ class BlogPostAPIView(APIView):
         if status_post in ["draft", "published"]:
             update_data["status"] = status_post
 
+        if not update_data and not image_file:
+            return Response({"error": "No valid fields to update"}, status=status.HTTP_400_BAD_REQUEST)
+
         # Handle new image upload
+        owner = media.owner("blog_posts", obj_id)
+        old_image_url = post.get("image_url")
+        replaced = False
         if image_file:
-            media_dir = os.path.join(settings.MEDIA_ROOT, "blog")
-            os.makedirs(media_dir, exist_ok=True)
-            file_path = os.path.join(media_dir, image_file.name)
-
-            with open(file_path, "wb+") as f:
-                for chunk in image_file.chunks():
-                    f.write(chunk)
-
-            full_url = request.build_absolute_uri(f"/media/blog/{image_file.name}")
+            file_path, full_url = media.store(image_file, owner)
             update_data["image_url"] = full_url
-
-            # Remove old image if different
-            old_image_url = post.get("image_url")
-            if old_image_url and old_image_url != full_url:
-                filename = os.path.basename(old_image_url)
-                old_file_path = os.path.join(settings.MEDIA_ROOT, "blog", filename)
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-
-        if not update_data:
-            return Response({"error": "No valid fields to update"}, status=status.HTTP_400_BAD_REQUEST)
+            replaced = full_url != old_image_url
+            if replaced:
+                update_data["image_variants"] = None
 
         posts_collection.update_one({"_id": obj_id}, {"$set": update_data})
+        invalidate("blog_posts")
+
+        # Release the old image only once the post points at the new one
+        if replaced:
+            images.schedule("blog_posts", obj_id, file_path, full_url)
+            if old_image_url:
+                media.release(old_image_url, owner)
 
         post.update(update_data)
         post["_id"] = str(post["_id"])
@@ -142,7 +137,7 @@ class BlogPostAPIView(APIView):
         """
         DELETE a blog post by ID
         """
-        posts_collection = db["blog_posts"]
+        posts_collection = get_collection("blog_posts")
 
         try:
             obj_id = ObjectId(post_id)
@@ -153,12 +148,8 @@ class BlogPostAPIView(APIView):
         if not post:
             return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        image_url = post.get("image_url")
-        if image_url:
-            filename = os.path.basename(image_url)
-            file_path = os.path.join(settings.MEDIA_ROOT, "blog", filename)
-            if os.path.exists(file_path):
-                os.remove(file_path)
-
         posts_collection.delete_one({"_id": obj_id})
+        invalidate("blog_posts")
+        if post.get("image_url"):
+            media.release(post["image_url"], media.owner("blog_posts", obj_id))
         return Response({"message": "Blog post deleted successfully!"}, status=status.HTTP_200_OK)
@@ -0,0 +1,102 @@
+# putsf_backend/cache.py
+"""
+Read-through cache and conditional GET support for Mongo-backed views.
+
+Every collection has a version stamp kept in the cache: a nanosecond
+timestamp that ``invalidate(collection)`` moves forward on each write.
+Cached listings are namespaced by it, so a write makes every cached entry
+for that collection unreachable at once (they simply expire later), and
+``conditional(collection)`` derives the ETag / Last-Modified headers from
+it so unchanged resources are answered with 304 without touching Mongo.
+
+Use a shared backend (file or external) when running more than one
+worker, otherwise an invalidation only reaches its own process.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from putsf_backend import metrics
+
+_MISSING = object()
+
+
+def _cache():
+    return caches[settings.LISTING_CACHE_ALIAS]
+
+
+def _version_key(collection):
+    return f"listing:{collection}:version"
+
+
+def version(collection):
+    """Current version stamp (ns since the epoch) of ``collection``."""
+    cache = _cache()
+    value = cache.get(_version_key(collection))
+    if value is None:
+        # Unknown (first use or evicted): start a new version now
+        cache.add(_version_key(collection), time.time_ns(), timeout=None)
+        value = cache.get(_version_key(collection), time.time_ns())
+    return value
+
+
+def read_through(collection, loader, key="list"):
+    """Return the cached value for ``key`` or compute it with ``loader()``."""
+    cache = _cache()
+    cache_key = f"listing:{collection}:{version(collection)}:{key}"
+    value = cache.get(cache_key, _MISSING)
+    metrics.cache_result("listing", value is not _MISSING)
+    if value is _MISSING:
+        value = loader()
+        cache.set(cache_key, value, settings.LISTING_CACHE_TTL)
+    return value
+
+
+def invalidate(collection):
+    """Move ``collection`` to a new version (call after each write)."""
+    cache = _cache()
+    current = cache.get(_version_key(collection)) or 0
+    cache.set(_version_key(collection), max(time.time_ns(), current + 1), timeout=None)
+
+
+def conditional(collection, private=False):
+    """
+    Decorate an APIView/ViewSet ``get``/``list`` with ETag / Last-Modified
+    validators derived from ``collection``'s version stamp.
+
+    ``If-None-Match`` / ``If-Modified-Since`` hits return 304 before the view
+    runs. The ETag also covers the full path and ``Accept`` header, because
+    those select a different representation of the same collection state.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            stamp = version(collection)
+            variant = hashlib.md5(
+                f"{request.get_full_path()}|{request.META.get('HTTP_ACCEPT', '')}".encode()
+            ).hexdigest()[:12]
+            etag = quote_etag(f"{collection}-{stamp:x}-{variant}")
+            last_modified = stamp // 1_000_000_000
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            metrics.cache_result("conditional", response is not None)
+            if response is None:
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+
+            response["ETag"] = etag
+            response["Last-Modified"] = http_date(last_modified)
+            # Let browsers keep the body but revalidate it on every use
+            if private:
+                patch_cache_control(response, no_cache=True, private=True)
+            else:
+                patch_cache_control(response, no_cache=True, public=True)
+            return response
+        return wrapper
+    return decorator
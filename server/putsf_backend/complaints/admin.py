@@ -2,10 +2,16 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import Complaint
+from .models import Complaint, ComplaintOutbox
 
 @admin.register(Complaint)
 class ComplaintAdmin(admin.ModelAdmin):
     list_display = ("name", "phone", "message", "created_at")
     search_fields = ("name", "phone", "message")
     list_filter = ("created_at",)
+
+
+@admin.register(ComplaintOutbox)
+class ComplaintOutboxAdmin(admin.ModelAdmin):
+    list_display = ("complaint", "attempts", "next_attempt_at", "last_error", "created_at")
+    readonly_fields = ("complaint", "attempts", "created_at", "last_error")
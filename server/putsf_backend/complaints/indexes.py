@@ -0,0 +1,14 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+MONGO_INDEXES = {
+    "complaints": [
+        IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+        # Outbox idempotency; documents synced before the outbox have no sqlite_id
+        IndexModel(
+            [("sqlite_id", ASCENDING)],
+            name="sqlite_id_unique",
+            unique=True,
+            partialFilterExpression={"sqlite_id": {"$exists": True}},
+        ),
+    ],
+}
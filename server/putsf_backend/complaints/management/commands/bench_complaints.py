@@ -0,0 +1,116 @@
+import datetime
+import random
+import statistics
+import time
+from urllib.parse import parse_qs, urlparse
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+
+from putsf_backend.complaints.models import Complaint
+from putsf_backend.complaints.serializers import ComplaintSerializer
+from putsf_backend.complaints.views import ComplaintViewSet
+
+NAMES = ("Ravi", "Priya", "Arun", "Divya", "Karthik", "Meena", "Suresh", "Lakshmi", "Vijay", "Anitha")
+
+
+class _Rollback(Exception):
+    pass
+
+
+def _complaints(start, count, now):
+    """Synthetic complaints spread over three years, newest last."""
+    rng = random.Random(start)
+    for i in range(start, start + count):
+        name = f"{rng.choice(NAMES)} {i:06d}"
+        yield Complaint(
+            name=name,
+            search_name=name.lower(),
+            phone=f"9{rng.randrange(10 ** 9):09d}",
+            message="Street light not working near the bus stand. " * 3,
+            created_at=now - datetime.timedelta(minutes=(10 ** 6 - i) * 1.5),
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the complaints list endpoint as the table grows. Rows are inserted inside a "
+        "transaction that is rolled back, so the database is left as it was."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,10000,100000,300000", help="Table sizes to measure at.")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed requests per scenario.")
+        parser.add_argument(
+            "--baseline-max", type=int, default=20000,
+            help="Also time the old unpaginated list up to this many rows.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options["sizes"].split(",") if s.strip())
+        self.view = ComplaintViewSet.as_view({"get": "list"})
+        self.factory = APIRequestFactory(SERVER_NAME="localhost")
+        self.repeat = options["repeat"]
+
+        try:
+            with transaction.atomic():
+                self._run(sizes, options["baseline_max"])
+                raise _Rollback()
+        except _Rollback:
+            pass
+
+    def _run(self, sizes, baseline_max):
+        now = timezone.now()
+        field = Complaint._meta.get_field("created_at")
+        inserted = 0
+        for size in sizes:
+            # bulk_create would overwrite the synthetic dates with now()
+            field.auto_now_add = False
+            try:
+                Complaint.objects.bulk_create(_complaints(inserted, size - inserted, now), batch_size=5000)
+            finally:
+                field.auto_now_add = True
+            inserted = size
+
+            sample = Complaint.objects.order_by("id")[size // 2]
+            since = sample.created_at - datetime.timedelta(days=7)
+            scenarios = (
+                ("first page", {}),
+                ("page 20", {"cursor": self._cursor_after_pages(19)}),
+                ("phone", {"phone": sample.phone}),
+                ("date range", {"since": since.isoformat(), "until": sample.created_at.isoformat()}),
+                ("name search", {"search": sample.name[:-2].lower()}),
+            )
+
+            self.stdout.write(f"{size} complaints")
+            for label, params in scenarios:
+                self._report(label, lambda: self._get(params))
+            if size <= baseline_max:
+                self._report("unpaginated (old)", self._unpaginated)
+
+    def _get(self, params):
+        response = self.view(self.factory.get("/api/complaints/", params))
+        response.render()
+        return response
+
+    def _cursor_after_pages(self, pages):
+        cursor = None
+        for _ in range(pages):
+            response = self._get({"cursor": cursor} if cursor else {})
+            cursor = parse_qs(urlparse(response.data["next"]).query)["cursor"][0]
+        return cursor
+
+    def _unpaginated(self):
+        return ComplaintSerializer(Complaint.objects.all(), many=True).data
+
+    def _report(self, label, call):
+        timings = []
+        for _ in range(self.repeat):
+            started = time.perf_counter()
+            call()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"  {label:<18} median {statistics.median(timings):8.2f} ms   max {max(timings):8.2f} ms"
+        )
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from putsf_backend.complaints import outbox
+from putsf_backend.complaints.models import ComplaintOutbox
+
+
+class Command(BaseCommand):
+    help = "Copy complaints waiting in the outbox to MongoDB."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Complaints per insert_many.")
+        parser.add_argument(
+            "--retry-now", action="store_true", help="Retry failed complaints now instead of after their backoff.",
+        )
+
+    def handle(self, *args, **options):
+        from putsf_backend.mongo import get_collection
+
+        if get_collection(outbox.COLLECTION) is None:
+            raise CommandError("MongoDB not connected")
+        if options["retry_now"]:
+            ComplaintOutbox.objects.update(next_attempt_at=timezone.now())
+
+        started = time.perf_counter()
+        synced = outbox.drain_all(options["batch_size"])
+        elapsed = time.perf_counter() - started
+
+        failing = ComplaintOutbox.objects.filter(attempts__gt=0)
+        for row in failing[:20]:
+            self.stderr.write(self.style.ERROR(f"complaint {row.complaint_id} ({row.attempts} attempts): {row.last_error}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{synced} synced in {elapsed:.1f}s, {ComplaintOutbox.objects.count()} still queued "
+            f"({failing.count()} failing)"
+        ))
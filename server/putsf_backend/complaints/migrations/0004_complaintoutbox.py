@@ -0,0 +1,29 @@
+# Generated by Django 3.1.12 on 2026-10-18 13:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0003_auto_20251108_0616'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ComplaintOutbox',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('next_attempt_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True)),
+                ('complaint', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outbox', to='complaints.complaint')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 3.1.12 on 2026-10-18 13:19
+
+from django.db import migrations, models
+
+
+def fill_search_name(apps, schema_editor):
+    Complaint = apps.get_model("complaints", "Complaint")
+    batch = []
+    for complaint in Complaint.objects.only("id", "name").iterator(chunk_size=2000):
+        complaint.search_name = complaint.name.lower()
+        batch.append(complaint)
+        if len(batch) >= 2000:
+            Complaint.objects.bulk_update(batch, ["search_name"])
+            batch = []
+    Complaint.objects.bulk_update(batch, ["search_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('complaints', '0004_complaintoutbox'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='complaint',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddField(
+            model_name='complaint',
+            name='search_name',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(fill_search_name, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['-created_at', '-id'], name='complaint_newest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['phone', '-created_at'], name='complaint_phone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='complaint',
+            index=models.Index(fields=['search_name'], name='complaint_name_idx'),
+        ),
+    ]
@@ -1,13 +1,40 @@
 from django.db import models
+from django.utils import timezone
 
 class Complaint(models.Model):
     name = models.CharField(max_length=100)
     phone = models.CharField(max_length=15)
     message = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    # Lower-cased name: ?search= is an indexed prefix range on this column
+    search_name = models.CharField(max_length=100, editable=False, default="")
 
     class Meta:
-        ordering = ["-created_at"]  # ✅ keeps newest first
+        ordering = ["-created_at", "-id"]  # ✅ keeps newest first
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="complaint_newest_idx"),
+            models.Index(fields=["phone", "-created_at"], name="complaint_phone_idx"),
+            models.Index(fields=["search_name"], name="complaint_name_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.phone}"
+
+    def save(self, *args, **kwargs):
+        self.search_name = self.name.lower()
+        super().save(*args, **kwargs)
+
+
+class ComplaintOutbox(models.Model):
+    """A complaint still to be copied to MongoDB (see complaints/outbox.py)."""
+    complaint = models.OneToOneField(Complaint, on_delete=models.CASCADE, related_name="outbox")
+    created_at = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ["id"]
+
+    def __str__(self):
+        return f"outbox #{self.complaint_id} ({self.attempts} attempts)"
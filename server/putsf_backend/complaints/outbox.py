@@ -0,0 +1,162 @@
+# putsf_backend/complaints/outbox.py
+"""
+Transactional outbox for copying complaints to MongoDB.
+
+A complaint and its ``ComplaintOutbox`` row are written in one SQLite
+transaction, so the request never waits on Mongo and no complaint can be
+saved without being queued. A daemon thread per server process (started
+by putsf_backend/background.py, or by the first ``wake()``) drains the
+outbox in batches with ``insert_many``; rows are deleted once their
+document is in Mongo, and failed rows are retried with exponential
+backoff (``attempts``/``last_error`` show what went wrong).
+
+Syncing is idempotent: each document carries the complaint's SQLite id as
+``sqlite_id`` (unique index in complaints/indexes.py). Ids already in Mongo
+are skipped, and duplicate-key errors from a concurrent drainer in another
+worker count as synced.
+
+``manage.py drain_complaint_outbox`` runs the same loop once, for cron or
+after an outage.
+"""
+import datetime
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.utils import timezone
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from putsf_backend.mongo import get_collection
+
+from .models import ComplaintOutbox
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "complaints"
+_DUPLICATE_KEY = 11000
+
+_thread = None
+_thread_pid = None
+_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def enqueue(complaint):
+    """Queue ``complaint`` for Mongo; call inside the transaction that saved it."""
+    ComplaintOutbox.objects.create(complaint=complaint)
+    transaction.on_commit(wake)
+
+
+def document(complaint):
+    return {
+        "sqlite_id": complaint.pk,
+        "name": complaint.name,
+        "phone": complaint.phone,
+        "message": complaint.message,
+        "created_at": complaint.created_at,
+    }
+
+
+def _backoff(attempts):
+    seconds = min(settings.COMPLAINT_OUTBOX_INTERVAL * 2 ** attempts, settings.COMPLAINT_OUTBOX_MAX_BACKOFF)
+    return timezone.now() + datetime.timedelta(seconds=seconds)
+
+
+def drain(batch_size=None):
+    """
+    Sync one batch of due outbox rows.
+
+    Returns ``(processed, synced)``; ``processed`` is 0 when nothing is due
+    or Mongo is not configured.
+    """
+    batch_size = batch_size or settings.COMPLAINT_OUTBOX_BATCH_SIZE
+    collection = get_collection(COLLECTION)
+    if collection is None:
+        return 0, 0
+
+    rows = list(
+        ComplaintOutbox.objects.select_related("complaint")
+        .filter(next_attempt_at__lte=timezone.now())[:batch_size]
+    )
+    if not rows:
+        return 0, 0
+
+    docs = {row.complaint_id: document(row.complaint) for row in rows}
+    failed = {}
+    try:
+        present = {
+            doc["sqlite_id"]
+            for doc in collection.find({"sqlite_id": {"$in": list(docs)}}, {"sqlite_id": 1})
+        }
+        pending = [doc for complaint_id, doc in docs.items() if complaint_id not in present]
+        if pending:
+            collection.insert_many(pending, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") != _DUPLICATE_KEY:
+                failed[pending[error["index"]]["sqlite_id"]] = error.get("errmsg", "write error")
+    except PyMongoError as e:
+        failed = {complaint_id: str(e) for complaint_id in docs}
+
+    synced = [row.pk for row in rows if row.complaint_id not in failed]
+    ComplaintOutbox.objects.filter(pk__in=synced).delete()
+    for row in rows:
+        if row.complaint_id in failed:
+            ComplaintOutbox.objects.filter(pk=row.pk).update(
+                attempts=row.attempts + 1,
+                next_attempt_at=_backoff(row.attempts),
+                last_error=failed[row.complaint_id][:1000],
+            )
+    if failed:
+        logger.warning(f"⚠️ {len(failed)} complaint(s) not synced to MongoDB, will retry: {next(iter(failed.values()))}")
+    return len(rows), len(synced)
+
+
+def drain_all(batch_size=None):
+    """Drain until nothing due is left or a batch makes no progress. Returns the number synced."""
+    batch_size = batch_size or settings.COMPLAINT_OUTBOX_BATCH_SIZE
+    total = 0
+    while True:
+        processed, synced = drain(batch_size)
+        total += synced
+        if processed < batch_size or not synced:
+            return total
+
+
+# -----------------------------
+# Background drainer
+# -----------------------------
+def _run():
+    while True:
+        _wakeup.wait(settings.COMPLAINT_OUTBOX_INTERVAL)
+        _wakeup.clear()
+        try:
+            drain_all()
+        except DatabaseError as e:
+            # e.g. the outbox table does not exist before `migrate`
+            logger.warning(f"⚠️ Complaint outbox not drained: {e}")
+        except Exception as e:
+            logger.error(f"❌ Complaint outbox drainer error: {e}")
+        finally:
+            close_old_connections()
+
+
+def start():
+    """Start this process's drainer thread (again after a fork)."""
+    global _thread, _thread_pid
+    if not settings.COMPLAINT_OUTBOX_DRAIN:
+        return None
+    with _lock:
+        if _thread is None or _thread_pid != os.getpid() or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="complaint-outbox", daemon=True)
+            _thread.start()
+            _thread_pid = os.getpid()
+        return _thread
+
+
+def wake():
+    """Have the drainer run now instead of at its next interval."""
+    if start() is not None:
+        _wakeup.set()
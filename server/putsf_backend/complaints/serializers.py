@@ -4,4 +4,4 @@ from .models import Complaint
 class ComplaintSerializer(serializers.ModelSerializer):
     class Meta:
         model = Complaint
-        fields = "__all__"
+        exclude = ("search_name",)
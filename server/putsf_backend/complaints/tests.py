@@ -1,3 +1,147 @@
-from django.test import TestCase
+import datetime
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase
+from django.utils import timezone
+from pymongo.errors import AutoReconnect
+
+from putsf_backend.core.indexes import ensure_indexes
+from putsf_backend.testing import MongoTestCase
+
+from . import outbox
+from .models import Complaint, ComplaintOutbox
+from .views import parse_timestamp
+
+
+class ComplaintOutboxTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        ensure_indexes(self.db)
+
+    def complain(self, name="Ravi", phone="9876543210"):
+        response = self.client.post("/api/complaints/", {"name": name, "phone": phone, "message": "Street light"})
+        self.assertEqual(response.status_code, 201)
+        return Complaint.objects.get(pk=response.json()["id"])
+
+    def synced_ids(self):
+        return sorted(doc["sqlite_id"] for doc in self.db.complaints.find())
+
+    def test_create_queues_and_drain_syncs(self):
+        complaint = self.complain()
+        self.assertEqual(ComplaintOutbox.objects.get().complaint, complaint)
+        self.assertEqual(self.db.complaints.count_documents({}), 0)
+
+        self.assertEqual(outbox.drain(), (1, 1))
+        self.assertFalse(ComplaintOutbox.objects.exists())
+        doc = self.db.complaints.find_one()
+        self.assertEqual(doc["sqlite_id"], complaint.pk)
+        self.assertEqual(doc["phone"], "9876543210")
+        self.assertEqual(outbox.drain(), (0, 0))
+
+    def test_already_synced_rows_are_not_inserted_again(self):
+        complaint = self.complain()
+        # A drain that inserted but died before deleting its outbox row
+        self.db.complaints.insert_one(outbox.document(complaint))
+        self.assertEqual(outbox.drain(), (1, 1))
+        self.assertEqual(self.synced_ids(), [complaint.pk])
+        self.assertFalse(ComplaintOutbox.objects.exists())
+
+    def test_duplicate_key_from_concurrent_drainer_counts_as_synced(self):
+        first, second = self.complain(), self.complain("Asha", "9123456780")
+        self.db.complaints.insert_one(outbox.document(first))
+        # The other worker's insert lands between our lookup and our insert_many
+        with mock.patch.object(self.db.complaints, "find", return_value=[]):
+            self.assertEqual(outbox.drain(), (2, 2))
+        self.assertEqual(self.synced_ids(), [first.pk, second.pk])
+        self.assertFalse(ComplaintOutbox.objects.exists())
+
+    def test_failed_rows_are_retried_with_backoff(self):
+        complaint = self.complain()
+        with mock.patch.object(self.db.complaints, "insert_many", side_effect=AutoReconnect("down")):
+            self.assertEqual(outbox.drain(), (1, 0))
+
+        row = ComplaintOutbox.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertEqual(row.last_error, "down")
+        self.assertGreater(row.next_attempt_at, timezone.now())
+        # Not due yet
+        self.assertEqual(outbox.drain(), (0, 0))
+
+        ComplaintOutbox.objects.update(next_attempt_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(outbox.drain(), (1, 1))
+        self.assertEqual(self.synced_ids(), [complaint.pk])
+
+    def test_drain_all_empties_the_outbox_in_batches(self):
+        complaints = [self.complain(f"Member {i}", f"98765432{i:02d}") for i in range(5)]
+        self.assertEqual(outbox.drain_all(batch_size=2), 5)
+        self.assertEqual(self.synced_ids(), sorted(c.pk for c in complaints))
+
+    def test_nothing_drained_without_mongo(self):
+        self.complain()
+        with mock.patch("putsf_backend.complaints.outbox.get_collection", return_value=None):
+            self.assertEqual(outbox.drain(), (0, 0))
+        self.assertTrue(ComplaintOutbox.objects.exists())
+
+
+class ComplaintListTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.complaints = []
+        for day, name in enumerate(["Ravi Kumar", "Asha", "ravindra", "Meena", "Ravi Teja"], start=1):
+            complaint = Complaint.objects.create(name=name, phone=f"98765432{day:02d}", message="Street light")
+            created_at = datetime.datetime(2024, 3, day, 12, 0, tzinfo=datetime.timezone.utc)
+            Complaint.objects.filter(pk=complaint.pk).update(created_at=created_at)
+            self.complaints.append(complaint.pk)
+
+    def list_ids(self, **params):
+        response = self.client.get("/api/complaints/", params)
+        self.assertEqual(response.status_code, 200)
+        return [complaint["id"] for complaint in response.json()["results"]]
+
+    def test_cursor_pages_newest_first(self):
+        seen = []
+        url, params = "/api/complaints/", {"limit": 2}
+        while url:
+            body = self.client.get(url, params).json()
+            self.assertLessEqual(len(body["results"]), 2)
+            seen += [complaint["id"] for complaint in body["results"]]
+            url, params = body["next"], None
+        self.assertEqual(seen, self.complaints[::-1])
+
+    def test_since_and_until(self):
+        self.assertEqual(self.list_ids(since="2024-03-02", until="2024-03-04"), self.complaints[2:0:-1])
+        self.assertEqual(self.list_ids(since="2024-03-04T12:00:00Z"), self.complaints[:2:-1])
+
+    def test_unencoded_offset(self):
+        # "+05:30" sent without encoding arrives as " 05:30"; 17:30+05:30 is 12:00 UTC
+        response = self.client.get("/api/complaints/?since=2024-03-04T17:30:00+05:30")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c["id"] for c in response.json()["results"]], self.complaints[:2:-1])
+
+    def test_invalid_dates(self):
+        for value in ("yesterday", "2024-13-01"):
+            response = self.client.get("/api/complaints/", {"since": value})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("since must be an ISO date", response.json()["error"])
+
+    def test_search_is_a_case_insensitive_prefix(self):
+        self.assertEqual(self.list_ids(search="RAVI"), [self.complaints[i] for i in (4, 2, 0)])
+        self.assertEqual(self.list_ids(search="ravi t"), [self.complaints[4]])
+        self.assertEqual(self.list_ids(search="Ravi", since="2024-03-02"), [self.complaints[4], self.complaints[2]])
+
+    def test_phone(self):
+        self.assertEqual(self.list_ids(phone="9876543202"), [self.complaints[1]])
+
+
+class ParseTimestampTests(SimpleTestCase):
+    def test_formats(self):
+        utc = datetime.timezone.utc
+        self.assertEqual(parse_timestamp("2024-03-04T12:00:00Z"), datetime.datetime(2024, 3, 4, 12, tzinfo=utc))
+        self.assertEqual(
+            parse_timestamp("2024-03-04T17:30:00 05:30"), datetime.datetime(2024, 3, 4, 12, tzinfo=utc)
+        )
+        self.assertEqual(
+            parse_timestamp("2024-03-04"), timezone.make_aware(datetime.datetime(2024, 3, 4))
+        )
+        self.assertIsNone(parse_timestamp("2024-02-30"))
+        self.assertIsNone(parse_timestamp("soon"))
@@ -1,34 +1,90 @@
-from rest_framework import viewsets
+import datetime
+import re
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework import exceptions, viewsets
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import AllowAny
 from .models import Complaint
 from .serializers import ComplaintSerializer
-from django.conf import settings
-from datetime import datetime
-from putsf_backend.db import get_db
+from putsf_backend.throttling import IPTokenBucket, PhoneTokenBucket, ThrottleMixin
+from . import outbox
+
+
+class ComplaintCursorPagination(CursorPagination):
+    """Newest first; pages are index range scans however deep the client goes."""
+    ordering = ("-created_at", "-id")
+    page_size = 50
+    page_size_query_param = "limit"
+    max_page_size = 200
+
+
+# An unencoded "+05:30" in a query string arrives as " 05:30"
+_SPACED_OFFSET = re.compile(r"(\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?) (\d{2}(?::?\d{2})?)$")
+
+
+def parse_timestamp(value):
+    """
+    Aware datetime from an ISO date or datetime (``Z`` or ``+hh:mm`` offsets),
+    or None. Naive values are taken in ``TIME_ZONE``.
+    """
+    value = _SPACED_OFFSET.sub(r"\1+\2", str(value).strip())
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            date = parse_date(value)
+            parsed = datetime.datetime.combine(date, datetime.time()) if date else None
+    except ValueError:  # well formed but out of range, e.g. month 13
+        return None
+    if parsed is None:
+        return None
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
 
-class ComplaintViewSet(viewsets.ModelViewSet):
+
+def _parse_date(value, name):
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        raise exceptions.ValidationError({"error": f"{name} must be an ISO date, got {value!r}."})
+    return parsed
+
+
+class ComplaintViewSet(ThrottleMixin, viewsets.ModelViewSet):
     queryset = Complaint.objects.all()
     serializer_class = ComplaintSerializer
     permission_classes = [AllowAny]
+    pagination_class = ComplaintCursorPagination
+    throttle_classes = [IPTokenBucket, PhoneTokenBucket]
+
+    @property
+    def throttle_scope(self):
+        return "complaint" if self.action == "create" else None
+
+    def get_queryset(self):
+        """
+        ?phone=<exact>&since=<iso>&until=<iso>&search=<name prefix>
+        (same filter names as /api/export/complaints.csv)
+        """
+        queryset = super().get_queryset()
+        if self.action != "list":
+            return queryset
+
+        params = self.request.query_params
+        if params.get("phone"):
+            queryset = queryset.filter(phone=params["phone"].strip())
+        if params.get("since"):
+            queryset = queryset.filter(created_at__gte=_parse_date(params["since"], "since"))
+        if params.get("until"):
+            queryset = queryset.filter(created_at__lt=_parse_date(params["until"], "until"))
+        search = params.get("search", "").strip().lower()
+        if search:
+            # A range instead of LIKE so SQLite can use complaint_name_idx
+            queryset = queryset.filter(search_name__gte=search, search_name__lt=search + "\U0010ffff")
+        return queryset
 
     def perform_create(self, serializer):
-        """Save in SQLite and also sync to MongoDB if connected."""
-        complaint = serializer.save()  # ✅ Save to SQLite first
-
-        db = get_db()
-        if db:
-            try:
-                db.complaints.insert_one({
-                    "name": complaint.name,
-                    "phone": complaint.phone,
-                    "message": complaint.message,
-                    "created_at": datetime.utcnow(),
-                })
-                if settings.DEBUG:
-                    print("✅ Complaint also saved to MongoDB")
-            except Exception as e:
-                if settings.DEBUG:
-                    print(f"⚠️ Failed to save complaint in MongoDB: {e}")
-        else:
-            if settings.DEBUG:
-                print("⚠️ MongoDB not connected. Complaint only saved in SQLite.")
+        """Save in SQLite; the outbox copies it to MongoDB in the background."""
+        with transaction.atomic():
+            complaint = serializer.save()  # ✅ Save to SQLite first
+            outbox.enqueue(complaint)
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'putsf_backend.core'
+
+    def ready(self):
+        from . import checks  # noqa: F401 (registers system checks)
@@ -0,0 +1,84 @@
+"""
+System checks for the static asset pipeline.
+
+Assets must be referenced through ``{% static %}`` (or ``static()``) so the
+manifest storage can swap in their hashed, far-future-cacheable names; a
+literal ``/static/...`` URL keeps pointing at the unhashed copy.
+"""
+import os
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+
+TEMPLATE_EXTENSIONS = (".html", ".txt", ".xml")
+
+
+def _template_files():
+    dirs = [d for engine in settings.TEMPLATES for d in engine.get("DIRS", [])]
+    dirs += [os.path.join(app.path, "templates") for app in apps.get_app_configs()]
+    seen = set()
+    for directory in dirs:
+        for root, _dirs, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith(TEMPLATE_EXTENSIONS) and path not in seen:
+                    seen.add(path)
+                    yield path
+
+
+def _literal_static_pattern():
+    prefix = re.escape(settings.STATIC_URL)
+    return re.compile(
+        rf"""(?:(?:src|href|content|poster)\s*=\s*["']|url\(\s*["']?)((?:https?://[^/"']+)?{prefix}[^"'()\s{{}}]+)"""
+    )
+
+
+@checks.register("staticfiles")
+def check_unhashed_static_references(app_configs, **kwargs):
+    """Warn about templates that hard-code STATIC_URL paths."""
+    pattern = _literal_static_pattern()
+    warnings = []
+    for path in _template_files():
+        try:
+            with open(path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except (OSError, UnicodeDecodeError):
+            continue
+        for number, line in enumerate(lines, 1):
+            for match in pattern.finditer(line):
+                warnings.append(checks.Warning(
+                    f"Literal static URL {match.group(1)!r} bypasses the hashed manifest.",
+                    hint="Use {% static '...' %} so the fingerprinted, cacheable name is served.",
+                    obj=f"{os.path.relpath(path, settings.BASE_DIR)}:{number}",
+                    id="putsf.W001",
+                ))
+    return warnings
+
+
+@checks.register("staticfiles", deploy=True)
+def check_static_manifest(app_configs, **kwargs):
+    """Production must serve hashed, precompressed assets."""
+    from django.contrib.staticfiles.storage import ManifestFilesMixin, staticfiles_storage
+
+    storage_class = type(staticfiles_storage._wrapped) if staticfiles_storage._wrapped else None
+    if storage_class is None:
+        staticfiles_storage._setup()
+        storage_class = type(staticfiles_storage._wrapped)
+
+    if not issubclass(storage_class, ManifestFilesMixin):
+        return [checks.Warning(
+            "STATICFILES_STORAGE does not fingerprint static files.",
+            hint="Use whitenoise.storage.CompressedManifestStaticFilesStorage outside DEBUG.",
+            id="putsf.W002",
+        )]
+
+    manifest = os.path.join(settings.STATIC_ROOT, staticfiles_storage.manifest_name)
+    if not os.path.exists(manifest):
+        return [checks.Warning(
+            f"Static manifest {manifest} is missing; {{% static %}} will fail.",
+            hint="Run `manage.py collectstatic` as part of the deploy.",
+            id="putsf.W003",
+        )]
+    return []
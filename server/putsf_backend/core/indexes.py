@@ -0,0 +1,145 @@
+# putsf_backend/core/indexes.py
+"""
+Mongo index declarations and reconciliation.
+
+Each local app declares the indexes it needs in an ``indexes.py`` module
+exposing ``MONGO_INDEXES = {"<collection>": [IndexModel, ...]}``.
+``ensure_indexes`` creates missing indexes, rebuilds changed ones and,
+with ``prune=True``, drops indexes that are no longer declared.
+
+Views that rely on a unique index call ``has_index`` and keep their
+``find_one`` check while it is missing (not built yet, or failed over
+existing duplicates).
+"""
+import logging
+import threading
+import time
+from importlib import import_module
+
+from django.apps import apps
+from django.utils.module_loading import module_has_submodule
+from pymongo.errors import PyMongoError
+
+logger = logging.getLogger(__name__)
+
+# Seconds a has_index answer is reused before index_information() is asked again
+INDEX_CHECK_INTERVAL = 60
+
+_present = {}  # (database, collection, index name) -> (present, checked at)
+
+
+def collect_indexes():
+    """Return ``{collection: [IndexModel, ...]}`` merged from every installed app."""
+    declared = {}
+    for app_config in apps.get_app_configs():
+        if not module_has_submodule(app_config.module, "indexes"):
+            continue
+        module = import_module(f"{app_config.name}.indexes")
+        for collection, models in getattr(module, "MONGO_INDEXES", {}).items():
+            declared.setdefault(collection, []).extend(models)
+    return declared
+
+
+def _normalize_key(key):
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in key]
+
+
+def _matches(existing, wanted):
+    """Compare an ``index_information()`` entry with an ``IndexModel.document``."""
+    if _normalize_key(existing["key"]) != _normalize_key(wanted["key"].items()):
+        return False
+    # ``unique``/``sparse`` are simply absent when False
+    for flag in ("unique", "sparse"):
+        if bool(existing.get(flag)) != bool(wanted.get(flag)):
+            return False
+    for option in ("expireAfterSeconds", "partialFilterExpression"):
+        if existing.get(option) != wanted.get(option):
+            return False
+    return True
+
+
+def ensure_indexes(db, prune=False, dry_run=False):
+    """
+    Reconcile the declared indexes against ``db``.
+
+    Returns a list of ``(collection, index_name, action)`` tuples where action
+    is one of ``ok``, ``created``, ``rebuilt``, ``dropped`` or ``failed: <reason>``.
+    """
+    report = []
+    for collection_name, models in sorted(collect_indexes().items()):
+        collection = db[collection_name]
+        existing = collection.index_information()
+        declared_names = set()
+
+        for model in models:
+            wanted = model.document
+            name = wanted["name"]
+            declared_names.add(name)
+            current = existing.get(name)
+
+            if current and _matches(current, wanted):
+                report.append((collection_name, name, "ok"))
+                continue
+
+            action = "rebuilt" if current else "created"
+            if dry_run:
+                report.append((collection_name, name, f"would be {action}"))
+                continue
+            try:
+                if current:
+                    collection.drop_index(name)
+                collection.create_indexes([model])
+                report.append((collection_name, name, action))
+            except PyMongoError as e:
+                # e.g. a unique index over data that already has duplicates
+                report.append((collection_name, name, f"failed: {e}"))
+
+        if prune:
+            for name in existing:
+                if name == "_id_" or name in declared_names:
+                    continue
+                if not dry_run:
+                    collection.drop_index(name)
+                report.append((collection_name, name, "would be dropped" if dry_run else "dropped"))
+
+    return report
+
+
+def has_index(collection, name):
+    """Whether ``collection`` has the index ``name`` (cached per process)."""
+    key = (collection.database.name, collection.name, name)
+    cached = _present.get(key)
+    now = time.monotonic()
+    if cached is not None and now - cached[1] < INDEX_CHECK_INTERVAL:
+        return cached[0]
+    try:
+        present = name in collection.index_information()
+    except PyMongoError as e:
+        logger.warning("⚠️ Could not list indexes of %s: %s", collection.name, e)
+        return False
+    _present[key] = (present, now)
+    return present
+
+
+def ensure_indexes_in_background():
+    """Run ``ensure_indexes`` in a daemon thread so startup never waits on Mongo."""
+    def run():
+        from putsf_backend.mongo import get_db
+
+        db = get_db()
+        if db is None:
+            logger.warning("⚠️ MongoDB not connected. Skipping index bootstrap.")
+            return
+        try:
+            for collection, name, action in ensure_indexes(db):
+                if action.startswith("failed"):
+                    logger.error("❌ Mongo index %s.%s %s", collection, name, action)
+                elif action != "ok":
+                    logger.info("Mongo index %s.%s: %s", collection, name, action)
+        except PyMongoError as e:
+            logger.error("❌ Mongo index bootstrap failed: %s", e)
+
+    thread = threading.Thread(target=run, name="mongo-index-bootstrap", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,69 @@
+import datetime
+import statistics
+import time
+from decimal import Decimal
+
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from putsf_backend.renderers import FastJSONRenderer, orjson
+
+
+def _documents(count):
+    """Synthetic documents shaped like the gallery/blog/license collections."""
+    now = datetime.datetime.utcnow()
+    return [
+        {
+            "_id": ObjectId(),
+            "title": f"PUTSF event photo {i}",
+            "subtitle": "Members gathered for the monthly meeting",
+            "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+            "image_url": f"https://putsf.com/media/gallery/IMG_{i:05d}.jpg",
+            "status": "published",
+            "is_approved": bool(i % 2),
+            "fee": Decimal("100.00"),
+            "created_at": now - datetime.timedelta(minutes=i),
+        }
+        for i in range(count)
+    ]
+
+
+def _stock(docs):
+    # What the views did before: rewrite each _id, then DRF's renderer
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return JSONRenderer().render(docs)
+
+
+def _fast(docs):
+    return FastJSONRenderer().render(docs)
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's stock JSONRenderer with FastJSONRenderer on Mongo-shaped documents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=5000, help="Documents per payload.")
+        parser.add_argument("--repeat", type=int, default=20, help="Timed runs per renderer.")
+
+    def handle(self, *args, **options):
+        items, repeat = options["items"], options["repeat"]
+        self.stdout.write(f"{items} documents x {repeat} runs (orjson: {'yes' if orjson else 'no'})")
+
+        results = {}
+        for name, render in (("stock JSONRenderer", _stock), ("FastJSONRenderer", _fast)):
+            timings = []
+            for _ in range(repeat):
+                docs = _documents(items)
+                started = time.perf_counter()
+                body = render(docs)
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+            self.stdout.write(
+                f"  {name:<20} median {results[name]:8.2f} ms   "
+                f"min {min(timings):8.2f} ms   {len(body) / 1024:8.1f} KiB"
+            )
+
+        speedup = results["stock JSONRenderer"] / results["FastJSONRenderer"]
+        self.stdout.write(self.style.SUCCESS(f"  speedup: {speedup:.1f}x"))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from putsf_backend.core.indexes import ensure_indexes
+
+
+class Command(BaseCommand):
+    help = "Create or update the MongoDB indexes declared by each app."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--prune", action="store_true",
+            help="Drop indexes that are no longer declared (never touches _id_).",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="Only report what would change.",
+        )
+
+    def handle(self, *args, **options):
+        from putsf_backend.mongo import get_db
+
+        db = get_db()
+        if db is None:
+            raise CommandError("MongoDB not connected")
+
+        failed = False
+        for collection, name, action in ensure_indexes(db, prune=options["prune"], dry_run=options["dry_run"]):
+            line = f"{collection}.{name}: {action}"
+            if action.startswith("failed"):
+                failed = True
+                self.stderr.write(self.style.ERROR(line))
+            elif action == "ok":
+                self.stdout.write(line)
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+
+        if failed:
+            raise CommandError("Some indexes could not be created")
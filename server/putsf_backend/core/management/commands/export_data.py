@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from putsf_backend.exports import DATASETS, EXPORT_BATCH_SIZE, EXPORT_FORMATS, ExportError, export_chunks
+
+
+class Command(BaseCommand):
+    help = "Stream the licenses collection or the Complaint table as CSV or NDJSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(DATASETS))
+        parser.add_argument("--format", dest="fmt", choices=sorted(EXPORT_FORMATS), default="csv")
+        parser.add_argument("--output", "-o", help="File to write (default: stdout).")
+        parser.add_argument("--fields", default="", help="Comma-separated fields to export.")
+        parser.add_argument(
+            "--filter", action="append", default=[], metavar="KEY=VALUE",
+            help="Filter rows, e.g. is_approved=true or since=2025-01-01 (repeatable).",
+        )
+        parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        filters = {}
+        for item in options["filter"]:
+            key, sep, value = item.partition("=")
+            if not sep:
+                raise CommandError(f"Filters must look like KEY=VALUE, got {item!r}")
+            filters[key] = value
+        fields = [f.strip() for f in options["fields"].split(",") if f.strip()]
+
+        try:
+            chunks = export_chunks(
+                options["dataset"], options["fmt"], filters, fields, batch_size=options["batch_size"],
+            )
+            if options["output"]:
+                with open(options["output"], "wb") as out:
+                    for chunk in chunks:
+                        out.write(chunk)
+            else:
+                for chunk in chunks:
+                    sys.stdout.buffer.write(chunk)
+                sys.stdout.buffer.flush()
+        except ExportError as e:
+            raise CommandError(str(e))
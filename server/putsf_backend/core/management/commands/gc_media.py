@@ -0,0 +1,222 @@
+import datetime
+import json
+import os
+import re
+import time
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from putsf_backend import images, media
+
+_TEMP_SUFFIXES = (".upload", ".tmp")
+_CARD_NAME = re.compile(r"^([0-9a-f]{64})\.pdf$")
+
+
+def legacy_paths(db, batch_size):
+    """
+    Files outside the blob store that any document references, as paths
+    relative to ``MEDIA_ROOT``. Blobs and cards are checked one by one
+    (``media_blobs`` refs, indexed ``card_hash``), so they are left out.
+    """
+    paths = set()
+    for name, fields in media.MEDIA_FIELDS.items():
+        projection = {field: 1 for field in fields}
+        projection["image_variants"] = 1
+        for doc in db[name].find({}, projection).batch_size(batch_size):
+            urls = [doc.get(field) for field in fields]
+            for entries in (doc.get("image_variants") or {}).values():
+                urls.extend(entry.get("url") for entry in entries)
+            for url in urls:
+                path = media.media_path(url)
+                if path and media.blob_digest(path) is None:
+                    paths.add(os.path.relpath(path, settings.MEDIA_ROOT))
+    return paths
+
+
+def walk_media(start_after=None, rel_dir=""):
+    """
+    Files under ``MEDIA_ROOT`` (relative paths) in path-component order,
+    resuming after ``start_after``; subtrees entirely before it are skipped.
+    """
+    start = tuple(start_after.split(os.sep)) if start_after else None
+    try:
+        entries = sorted(os.scandir(os.path.join(settings.MEDIA_ROOT, rel_dir)), key=lambda e: e.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        rel = os.path.join(rel_dir, entry.name)
+        parts = tuple(rel.split(os.sep))
+        if entry.is_dir(follow_symlinks=False):
+            if start and parts < start and start[:len(parts)] != parts:
+                continue
+            yield from walk_media(start_after, rel)
+        elif not start or parts > start:
+            yield rel
+
+
+class Command(BaseCommand):
+    help = (
+        "Find (and delete) media files no Mongo document references. Runs incrementally: each run "
+        "scans a bounded slice of MEDIA_ROOT and the next run resumes where it stopped. References "
+        "to files outside the blob store are read once per full pass and kept with the resume state."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report orphaned files.")
+        parser.add_argument(
+            "--min-age", type=int, default=3600,
+            help="Ignore files modified in the last N seconds (uploads in progress).",
+        )
+        parser.add_argument("--max-files", type=int, default=10000, help="Files to examine per run.")
+        parser.add_argument("--time-limit", type=float, default=60, help="Stop after N seconds.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Mongo cursor batch size.")
+        parser.add_argument("--reset", action="store_true", help="Start from the top of MEDIA_ROOT.")
+        parser.add_argument("--state-file", default=settings.GC_MEDIA_STATE_FILE)
+
+    def handle(self, *args, **options):
+        from putsf_backend.mongo import get_db
+
+        db = get_db()
+        if db is None:
+            raise CommandError("MongoDB not connected")
+
+        state = self._load_state(options["state_file"]) if not options["reset"] else {}
+        if not state.get("after") or "snapshot_at" not in state:
+            # New pass: snapshot the legacy references for this and the following runs
+            state = {
+                "after": None,
+                "snapshot_at": time.time(),
+                "paths": sorted(legacy_paths(db, options["batch_size"])),
+            }
+        paths = set(state["paths"])
+        started = time.monotonic()
+        deadline = started + options["time_limit"]
+        # Files written after the snapshot may be referenced by documents it doesn't know
+        cutoff = state["snapshot_at"] - options["min_age"]
+        touched_cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=options["min_age"])
+
+        self.stdout.write(f"{len(paths)} referenced legacy files; resuming after {state['after'] or 'start'}")
+
+        examined = orphaned = freed = 0
+        last = None
+        finished = True
+        for rel in walk_media(state.get("after")):
+            if examined >= options["max_files"] or time.monotonic() > deadline:
+                finished = False
+                break
+            examined += 1
+            last = rel
+
+            path = os.path.join(settings.MEDIA_ROOT, rel)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if stat.st_mtime > cutoff:
+                continue
+            if not self._is_orphan(db, rel, path, paths, touched_cutoff):
+                continue
+
+            orphaned += 1
+            freed += stat.st_size
+            self.stdout.write(f"{'would delete' if options['dry_run'] else 'deleting'} {rel} ({stat.st_size} bytes)")
+            if not options["dry_run"]:
+                self._delete(db, path)
+
+        if finished:
+            state = {"after": None, "finished_at": time.time()}
+        else:
+            state["after"] = last
+        if not options["dry_run"]:
+            self._save_state(options["state_file"], state)
+
+        verb = "would free" if options["dry_run"] else "freed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{examined} files examined, {orphaned} orphaned, {verb} {freed / (1024 * 1024):.1f} MB "
+            f"in {time.monotonic() - started:.1f}s" + ("" if finished else " (more to scan: run again)")
+        ))
+
+    # ---------------------------
+    # Classification
+    # ---------------------------
+    def _is_orphan(self, db, rel, path, paths, touched_cutoff):
+        name = os.path.basename(rel)
+        if name.endswith(_TEMP_SUFFIXES):
+            return True
+
+        # Variants live as long as the file they were made from
+        parent = os.path.dirname(rel)
+        if os.path.basename(parent) == images.VARIANT_DIR:
+            match = images.VARIANT_NAME.match(name)
+            if not match:
+                return True
+            return match.group(1) not in self._stems(os.path.dirname(parent))
+
+        if parent == os.path.normpath(settings.LICENSE_CARD_DIR):
+            match = _CARD_NAME.match(name)
+            # A card may be mid-render: its hash is stored before the file exists
+            return not (match and db["licenses"].count_documents({"card_hash": match.group(1)}, limit=1))
+
+        digest = media.blob_digest(path)
+        if digest is not None:
+            return not self._blob_in_use(db, digest, touched_cutoff)
+        return rel not in paths
+
+    def _stems(self, rel_dir):
+        """File names without extension in ``rel_dir`` (cached for the run)."""
+        cache = self.__dict__.setdefault("_stem_cache", {})
+        if rel_dir not in cache:
+            try:
+                names = os.listdir(os.path.join(settings.MEDIA_ROOT, rel_dir))
+            except FileNotFoundError:
+                names = []
+            cache[rel_dir] = {os.path.splitext(name)[0] for name in names}
+        return cache[rel_dir]
+
+    def _blob_in_use(self, db, digest, touched_cutoff):
+        """A blob nobody links to is still kept while its refs point at live documents."""
+        record = db[media.BLOB_COLLECTION].find_one({"_id": digest})
+        if record is None:
+            return False
+        if record.get("touched_at") and record["touched_at"] > touched_cutoff:
+            return True
+        for ref in record.get("refs", []):
+            collection, _, doc_id = ref.partition(":")
+            try:
+                if db[collection].count_documents({"_id": ObjectId(doc_id)}, limit=1):
+                    return True
+            except InvalidId:
+                continue
+        return False
+
+    def _delete(self, db, path):
+        digest = media.blob_digest(path)
+        if digest is not None:
+            db[media.BLOB_COLLECTION].delete_one({"_id": digest})
+            images.remove_variants(path)
+        try:
+            os.remove(path)
+        except OSError as e:
+            self.stderr.write(self.style.ERROR(f"could not delete {path}: {e}"))
+
+    # ---------------------------
+    # Resume state
+    # ---------------------------
+    def _load_state(self, state_file):
+        try:
+            with open(state_file) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self, state_file, state):
+        os.makedirs(os.path.dirname(state_file) or ".", exist_ok=True)
+        tmp_path = f"{state_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, state_file)
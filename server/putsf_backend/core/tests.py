@@ -0,0 +1,891 @@
+import datetime
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest import mock
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from pymongo.errors import AutoReconnect
+
+from putsf_backend import exports, images, media, perf, resize, slow_queries, throttling
+from putsf_backend.complaints.models import Complaint
+from putsf_backend.core.management.commands import gc_media
+from putsf_backend.testing import MongoTestCase
+from putsf_backend.uploads import MediaUploadHandler
+from putsf_backend.views import resize_media, serve_media
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def upload(name="photo.png", content=PNG, content_type="image/png"):
+    return SimpleUploadedFile(name, content, content_type=content_type)
+
+
+class MediaStoreTests(MongoTestCase):
+    def test_same_bytes_are_stored_once(self):
+        first_path, first_url = media.store(upload("a.png"), "gallery_images:1")
+        second_path, second_url = media.store(upload("b.png"), "blog_posts:2")
+
+        self.assertEqual((first_path, first_url), (second_path, second_url))
+        self.assertTrue(first_url.endswith(".png"))
+        blob = self.db.media_blobs.find_one()
+        self.assertEqual(sorted(blob["refs"]), ["blog_posts:2", "gallery_images:1"])
+        self.assertEqual(blob["path"], os.path.relpath(first_path, settings.MEDIA_ROOT))
+
+    def test_file_outlives_all_but_last_reference(self):
+        path, url = media.store(upload(), "gallery_images:1")
+        media.store(upload(), "blog_posts:2")
+
+        self.assertFalse(media.release(url, "gallery_images:1"))
+        self.assertTrue(os.path.exists(path))
+        self.assertTrue(media.release(url, "blog_posts:2"))
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(self.db.media_blobs.count_documents({}), 0)
+
+    def test_release_is_per_owner(self):
+        path, url = media.store(upload(), "gallery_images:1")
+        media.store(upload(), "blog_posts:2")
+        # Releasing one owner twice must not drop the other's reference
+        media.release(url, "gallery_images:1")
+        media.release(url, "gallery_images:1")
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(self.db.media_blobs.find_one()["refs"], ["blog_posts:2"])
+
+    def test_different_bytes_with_same_name_do_not_collide(self):
+        first_path, _ = media.store(upload(content=PNG + b"1"), "gallery_images:1")
+        second_path, _ = media.store(upload(content=PNG + b"2"), "gallery_images:2")
+        self.assertNotEqual(first_path, second_path)
+
+    def test_legacy_file_is_removed_directly(self):
+        path = os.path.join(settings.MEDIA_ROOT, "gallery", "old.png")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "wb") as f:
+            f.write(PNG)
+        self.assertTrue(media.release(media.media_url(path), "gallery_images:1"))
+        self.assertFalse(os.path.exists(path))
+
+    def test_urls_outside_media_root_are_ignored(self):
+        self.assertIsNone(media.media_path("http://testserver/media/../settings.py"))
+        self.assertFalse(media.release("http://testserver/media/../settings.py", "gallery_images:1"))
+
+    def test_gallery_images_share_a_blob(self):
+        first = self.client.post("/api/gallery/images/", {"title": "One", "image": upload("one.png")}).json()
+        second = self.client.post("/api/gallery/images/", {"title": "Two", "image": upload("two.png")}).json()
+        self.assertEqual(first["image_url"], second["image_url"])
+        path = media.media_path(first["image_url"])
+
+        self.client.delete(f"/api/gallery/images/{first['_id']}/")
+        self.assertTrue(os.path.exists(path))
+        self.client.delete(f"/api/gallery/images/{second['_id']}/")
+        self.assertFalse(os.path.exists(path))
+
+
+class UploadLimitTests(MongoTestCase):
+    def post(self, image, title="Photo"):
+        return self.client.post("/api/gallery/images/", {"title": title, "image": image})
+
+    def blob_files(self):
+        return [name for _, _, names in os.walk(os.path.join(settings.MEDIA_ROOT, media.BLOB_DIR)) for name in names]
+
+    def test_upload_is_streamed_into_the_blob_store(self):
+        response = self.post(upload())
+        self.assertEqual(response.status_code, 201)
+        # Spooled and hashed while it arrived: renamed into place, no temp file left
+        self.assertEqual(self.blob_files(), [os.path.basename(media.media_path(response.json()["image_url"]))])
+
+    @override_settings(UPLOAD_MAX_BYTES={"gallery": 100})
+    def test_oversized_file_is_rejected(self):
+        response = self.post(upload(content=PNG * 10))
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("limit for gallery", response.json()["error"])
+        self.assertEqual(self.db.gallery_images.count_documents({}), 0)
+        self.assertEqual(self.blob_files(), [])
+
+    @override_settings(UPLOAD_MAX_BYTES={"gallery": 100})
+    def test_oversized_body_is_rejected_before_reading(self):
+        with mock.patch.object(MediaUploadHandler, "new_file") as new_file:
+            response = self.post(upload(content=PNG * 2000))
+        self.assertEqual(response.status_code, 413)
+        new_file.assert_not_called()
+
+    def test_wrong_content_type_is_rejected(self):
+        response = self.post(upload("notes.txt", b"hello", "text/plain"))
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(response.json(), {"error": "Unsupported file type: text/plain (.txt)."})
+        self.assertEqual(self.blob_files(), [])
+
+    def test_wrong_extension_is_rejected(self):
+        response = self.post(upload("photo.exe"))
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(self.db.gallery_images.count_documents({}), 0)
+
+
+class GcMediaTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.state_file = os.path.join(settings.MEDIA_ROOT, ".gc_state.json")
+        self.card_hash = "c" * 64
+
+        image = self.client.post("/api/gallery/images/", {"title": "Kept", "image": upload()}).json()
+        self.kept_blob = media.media_path(image["image_url"])
+        # Still referenced by a live document, though no URL points at it any more
+        self.shared_blob, _ = media.store(upload(content=PNG + b"old"), f"gallery_images:{image['_id']}")
+        self.stale_blob, _ = media.store(upload(content=PNG + b"gone"), "gallery_images:5f0000000000000000000000")
+        self.untracked_blob = self.write(os.path.join(media.BLOB_DIR, "dd", "d" * 64 + ".png"))
+
+        self.legacy = self.write("gallery/legacy.png")
+        self.db.banners.insert_one({"image_url": media.media_url(self.legacy)})
+        self.legacy_orphan = self.write("gallery/orphan.png")
+        self.spool = self.write(os.path.join(media.BLOB_DIR, "tmp123.upload"))
+        self.card = self.write(f"{settings.LICENSE_CARD_DIR}/{self.card_hash}.pdf")
+        self.db.licenses.insert_one({"phone": "9876543210", "card_hash": self.card_hash})
+        self.card_orphan = self.write(f"{settings.LICENSE_CARD_DIR}/{'e' * 64}.pdf")
+
+        self.age_all_files()
+
+    def write(self, rel):
+        path = os.path.join(settings.MEDIA_ROOT, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(PNG + rel.encode())
+        return path
+
+    def age_all_files(self):
+        old = time.time() - 2 * 3600
+        for root, _, names in os.walk(settings.MEDIA_ROOT):
+            for name in names:
+                os.utime(os.path.join(root, name), (old, old))
+        self.db.media_blobs.update_many({}, {"$set": {"touched_at": datetime.datetime.utcnow() - datetime.timedelta(hours=2)}})
+
+    def gc(self, *args):
+        out = StringIO()
+        call_command("gc_media", "--state-file", self.state_file, *args, stdout=out)
+        return out.getvalue()
+
+    def assert_only_orphans_deleted(self):
+        for path in (self.kept_blob, self.shared_blob, self.legacy, self.card):
+            self.assertTrue(os.path.exists(path), path)
+        for path in (self.stale_blob, self.untracked_blob, self.legacy_orphan, self.spool, self.card_orphan):
+            self.assertFalse(os.path.exists(path), path)
+
+    def test_deletes_only_unreferenced_files(self):
+        self.gc()
+        self.assert_only_orphans_deleted()
+        self.assertEqual(self.db.media_blobs.count_documents({}), 2)
+
+    def test_dry_run_deletes_nothing(self):
+        output = self.gc("--dry-run")
+        self.assertIn("would delete", output)
+        self.assertTrue(os.path.exists(self.stale_blob))
+        self.assertFalse(os.path.exists(self.state_file))
+
+    def test_recent_files_and_claims_are_kept(self):
+        os.utime(self.legacy_orphan)
+        self.db.media_blobs.update_one(
+            {"_id": media.blob_digest(self.stale_blob)}, {"$set": {"touched_at": datetime.datetime.utcnow()}}
+        )
+        self.gc()
+        self.assertTrue(os.path.exists(self.legacy_orphan))
+        self.assertTrue(os.path.exists(self.stale_blob))
+
+    def test_pass_resumes_across_runs(self):
+        with mock.patch(
+            "putsf_backend.core.management.commands.gc_media.legacy_paths", wraps=gc_media.legacy_paths
+        ) as legacy_paths:
+            runs = 0
+            while True:
+                runs += 1
+                if "run again" not in self.gc("--max-files", "2"):
+                    break
+        self.assertGreater(runs, 2)
+        # References are read once per pass, not once per run
+        legacy_paths.assert_called_once()
+        self.assert_only_orphans_deleted()
+
+    def test_files_newer_than_the_snapshot_are_kept(self):
+        self.gc("--max-files", "1")
+        # Uploaded after the pass started: its document is not in the snapshot
+        late = self.write("gallery/late.png")
+        self.db.banners.insert_one({"image_url": media.media_url(late)})
+        while "run again" in self.gc("--max-files", "1"):
+            pass
+        self.assertTrue(os.path.exists(late))
+
+
+@override_settings(MEDIA_ACCEL="")
+class ServeMediaTests(MongoTestCase):
+    body = bytes(range(100))
+
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        os.makedirs(os.path.join(settings.MEDIA_ROOT, "gallery"))
+        with open(os.path.join(settings.MEDIA_ROOT, "gallery", "photo.png"), "wb") as f:
+            f.write(self.body)
+
+    def get(self, path="gallery/photo.png", **headers):
+        response = serve_media(self.factory.get(f"/media/{path}", **headers), path)
+        self.addCleanup(response.close)
+        return response
+
+    def content(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_whole_file(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(self.content(response), self.body)
+
+    def test_range(self):
+        response = self.get(HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/100")
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(self.content(response), self.body[10:20])
+
+    def test_open_and_suffix_ranges(self):
+        self.assertEqual(self.content(self.get(HTTP_RANGE="bytes=95-")), self.body[95:])
+        self.assertEqual(self.content(self.get(HTTP_RANGE="bytes=-5")), self.body[-5:])
+        response = self.get(HTTP_RANGE="bytes=90-500")
+        self.assertEqual(response["Content-Range"], "bytes 90-99/100")
+        self.assertEqual(self.content(response), self.body[90:])
+
+    def test_unsatisfiable_range(self):
+        for header in ("bytes=100-", "bytes=50-10"):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416)
+            self.assertEqual(response["Content-Range"], "bytes */100")
+
+    def test_unsupported_ranges_get_the_whole_file(self):
+        for header in ("bytes=0-1,5-6", "items=0-1", "bytes=-"):
+            response = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(self.content(response), self.body)
+
+    def test_if_range(self):
+        etag = self.get()["ETag"]
+        self.assertEqual(self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag).status_code, 206)
+        response = self.get(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.content(response), self.body)
+
+    def test_not_modified(self):
+        etag = self.get()["ETag"]
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertIn("max-age", response["Cache-Control"])
+
+    def test_blobs_are_immutable(self):
+        path, url = media.store(upload(), "gallery_images:1")
+        response = self.get(os.path.relpath(path, settings.MEDIA_ROOT))
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertNotIn("immutable", self.get()["Cache-Control"])
+
+    @override_settings(MEDIA_ACCEL="x-accel-redirect", MEDIA_ACCEL_PREFIX="/_protected_media/")
+    def test_accel_redirect_leaves_bytes_to_the_proxy(self):
+        response = self.get(HTTP_RANGE="bytes=0-9")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/_protected_media/gallery/photo.png")
+        self.assertEqual(response.content, b"")
+
+    def test_paths_outside_media_root(self):
+        with open(os.path.join(settings.MEDIA_ROOT, ".hidden"), "wb") as f:
+            f.write(self.body)
+        for path in ("../settings.py", "gallery/missing.png", ".hidden"):
+            with self.assertRaises(Http404):
+                self.get(path)
+
+
+@override_settings(THROTTLE_ENABLED=True, THROTTLE_RATES={"check_phone": {"ip": "3/min", "phone": "2/min"}})
+class ThrottleTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.now = 1_000_000.0
+        patcher = mock.patch("putsf_backend.throttling.time")
+        patcher.start().time.side_effect = lambda: self.now
+        self.addCleanup(patcher.stop)
+        self.phones = iter(f"98765{i:05d}" for i in range(1000))
+
+    def check_phone(self, phone=None, **headers):
+        return self.client.get("/api/license/check_phone/", {"phone": phone or next(self.phones)}, **headers)
+
+    def test_burst_then_429(self):
+        for _ in range(3):
+            self.assertEqual(self.check_phone().status_code, 200)
+        response = self.check_phone()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json(), {"error": "Too many requests. Please try again later."})
+        # One token refills every 20 s
+        self.assertEqual(response["Retry-After"], "21")
+
+    def test_bucket_refills_at_the_steady_rate(self):
+        for _ in range(3):
+            self.check_phone()
+        self.now += 19
+        self.assertEqual(self.check_phone().status_code, 429)
+        self.now += 1
+        self.assertEqual(self.check_phone().status_code, 200)
+        self.assertEqual(self.check_phone().status_code, 429)
+        # Never more than a full bucket, however long the client was away
+        self.now += 3600
+        self.assertEqual([self.check_phone().status_code for _ in range(4)], [200, 200, 200, 429])
+
+    def test_phone_bucket(self):
+        with override_settings(THROTTLE_RATES={"check_phone": {"ip": "100/min", "phone": "2/min"}}):
+            self.assertEqual([self.check_phone("9876543210").status_code for _ in range(3)], [200, 200, 429])
+            self.assertEqual(self.check_phone("9123456780").status_code, 200)
+
+    def test_rejected_ip_spends_no_phone_token(self):
+        for _ in range(3):
+            self.check_phone()
+        self.assertEqual(self.check_phone("9876543210").status_code, 429)
+        self.now += 40
+        self.assertEqual([self.check_phone("9876543210").status_code for _ in range(2)], [200, 200])
+
+    def test_rejections_are_counted(self):
+        for _ in range(5):
+            self.check_phone()
+        self.assertEqual(throttling.rejection_counts()["check_phone"], {"ip": 2, "phone": 0})
+
+    def test_forwarded_for_is_ignored_without_proxies(self):
+        for i in range(3):
+            self.check_phone(HTTP_X_FORWARDED_FOR=f"203.0.113.{i}")
+        self.assertEqual(self.check_phone(HTTP_X_FORWARDED_FOR="203.0.113.99").status_code, 429)
+
+    def test_forwarded_for_with_one_proxy(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+            for _ in range(3):
+                self.check_phone(HTTP_X_FORWARDED_FOR="203.0.113.1")
+            self.assertEqual(self.check_phone(HTTP_X_FORWARDED_FOR="203.0.113.1").status_code, 429)
+            self.assertEqual(self.check_phone(HTTP_X_FORWARDED_FOR="203.0.113.2").status_code, 200)
+
+    def test_disabled(self):
+        with override_settings(THROTTLE_ENABLED=False):
+            self.assertTrue(all(self.check_phone().status_code == 200 for _ in range(10)))
+
+    def test_parse_rate(self):
+        self.assertEqual(throttling.parse_rate("10/min"), (10, 60))
+        self.assertEqual(throttling.parse_rate("5/hour"), (5, 3600))
+        self.assertEqual(throttling.parse_rate("1/s"), (1, 1))
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_ALLOWED_IPS=["127.0.0.1", "10.0.0.0/8"], METRICS_TOKEN="")
+class MetricsAccessTests(TestCase):
+    def scrape(self, remote_addr, **headers):
+        return self.client.get("/metrics", REMOTE_ADDR=remote_addr, **headers)
+
+    def test_allowed_addresses(self):
+        for address in ("127.0.0.1", "10.1.2.3"):
+            response = self.scrape(address)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"putsf_http_requests_total", response.content)
+
+    def test_outside_callers_are_refused(self):
+        self.assertEqual(self.scrape("203.0.113.5").status_code, 403)
+        self.assertEqual(self.scrape("not-an-address").status_code, 403)
+
+    def test_proxied_requests_are_refused(self):
+        response = self.scrape("127.0.0.1", HTTP_X_FORWARDED_FOR="127.0.0.1")
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_bearer_token(self):
+        self.assertEqual(self.scrape("203.0.113.5", HTTP_AUTHORIZATION="Bearer s3cret").status_code, 200)
+        self.assertEqual(self.scrape("203.0.113.5", HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+        self.assertEqual(self.scrape("203.0.113.5", HTTP_AUTHORIZATION="s3cret").status_code, 403)
+
+    def test_empty_token_is_never_accepted(self):
+        self.assertEqual(self.scrape("203.0.113.5", HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+
+
+class ReadyzTests(TestCase):
+    def probe(self, health):
+        with mock.patch("putsf_backend.mongo.check_health", return_value=health):
+            return self.client.get("/readyz")
+
+    def test_ready(self):
+        response = self.probe({"ok": True, "latency_ms": 2.0, "error": None, "checked_at": time.time()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"status": "ok"})
+
+    def test_unavailable_details_are_logged_not_returned(self):
+        error = "cluster0-shard-00-01.abcde.mongodb.net:27017: timed out, replicaset: atlas-xyz"
+        with self.assertLogs("putsf_backend.views", "WARNING") as logs:
+            response = self.probe({"ok": False, "latency_ms": None, "error": error, "checked_at": time.time()})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {"status": "unavailable"})
+        self.assertIn("atlas-xyz", logs.output[0])
+        self.assertIn("throttle_rejections", logs.output[0])
+
+
+class ExportTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+        self.db.licenses.insert_many([
+            {"name": f"Member {i}", "phone": f"98765432{i:02d}", "is_approved": i % 2 == 0, "gender": "F"}
+            for i in range(5)
+        ])
+        self.db.licenses.insert_one({"name": "=HYPERLINK(\"http://evil\")", "phone": "9000000000", "is_approved": True})
+
+    def test_csv_chunks_per_batch(self):
+        chunks = list(exports.export_chunks("licenses", "csv", fields=["name", "phone"], batch_size=2))
+        # Header + 6 rows in batches of 2, then the (empty) remainder
+        self.assertEqual(len(chunks), 4)
+        lines = b"".join(chunks).decode().splitlines()
+        self.assertEqual(lines[0], "name,phone")
+        self.assertEqual(lines[1:6], [f"Member {i},98765432{i:02d}" for i in range(5)])
+
+    def test_ndjson_chunks_per_batch(self):
+        chunks = list(exports.export_chunks("licenses", "ndjson", fields=["phone"], batch_size=4))
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [4, 2])
+        rows = [json.loads(line) for line in b"".join(chunks).splitlines()]
+        self.assertEqual(rows[0], {"phone": "9876543200"})
+        self.assertEqual(len(rows), 6)
+
+    def test_view_streams_csv(self):
+        response = self.client.get("/api/export/licenses.csv", {"is_approved": "true", "fields": "name,phone"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("attachment;", response["Content-Disposition"])
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines, [
+            "name,phone", "Member 0,9876543200", "Member 2,9876543202", "Member 4,9876543204",
+            "\"'=HYPERLINK(\"\"http://evil\"\")\",9000000000",
+        ])
+
+    def test_view_streams_complaints_ndjson(self):
+        Complaint.objects.create(name="Ravi", phone="9876543210", message="+1 street light")
+        response = self.client.get("/api/export/complaints.ndjson", {"since": "2000-01-01"})
+        self.assertEqual(response.status_code, 200)
+        row = json.loads(b"".join(response.streaming_content))
+        self.assertEqual((row["name"], row["message"]), ("Ravi", "+1 street light"))
+
+    def test_formula_cells_are_escaped(self):
+        for value in ("=1+1", "+1", "-1", "@SUM(A1)", "\tx", "\rx"):
+            self.assertEqual(exports._cell(value), f"'{value}")
+        self.assertEqual(exports._cell("plain"), "plain")
+        self.assertEqual(exports._cell(None), "")
+
+    def test_invalid_requests(self):
+        for url, params, error in (
+            ("/api/export/members.csv", {}, "Unknown dataset: members."),
+            ("/api/export/licenses.xlsx", {}, "Unsupported format: xlsx."),
+            ("/api/export/licenses.csv", {"city": "x"}, "Unsupported filter: city."),
+            ("/api/export/licenses.csv", {"is_approved": "maybe"}, "Expected a boolean, got 'maybe'."),
+            ("/api/export/licenses.csv", {"fields": "name,password"}, "Unknown fields: password."),
+            ("/api/export/complaints.csv", {"since": "soon"}, "Expected an ISO date, got 'soon'."),
+        ):
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertEqual(response.json(), {"error": error})
+
+    def test_anonymous_callers_are_refused(self):
+        self.client.force_authenticate(None)
+        response = self.client.get("/api/export/licenses.csv")
+        self.assertEqual(response.status_code, 401)
+
+    def test_failing_first_batch_gets_503(self):
+        with mock.patch.object(self.db.licenses, "find", side_effect=AutoReconnect("down")):
+            response = self.client.get("/api/export/licenses.csv")
+        self.assertEqual(response.status_code, 503)
+
+
+def write_image(rel, size=(400, 300), mode="RGB", fmt="PNG"):
+    from PIL import Image
+
+    path = os.path.join(settings.MEDIA_ROOT, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new(mode, size, 1 if mode == "P" else (200, 30, 30)).save(path, fmt)
+    return path
+
+
+@override_settings(IMAGE_RESIZE_SIZES=["300x300", "600x600", "240x300"])
+class ResizeTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = write_image("gallery/photo.png")
+        patcher = mock.patch.object(resize, "_cache_bytes", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self, url, **headers):
+        response = self.client.get(url, **headers)
+        self.addCleanup(response.close)
+        return response
+
+    def image(self, response):
+        from PIL import Image
+
+        return Image.open(BytesIO(b"".join(response.streaming_content)))
+
+    def test_webp_for_clients_that_accept_it(self):
+        response = self.get("/media/resize/300x300/gallery/photo.png", HTTP_ACCEPT="image/webp,*/*")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("Accept", response["Vary"])
+        image = self.image(response)
+        self.assertEqual((image.format, image.size), ("WEBP", (300, 300)))
+
+    def test_jpeg_for_the_rest(self):
+        image = self.image(self.get("/media/resize/240x300/gallery/photo.png"))
+        self.assertEqual((image.format, image.size), ("JPEG", (240, 300)))
+
+    def test_palette_images(self):
+        write_image("gallery/palette.png", mode="P")
+        image = self.image(self.get("/media/resize/300x300/gallery/palette.png"))
+        self.assertEqual(image.size, (300, 300))
+
+    def test_sizes_outside_the_whitelist(self):
+        self.assertEqual(self.get("/media/resize/301x300/gallery/photo.png").status_code, 404)
+        self.assertEqual(self.get("/media/resize/9999x9999/gallery/photo.png").status_code, 404)
+
+    def test_rejected_paths(self):
+        write_image(".hidden/photo.png")
+        with open(os.path.join(settings.MEDIA_ROOT, "gallery", "notes.txt"), "w") as f:
+            f.write("not an image")
+        factory = RequestFactory()
+        for path in ("../photo.png", "gallery/../../etc/passwd.png", ".hidden/photo.png",
+                     "gallery/notes.txt", "gallery/missing.png"):
+            with self.assertRaises(Http404, msg=path):
+                resize_media(factory.get("/"), "300", "300", path)
+
+    def test_undecodable_image(self):
+        with open(os.path.join(settings.MEDIA_ROOT, "gallery", "broken.png"), "wb") as f:
+            f.write(b"not a png")
+        self.assertEqual(self.get("/media/resize/300x300/gallery/broken.png").status_code, 404)
+
+    def test_miss_renders_and_hit_reuses(self):
+        with mock.patch.object(resize, "render", wraps=resize.render) as render:
+            first = self.get("/media/resize/300x300/gallery/photo.png")
+            second = self.get("/media/resize/300x300/gallery/photo.png")
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(b"".join(first.streaming_content), b"".join(second.streaming_content))
+        self.assertEqual(self.get("/media/resize/300x300/gallery/photo.png", HTTP_IF_NONE_MATCH=first["ETag"]).status_code, 304)
+
+    def test_changed_source_is_rendered_again(self):
+        first = resize.cache_path(self.source, 300, 300, "webp")
+        write_image("gallery/photo.png", size=(500, 500))
+        os.utime(self.source, ns=(time.time_ns() + 10 ** 9,) * 2)
+        self.assertNotEqual(resize.cache_path(self.source, 300, 300, "webp"), first)
+
+    def test_hit_marks_entry_as_used(self):
+        resize.get(self.source, 300, 300, "webp").close()
+        target = resize.cache_path(self.source, 300, 300, "webp")
+        os.utime(target, (1, 1))
+        resize.get(self.source, 300, 300, "webp").close()
+        self.assertGreater(os.stat(target).st_mtime, time.time() - 60)
+
+    def test_prune_drops_least_recently_used(self):
+        paths = []
+        for age, (width, height) in zip((300, 200, 100), ((300, 300), (600, 600), (240, 300))):
+            resize.get(self.source, width, height, "jpeg").close()
+            path = resize.cache_path(self.source, width, height, "jpeg")
+            os.utime(path, (time.time() - age,) * 2)
+            paths.append(path)
+        newest = sum(os.path.getsize(path) for path in paths[1:])
+        with override_settings(IMAGE_RESIZE_CACHE_MAX_BYTES=newest / 0.9 + 1):
+            self.assertEqual(resize.prune(), newest)
+        self.assertEqual([os.path.exists(path) for path in paths], [False, True, True])
+
+    @override_settings(IMAGE_RESIZE_CACHE_MAX_BYTES=1)
+    def test_going_over_the_limit_prunes_but_keeps_open_files_readable(self):
+        f = resize.get(self.source, 300, 300, "webp")
+        self.addCleanup(f.close)
+        self.assertFalse(os.path.exists(resize.cache_path(self.source, 300, 300, "webp")))
+        self.assertTrue(f.read().startswith(b"RIFF"))
+
+
+def done(fn, *args):
+    """A future already holding ``fn(*args)``, like the pool's once the job has run."""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+@override_settings(IMAGE_VARIANT_WIDTHS=[640, 320, 1280], IMAGE_VARIANT_QUALITY=80)
+class ImageVariantTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = write_image("gallery/photo.png", size=(800, 600))
+
+    def variants(self, path, widths=(320, 640, 1280)):
+        return images.make_variants(path, list(widths), 80)
+
+    def test_variant_paths_and_sizes(self):
+        result = self.variants(self.source)
+        self.assertEqual(sorted(result), ["jpeg", "webp"])
+        self.assertEqual([(w, h) for w, h, _path in result["webp"]], [(320, 240), (640, 480)])
+
+        from PIL import Image
+
+        for name, fmt, ext in images.VARIANT_FORMATS:
+            for width, height, path in result[name]:
+                self.assertEqual(os.path.dirname(path), os.path.join(settings.MEDIA_ROOT, "gallery", "variants"))
+                self.assertRegex(os.path.basename(path), rf"^photo-[0-9a-f]{{12}}-{width}\.{ext}$")
+                with Image.open(path) as image:
+                    self.assertEqual((image.format, image.size), (fmt, (width, height)))
+
+    def test_small_originals_keep_their_width(self):
+        small = write_image("gallery/small.png", size=(200, 100))
+        result = self.variants(small)
+        self.assertEqual([(w, h) for w, h, _path in result["jpeg"]], [(200, 100)])
+
+    def test_palette_png_with_transparency(self):
+        from PIL import Image
+
+        path = os.path.join(settings.MEDIA_ROOT, "gallery", "logo.png")
+        Image.new("P", (800, 400), 0).save(path, "PNG", transparency=0)
+        result = self.variants(path, widths=(320,))
+        with Image.open(result["webp"][0][2]) as webp, Image.open(result["jpeg"][0][2]) as jpeg:
+            self.assertEqual((webp.mode, webp.size), ("RGBA", (320, 160)))
+            self.assertEqual((jpeg.mode, jpeg.size), ("RGB", (320, 160)))
+
+    def test_new_bytes_get_new_names(self):
+        before = self.variants(self.source)["jpeg"][0][2]
+        write_image("gallery/photo.png", size=(800, 600), mode="P")
+        after = self.variants(self.source)["jpeg"][0][2]
+        self.assertNotEqual(after, before)
+        images.remove_variants(self.source)
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, "gallery", "variants")), [])
+
+    def test_on_done_attaches_variants(self):
+        url = media.media_url(self.source)
+        doc_id = self.db.gallery_images.insert_one({"title": "Photo", "image_url": url}).inserted_id
+        images._on_done("gallery_images", doc_id, url, done(self.variants, self.source))
+
+        variants = self.db.gallery_images.find_one({"_id": doc_id})["image_variants"]
+        self.assertEqual([entry["width"] for entry in variants["webp"]], [320, 640])
+        self.assertEqual(variants["jpeg"][0]["height"], 240)
+        self.assertTrue(media.media_path(variants["jpeg"][0]["url"]).endswith("-320.jpg"))
+
+    def test_on_done_skips_replaced_images(self):
+        doc_id = self.db.gallery_images.insert_one(
+            {"title": "Photo", "image_url": "http://testserver/media/new.png"}
+        ).inserted_id
+        images._on_done("gallery_images", doc_id, media.media_url(self.source), done(self.variants, self.source))
+        self.assertNotIn("image_variants", self.db.gallery_images.find_one({"_id": doc_id}))
+
+    def test_on_done_logs_failures(self):
+        doc_id = self.db.gallery_images.insert_one({"title": "Photo", "image_url": "x"}).inserted_id
+        with self.assertLogs("putsf_backend.images", "ERROR"):
+            images._on_done("gallery_images", doc_id, "x", done(self.variants, "/nonexistent.png"))
+        self.assertNotIn("image_variants", self.db.gallery_images.find_one({"_id": doc_id}))
+
+    @override_settings(IMAGE_VARIANTS_ENABLED=True)
+    def test_upload_schedules_variants(self):
+        with open(self.source, "rb") as f:
+            image = upload("new.png", f.read())
+        with mock.patch.object(images, "_submit", side_effect=done):
+            response = self.client.post("/api/gallery/images/", {"title": "New", "image": image})
+        self.assertEqual(response.status_code, 201)
+        doc = self.db.gallery_images.find_one({"title": "New"})
+        self.assertEqual([entry["width"] for entry in doc["image_variants"]["webp"]], [320, 640])
+
+
+def command_event(name, ms, request_id=1, command=None):
+    """The parts of a pymongo command event the listeners read."""
+    return SimpleNamespace(
+        command_name=name, duration_micros=int(ms * 1000), connection_id=("localhost", 27017),
+        request_id=request_id, database_name="putsf_test", command=command or {name: "banners"},
+    )
+
+
+class PerformanceTests(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.banners.insert_one({"image_url": "http://testserver/media/a.jpg", "created_at": "2024-01-01T00:00:00"})
+
+    def list_banners(self, *durations):
+        """GET /api/banners/ as if each listing query sent commands taking ``durations`` ms."""
+        find = self.db.banners.find
+
+        def timed_find(*args, **kwargs):
+            for request_id, ms in enumerate(durations):
+                perf.command_listener.succeeded(command_event("find", ms, request_id))
+            return find(*args, **kwargs)
+
+        with mock.patch.object(self.db.banners, "find", side_effect=timed_find):
+            response = self.client.get("/api/banners/")
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_server_timing_header(self):
+        timing = self.list_banners(2.5, 5)["Server-Timing"]
+        self.assertRegex(
+            timing,
+            r'^app;dur=\d+\.\d, mongo;dur=7\.5;desc="2 cmds", db;dur=\d+\.\d;desc="\d+ queries", render;dur=\d+\.\d$',
+        )
+
+    def test_commands_are_counted_per_request(self):
+        self.list_banners(4)
+        # The second request is answered from the listing cache
+        self.assertIn('mongo;dur=0.0;desc="0 cmds"', self.list_banners(4)["Server-Timing"])
+
+    @override_settings(PERF_LOG=True)
+    def test_json_log_line(self):
+        with self.assertLogs("putsf_backend.perf", "INFO") as logs:
+            response = self.list_banners(1.5, 2)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(
+            sorted(line), ["bytes", "db", "method", "mongo", "path", "render_ms", "status", "view", "wall_ms"]
+        )
+        self.assertEqual((line["method"], line["path"], line["status"]), ("GET", "/api/banners/", 200))
+        self.assertTrue(line["view"].endswith("BannerAPIView"))
+        self.assertEqual(line["mongo"], {"count": 2, "ms": 3.5, "commands": {"find": 2}})
+        self.assertEqual(line["bytes"], len(response.content))
+        self.assertGreaterEqual(line["wall_ms"], line["render_ms"])
+
+    @override_settings(PERF_LOG=True)
+    def test_sql_queries_are_counted(self):
+        with self.assertLogs("putsf_backend.perf", "INFO") as logs:
+            self.client.post("/api/complaints/", {"name": "Ravi", "phone": "9876543210", "message": "Street light"})
+        self.assertGreater(json.loads(logs.records[0].getMessage())["db"]["count"], 0)
+
+    def test_commands_outside_requests_are_ignored(self):
+        perf.command_listener.succeeded(command_event("find", 10))
+        self.assertIsNone(perf.current())
+        self.assertIn('desc="0 cmds"', self.list_banners()["Server-Timing"])
+
+    @override_settings(PERF_ENABLED=False)
+    def test_disabled(self):
+        self.assertNotIn("Server-Timing", self.list_banners(1))
+
+
+EXPLAIN = {
+    "queryPlanner": {"winningPlan": {
+        "stage": "LIMIT",
+        "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "phone_unique"}},
+    }},
+    "executionStats": {"totalKeysExamined": 1, "totalDocsExamined": 1, "nReturned": 1, "executionTimeMillis": 0},
+}
+
+
+class SlowQueryShapeTests(SimpleTestCase):
+    def test_literals_are_replaced(self):
+        self.assertEqual(
+            slow_queries.shape({"phone": "9876543210", "age": {"$gte": 18}, "_id": {"$in": [1, 2, 3]}}),
+            {"phone": "?", "age": {"$gte": "?"}, "_id": {"$in": "?"}},
+        )
+
+    def test_same_structure_gives_same_shape(self):
+        first = {"$or": [{"name": {"$regex": "^ravi"}}, {"phone": "9876543210"}], "is_approved": True}
+        second = {"$or": [{"name": {"$regex": "^asha"}}, {"phone": "9123456780"}], "is_approved": False}
+        self.assertEqual(slow_queries.shape(first), slow_queries.shape(second))
+        self.assertNotEqual(slow_queries.shape(first), slow_queries.shape({"is_approved": True}))
+
+    def test_summarize(self):
+        self.assertEqual(slow_queries.summarize(EXPLAIN), {
+            "plan": ["IXSCAN phone_unique", "FETCH", "LIMIT"],
+            "keys_examined": 1, "docs_examined": 1, "returned": 1, "explain_ms": 0,
+        })
+
+    def test_summarize_aggregate_and_collection_scan(self):
+        explain = {"stages": [{"$cursor": {
+            "queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}},
+            "executionStats": {"totalKeysExamined": 0, "totalDocsExamined": 5000, "nReturned": 3},
+        }}, {"$group": {}}]}
+        summary = slow_queries.summarize(explain)
+        self.assertEqual(summary["plan"], ["COLLSCAN"])
+        self.assertEqual((summary["keys_examined"], summary["docs_examined"], summary["returned"]), (0, 5000, 3))
+
+
+@override_settings(SLOW_QUERY_MS=100, SLOW_QUERY_EXPLAIN=True, SLOW_QUERY_EXPLAIN_INTERVAL=600)
+class SlowQueryListenerTests(SimpleTestCase):
+    command = {"find": "licenses", "filter": {"phone": "9876543210"}, "sort": {"_id": 1}, "lsid": {"id": "x"}}
+
+    def setUp(self):
+        token = perf._current.set(perf.RequestStats())
+        self.addCleanup(perf._current.reset, token)
+        self.listener = slow_queries.SlowQueryListener()
+        patcher = mock.patch.dict(slow_queries._explained, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_command(self, ms, request_id=1, command=None):
+        event = command_event("find", ms, request_id, command or self.command)
+        self.listener.started(event)
+        self.listener.succeeded(event)
+
+    def test_fast_commands_are_not_logged(self):
+        with mock.patch.object(slow_queries, "_submit") as submit, \
+                mock.patch.object(slow_queries.logger, "warning") as warning:
+            self.run_command(99)
+        warning.assert_not_called()
+        submit.assert_not_called()
+
+    def test_slow_command_is_logged_without_values(self):
+        with mock.patch.object(slow_queries, "_submit"), \
+                self.assertLogs("putsf_backend.slow_queries", "WARNING") as logs:
+            self.run_command(150)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line, {
+            "slow_query": "find", "collection": "licenses", "view": None, "ms": 150.0,
+            "filter": {"phone": "?"}, "sort": {"_id": 1},
+        })
+        self.assertNotIn("9876543210", logs.output[0])
+
+    def test_explain_runs_in_the_background(self):
+        threads = []
+
+        def explain(*args):
+            threads.append(threading.current_thread().name)
+
+        with mock.patch.object(slow_queries, "_explain", side_effect=explain) as run, \
+                self.assertLogs("putsf_backend.slow_queries", "WARNING"):
+            self.run_command(150)
+            slow_queries._executor.submit(lambda: None).result()
+        run.assert_called_once()
+        database_name, command_name, command, context = run.call_args[0]
+        self.assertEqual((database_name, command_name, command), ("putsf_test", "find", self.command))
+        self.assertTrue(threads[0].startswith("mongo-explain"))
+
+    def test_each_shape_is_explained_once_per_interval(self):
+        other_phone = dict(self.command, filter={"phone": "9123456780"})
+        other_shape = dict(self.command, filter={"name": "Ravi"})
+        with mock.patch.object(slow_queries, "_submit") as submit, self.assertLogs("putsf_backend.slow_queries"):
+            self.run_command(150, 1)
+            self.run_command(150, 2, other_phone)
+            self.run_command(150, 3, other_shape)
+        explained = [call[0][2]["filter"] for call in submit.call_args_list]
+        self.assertEqual(explained, [{"phone": "9876543210"}, {"name": "Ravi"}])
+
+    @override_settings(SLOW_QUERY_EXPLAIN=False)
+    def test_explain_can_be_turned_off(self):
+        with mock.patch.object(slow_queries, "_submit") as submit, self.assertLogs("putsf_backend.slow_queries"):
+            self.run_command(150)
+        submit.assert_not_called()
+
+    def test_commands_outside_requests_are_ignored(self):
+        perf._current.set(None)
+        with mock.patch.object(slow_queries, "_submit") as submit, \
+                mock.patch.object(slow_queries.logger, "warning") as warning:
+            self.run_command(500)
+        warning.assert_not_called()
+        submit.assert_not_called()
+
+    def test_explain_logs_a_summary(self):
+        client = mock.MagicMock()
+        client["putsf_test"].command.return_value = EXPLAIN
+        with mock.patch("putsf_backend.mongo.get_client", return_value=client), \
+                self.assertLogs("putsf_backend.slow_queries", "WARNING") as logs:
+            slow_queries._explain("putsf_test", "find", self.command, {"slow_query": "find"})
+
+        client["putsf_test"].command.assert_called_once_with(
+            "explain", {"find": "licenses", "filter": {"phone": "9876543210"}, "sort": {"_id": 1}},
+            verbosity="executionStats",
+        )
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["explain"]["plan"], ["IXSCAN phone_unique", "FETCH", "LIMIT"])
@@ -0,0 +1,186 @@
+# putsf_backend/exports.py
+"""
+Streaming CSV / NDJSON exports of member data.
+
+Rows are read through a batched cursor (Mongo ``batch_size`` / Django
+``iterator(chunk_size=...)``) and encoded a batch at a time, so an export
+of any size runs in constant memory. Used by the ``/api/export/<dataset>.<fmt>``
+view and the ``export_data`` management command.
+
+Usage::
+
+    from putsf_backend.exports import export_chunks
+
+    for chunk in export_chunks("licenses", "csv", {"is_approved": "true"}):
+        out.write(chunk)
+"""
+import csv
+import datetime
+import io
+import itertools
+
+from bson import ObjectId
+
+from putsf_backend.renderers import dumps
+
+EXPORT_FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+EXPORT_BATCH_SIZE = 500
+
+
+class ExportError(ValueError):
+    """Invalid dataset, format, filter or field selection."""
+
+
+def _parse_bool(value):
+    value = str(value or "").strip().lower()
+    if value in ("true", "1", "yes"):
+        return True
+    if value in ("false", "0", "no"):
+        return False
+    raise ExportError(f"Expected a boolean, got {value!r}.")
+
+
+def _parse_date(value):
+    # Same parsing as the complaints list filters of the same name
+    from putsf_backend.complaints.views import parse_timestamp
+
+    parsed = parse_timestamp(value)
+    if parsed is None:
+        raise ExportError(f"Expected an ISO date, got {value!r}.")
+    return parsed
+
+
+# -----------------------------
+# Datasets
+# -----------------------------
+LICENSE_EXPORT_FIELDS = (
+    "_id", "name", "gender", "education", "phone", "address", "aadhar_number",
+    "photo", "is_approved", "license_pdf", "card_status",
+)
+
+COMPLAINT_EXPORT_FIELDS = ("id", "name", "phone", "message", "created_at")
+
+
+def _license_rows(filters, fields, batch_size):
+    from putsf_backend.mongo import get_collection
+
+    collection = get_collection("licenses")
+    if collection is None:
+        raise ExportError("MongoDB not connected")
+
+    query = {}
+    for key, value in filters.items():
+        if key == "is_approved":
+            query["is_approved"] = _parse_bool(value)
+        elif key in ("phone", "gender", "education"):
+            query[key] = value
+        else:
+            raise ExportError(f"Unsupported filter: {key}.")
+
+    projection = {field: 1 for field in fields}
+    if "_id" not in fields:
+        projection["_id"] = 0
+    return collection.find(query, projection).sort("_id", 1).batch_size(batch_size)
+
+
+def _complaint_rows(filters, fields, batch_size):
+    from putsf_backend.complaints.models import Complaint
+
+    queryset = Complaint.objects.order_by("id")
+    for key, value in filters.items():
+        if key == "phone":
+            queryset = queryset.filter(phone=value)
+        elif key == "since":
+            queryset = queryset.filter(created_at__gte=_parse_date(value))
+        elif key == "until":
+            queryset = queryset.filter(created_at__lt=_parse_date(value))
+        else:
+            raise ExportError(f"Unsupported filter: {key}.")
+    return queryset.values(*fields).iterator(chunk_size=batch_size)
+
+
+DATASETS = {
+    "licenses": (LICENSE_EXPORT_FIELDS, _license_rows),
+    "complaints": (COMPLAINT_EXPORT_FIELDS, _complaint_rows),
+}
+
+
+# -----------------------------
+# Encoding
+# -----------------------------
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    value = str(value)
+    # Keep spreadsheet apps from evaluating user-entered text as formulas
+    if value[:1] in ("=", "+", "-", "@", "\t", "\r"):
+        return f"'{value}"
+    return value
+
+
+def _csv_chunks(rows, fields, batch_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    count = 0
+    for row in rows:
+        writer.writerow([_cell(row.get(field)) for field in fields])
+        count += 1
+        if count % batch_size == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _ndjson_chunks(rows, fields, batch_size):
+    lines = []
+    for row in rows:
+        lines.append(dumps({field: row.get(field) for field in fields}))
+        if len(lines) >= batch_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+
+def resolve(dataset, fmt, fields=None):
+    """Validate an export request; returns the field tuple to export."""
+    if dataset not in DATASETS:
+        raise ExportError(f"Unknown dataset: {dataset}.")
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported format: {fmt}.")
+
+    allowed = DATASETS[dataset][0]
+    if not fields:
+        return allowed
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ExportError(f"Unknown fields: {', '.join(unknown)}.")
+    return tuple(fields)
+
+
+def export_chunks(dataset, fmt, filters=None, fields=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Return an iterator of the encoded export as ``bytes`` chunks of
+    ``batch_size`` rows.
+
+    Invalid requests raise ``ExportError``. Cursors are lazy, so the first
+    batch is fetched here: a failing query raises ``PyMongoError`` /
+    ``DatabaseError`` from this call, before any response has started.
+    A failure on a later batch still ends the stream early.
+    """
+    fields = resolve(dataset, fmt, fields)
+    rows = iter(DATASETS[dataset][1](filters or {}, fields, batch_size))
+    first = list(itertools.islice(rows, 1))
+    rows = itertools.chain(first, rows)
+    encode = _csv_chunks if fmt == "csv" else _ndjson_chunks
+    return encode(rows, fields, batch_size)
@@ -0,0 +1,8 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+MONGO_INDEXES = {
+    "gallery_images": [
+        IndexModel([("title", ASCENDING)], name="title_unique", unique=True),
+        IndexModel([("created_at", DESCENDING)], name="created_at_desc"),
+    ],
+}
@@ -2,34 +2,38 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.conf import settings
-from putsf_backend.mongo import db
+from putsf_backend.mongo import get_collection
+from putsf_backend.cache import read_through, invalidate, conditional
+from putsf_backend import images, media
+from putsf_backend.uploads import UploadLimitMixin, UploadLimits
+from putsf_backend.core.indexes import has_index
 from django.utils import timezone
 from bson.objectid import ObjectId
-import os
+from pymongo.errors import DuplicateKeyError
 from urllib.parse import urlparse
 
 
-class GalleryImageAPIView(APIView):
+class GalleryImageAPIView(UploadLimitMixin, APIView):
     parser_classes = (MultiPartParser, FormParser)
+    upload_limits = UploadLimits("gallery")
 
+    @conditional("gallery_images")
     def get(self, request, mongo_id=None):
         """
         GET all images or a single image by ID
         """
-        images_collection = db["gallery_images"]
+        images_collection = get_collection("gallery_images")
         try:
             if mongo_id:
                 image = images_collection.find_one({"_id": ObjectId(mongo_id)})
                 if not image:
                     return Response({"error": "Image not found"}, status=status.HTTP_404_NOT_FOUND)
-                image["_id"] = str(image["_id"])
                 return Response(image)
             else:
-                images = list(images_collection.find({}).sort("created_at", -1))
-                for img in images:
-                    img["_id"] = str(img["_id"])
-                return Response(images)
+                def load():
+                    return list(images_collection.find({}).sort("created_at", -1))
+
+                return Response(read_through("gallery_images", load))
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -37,7 +41,7 @@ class GalleryImageAPIView(APIView):
         """
         POST a new image with title
         """
-        images_collection = db["gallery_images"]
+        images_collection = get_collection("gallery_images")
 
         image_file = request.FILES.get("image")
         title = request.data.get("title")
@@ -45,26 +49,33 @@ class GalleryImageAPIView(APIView):
         if not image_file or not title:
             return Response({"error": "Title and image are required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if images_collection.find_one({"title": title}):
+        # Without the title_unique index (not built yet) duplicates are looked up
+        if not has_index(images_collection, "title_unique") and images_collection.find_one({"title": title}, {"_id": 1}):
             return Response({"error": "Image with this title already exists"}, status=status.HTTP_400_BAD_REQUEST)
 
-        media_dir = os.path.join(settings.MEDIA_ROOT, "gallery")
-        os.makedirs(media_dir, exist_ok=True)
-        file_path = os.path.join(media_dir, image_file.name)
-
-        with open(file_path, "wb+") as f:
-            for chunk in image_file.chunks():
-                f.write(chunk)
-
-        full_url = f"{settings.SITE_DOMAIN}/media/gallery/{image_file.name}"
+        image_id = ObjectId()
+        owner = media.owner("gallery_images", image_id)
+        try:
+            file_path, full_url = media.store(image_file, owner)
+        except Exception as e:
+            return Response({"error": f"Failed to save image: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
         data = {
+            "_id": image_id,
             "title": title,
             "image_url": full_url,
             "created_at": timezone.now().isoformat()
         }
 
-        result = images_collection.insert_one(data)
+        # The title_unique index rejects duplicates, including concurrent ones
+        try:
+            result = images_collection.insert_one(data)
+        except DuplicateKeyError:
+            media.release(full_url, owner)
+            return Response({"error": "Image with this title already exists"}, status=status.HTTP_400_BAD_REQUEST)
+
+        invalidate("gallery_images")
+        images.schedule("gallery_images", result.inserted_id, file_path, full_url)
         return Response(
             {"message": "Image added successfully!", "_id": str(result.inserted_id), "image_url": full_url},
             status=status.HTTP_201_CREATED
@@ -74,7 +85,7 @@ class GalleryImageAPIView(APIView):
         """
         PATCH (update) gallery image by ID (supports title and optional image)
         """
-        images_collection = db["gallery_images"]
+        images_collection = get_collection("gallery_images")
 
         try:
             image = images_collection.find_one({"_id": ObjectId(mongo_id)})
@@ -88,30 +99,32 @@ class GalleryImageAPIView(APIView):
             if title:
                 update_data["title"] = title
 
+            owner = media.owner("gallery_images", image["_id"])
+            old_image_url = image.get("image_url")
             if image_file:
-                media_dir = os.path.join(settings.MEDIA_ROOT, "gallery")
-                os.makedirs(media_dir, exist_ok=True)
-                file_path = os.path.join(media_dir, image_file.name)
-
-                with open(file_path, "wb+") as f:
-                    for chunk in image_file.chunks():
-                        f.write(chunk)
-
-                full_url = f"{settings.SITE_DOMAIN}/media/gallery/{image_file.name}"
+                file_path, full_url = media.store(image_file, owner)
                 update_data["image_url"] = full_url
-
-                # Remove old image
-                old_image_url = image.get("image_url")
-                if old_image_url and old_image_url != full_url:
-                    filename = os.path.basename(old_image_url)
-                    old_path = os.path.join(settings.MEDIA_ROOT, "gallery", filename)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
+                if full_url != old_image_url:
+                    update_data["image_variants"] = None
 
             if not update_data:
                 return Response({"error": "No valid fields to update"}, status=status.HTTP_400_BAD_REQUEST)
 
-            images_collection.update_one({"_id": ObjectId(mongo_id)}, {"$set": update_data})
+            replaced = image_file and old_image_url != full_url
+            try:
+                images_collection.update_one({"_id": ObjectId(mongo_id)}, {"$set": update_data})
+            except DuplicateKeyError:
+                if replaced:
+                    media.release(full_url, owner)
+                return Response({"error": "Image with this title already exists"}, status=status.HTTP_400_BAD_REQUEST)
+            invalidate("gallery_images")
+
+            # Release the old image only once the document points at the new one
+            if replaced:
+                images.schedule("gallery_images", image["_id"], file_path, full_url)
+                if old_image_url:
+                    media.release(old_image_url, owner)
+
             image.update(update_data)
             image["_id"] = str(image["_id"])
 
@@ -124,21 +137,17 @@ class GalleryImageAPIView(APIView):
         """
         DELETE an image by ID
         """
-        images_collection = db["gallery_images"]
+        images_collection = get_collection("gallery_images")
 
         try:
             image = images_collection.find_one({"_id": ObjectId(mongo_id)})
             if not image:
                 return Response({"error": "Image not found"}, status=status.HTTP_404_NOT_FOUND)
 
-            image_url = image.get("image_url")
-            if image_url:
-                filename = os.path.basename(image_url)
-                file_path = os.path.join(settings.MEDIA_ROOT, "gallery", filename)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-
             images_collection.delete_one({"_id": ObjectId(mongo_id)})
+            invalidate("gallery_images")
+            if image.get("image_url"):
+                media.release(image["image_url"], media.owner("gallery_images", image["_id"]))
             return Response({"message": "Image deleted successfully!"}, status=status.HTTP_200_OK)
 
         except Exception as e:
@@ -0,0 +1,178 @@
+# putsf_backend/images.py
+"""
+Responsive image variants for gallery, blog and banner uploads.
+
+After an upload is stored, ``schedule(collection, doc_id, path, image_url)``
+hands the original to a small process pool that writes resized WebP and
+JPEG copies (EXIF stripped, orientation applied) next to it under
+``variants/``. When they are ready the document gets an ``image_variants``
+field the client can turn into ``srcset``::
+
+    "image_variants": {
+        "webp": [{"width": 320, "height": 213, "url": "..."}, ...],
+        "jpeg": [...]
+    }
+
+Variant names include a hash of the original's bytes, so re-uploading a
+file under the same name never serves stale variants. Variants belong to
+the stored file, not to a document: ``putsf_backend.media`` removes them
+together with the file once nothing references it.
+"""
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+
+from putsf_backend.media import media_url
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = "variants"
+
+# Pillow format name and file extension per variant type
+VARIANT_FORMATS = (("webp", "WEBP", "webp"), ("jpeg", "JPEG", "jpg"))
+
+# <source stem>-<content hash>-<width>.<ext>
+VARIANT_NAME = re.compile(r"^(.+)-[0-9a-f]{12}-\d+\.(webp|jpg)$")
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+# -----------------------------
+# Pool side
+# -----------------------------
+def _save_atomic(image, target, pil_format, quality):
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        options = {"quality": quality}
+        if pil_format == "JPEG":
+            options.update(optimize=True, progressive=True)
+        else:
+            options.update(method=4)
+        # No exif=/icc_profile= here: the metadata of the original is dropped
+        image.save(tmp_path, pil_format, **options)
+        os.replace(tmp_path, target)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def make_variants(src_path, widths, quality):
+    """
+    Write resized copies of ``src_path``; runs in a pool process.
+
+    Widths larger than the original are skipped (the original width is
+    used instead when every requested width is larger). Returns
+    ``{"webp": [(width, height, path), ...], "jpeg": [...]}``.
+    """
+    from PIL import Image, ImageOps
+
+    with open(src_path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+
+    out_dir = os.path.join(os.path.dirname(src_path), VARIANT_DIR)
+    os.makedirs(out_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+
+    with Image.open(src_path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+        targets = sorted({w for w in widths if w < image.width}) or [image.width]
+        result = {name: [] for name, _format, _ext in VARIANT_FORMATS}
+        for width in targets:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for name, pil_format, ext in VARIANT_FORMATS:
+                out = resized.convert("RGB") if pil_format == "JPEG" and resized.mode != "RGB" else resized
+                target = os.path.join(out_dir, f"{stem}-{digest}-{width}.{ext}")
+                if not os.path.exists(target):
+                    _save_atomic(out, target, pil_format, quality)
+                result[name].append((width, height, target))
+    return result
+
+
+# -----------------------------
+# Request side
+# -----------------------------
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        # spawn: pool processes must not inherit Mongo clients or locks
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_VARIANT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        _executor_pid = pid
+    return _executor
+
+
+def _submit(fn, *args):
+    global _executor
+    with _lock:
+        try:
+            return _get_executor().submit(fn, *args)
+        except BrokenProcessPool:
+            _executor = None
+            return _get_executor().submit(fn, *args)
+
+
+def _on_done(collection_name, doc_id, image_url, future):
+    from putsf_backend.cache import invalidate
+    from putsf_backend.mongo import get_collection
+
+    error = future.exception()
+    if error is not None:
+        logger.error(f"❌ Image variants failed for {collection_name}/{doc_id}: {error}")
+        return
+
+    variants = {
+        name: [{"width": w, "height": h, "url": media_url(path)} for w, h, path in entries]
+        for name, entries in future.result().items()
+    }
+    collection = get_collection(collection_name)
+    if collection is None:
+        return
+    # Only attach if the document still shows the image these were made from
+    result = collection.update_one(
+        {"_id": doc_id, "image_url": image_url},
+        {"$set": {"image_variants": variants}},
+    )
+    if result.modified_count:
+        invalidate(collection_name)
+
+
+def schedule(collection_name, doc_id, path, image_url):
+    """Generate variants for the upload at ``path`` in the background."""
+    if not settings.IMAGE_VARIANTS_ENABLED:
+        return None
+    future = _submit(make_variants, path, settings.IMAGE_VARIANT_WIDTHS, settings.IMAGE_VARIANT_QUALITY)
+    future.add_done_callback(lambda f: _on_done(collection_name, doc_id, image_url, f))
+    return future
+
+
+def remove_variants(src_path):
+    """Delete every variant generated from the original at ``src_path``."""
+    out_dir = os.path.join(os.path.dirname(src_path), VARIANT_DIR)
+    stem = os.path.splitext(os.path.basename(src_path))[0]
+    pattern = re.compile(rf"^{re.escape(stem)}-[0-9a-f]{{12}}-\d+\.(webp|jpg)$")
+    try:
+        names = os.listdir(out_dir)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if pattern.match(name):
+            try:
+                os.remove(os.path.join(out_dir, name))
+            except OSError:
+                pass
@@ -0,0 +1,465 @@
+# putsf_backend/license/cards.py
+"""
+Membership-card PDF pipeline.
+
+Rendering ``license_template.html`` with WeasyPrint takes seconds, so it
+never runs inside a request: ``enqueue(license_doc)`` hands the job to a
+small process pool and returns immediately. Each PDF is stored under
+``MEDIA_ROOT/licenses/cards/<hash>.pdf`` where the hash covers the member
+data and the template source, so a card is only re-rendered when one of
+them changes and ``download_license`` can serve the stored file directly.
+
+Rendering is self-contained: fonts are bundled in ``protected_static/fonts``,
+the QR code is generated locally, and network fetches are refused unless
+``LICENSE_CARD_ALLOW_NETWORK`` is set. Each pool process builds one
+``CardRenderer`` that keeps the font configuration, parsed stylesheet and
+static images warm across renders; ``render_batch`` re-renders many cards
+in one pass (e.g. after a template change).
+"""
+import hashlib
+import json
+import logging
+import mimetypes
+import multiprocessing
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import unquote, urlparse
+
+from django.conf import settings
+
+from putsf_backend import media
+
+try:
+    import segno
+except ImportError:  # pragma: no cover - falls back to a remote QR image
+    segno = None
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_NAME = "license_template.html"
+
+# Document fields that appear on the card
+CARD_FIELDS = ("name", "gender", "education", "phone", "address", "aadhar_number", "photo", "is_approved")
+
+# (font-family, font-weight, file in protected_static/fonts); missing files are skipped
+FONT_FILES = (
+    ("Source Sans Pro", 400, "SourceSansPro-Regular.ttf"),
+    ("Source Sans Pro", 600, "SourceSansPro-Semibold.ttf"),
+    ("Playfair Display", 700, "PlayfairDisplay-Bold.ttf"),
+)
+
+_executor = None
+_executor_pid = None
+_inflight = {}  # hash -> Future
+_lock = threading.Lock()
+_template_digest = None
+
+
+# -----------------------------
+# Paths & hashing
+# -----------------------------
+def _template_path():
+    return os.path.join(settings.BASE_DIR, "putsf_backend", "templates", TEMPLATE_NAME)
+
+
+def template_digest():
+    """sha256 of the template source (read once per process)."""
+    global _template_digest
+    if _template_digest is None:
+        with open(_template_path(), "rb") as f:
+            _template_digest = hashlib.sha256(f.read()).hexdigest()
+    return _template_digest
+
+
+def card_hash(license_doc):
+    """Content hash of everything that ends up on the rendered card."""
+    payload = {field: license_doc.get(field) for field in CARD_FIELDS}
+    payload["id"] = str(license_doc["_id"])
+
+    # A photo replaced under the same name still changes the card
+    photo_path = media.media_path(license_doc.get("photo"))
+    if photo_path and os.path.exists(photo_path):
+        stat = os.stat(photo_path)
+        payload["photo_stat"] = [stat.st_size, stat.st_mtime_ns]
+
+    digest = hashlib.sha256(template_digest().encode())
+    digest.update(json.dumps(payload, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def artifact_path(digest):
+    return os.path.join(settings.MEDIA_ROOT, settings.LICENSE_CARD_DIR, f"{digest}.pdf")
+
+
+def artifact_url(digest):
+    return f"{settings.SITE_DOMAIN}{settings.MEDIA_URL}{settings.LICENSE_CARD_DIR}/{digest}.pdf"
+
+
+def cached_artifact(license_doc):
+    """Path of an up-to-date rendered card for ``license_doc``, or None."""
+    path = artifact_path(card_hash(license_doc))
+    return path if os.path.exists(path) else None
+
+
+# -----------------------------
+# Rendering
+# -----------------------------
+def _static_dir():
+    return os.path.join(settings.BASE_DIR, "putsf_backend", "protected_static")
+
+
+def qr_code_url(license_id):
+    verify_url = f"https://putsf.com/verify/{license_id}"
+    if segno is None:
+        return f"https://api.qrserver.com/v1/create-qr-code/?size=120x120&data={verify_url}"
+    return segno.make(verify_url, error="m").svg_data_uri(scale=4, border=1)
+
+
+def render_context(license_doc):
+    static_dir = _static_dir()
+    logo_url = f"file://{os.path.join(static_dir, 'putsf_logo.jpg')}"
+
+    license_data = dict(license_doc)
+    license_data["id"] = str(license_doc["_id"])
+    photo_path = media.media_path(license_doc.get("photo"))
+    license_data["photo"] = f"file://{photo_path}" if photo_path and os.path.exists(photo_path) else None
+
+    return {
+        "license": license_data,
+        "logo_url": logo_url,
+        "putsf_logo_url": logo_url,
+        "signature_url": f"file://{os.path.join(static_dir, 'signature_blue.png')}",
+        "default_photo": logo_url,
+        "qr_code_url": qr_code_url(license_data["id"]),
+        "base_url": f"file://{static_dir}/",
+    }
+
+
+def render_html(license_doc):
+    from django.template.loader import render_to_string
+
+    context = render_context(license_doc)
+    return render_to_string(TEMPLATE_NAME, context), context["base_url"]
+
+
+class CardRenderer:
+    """
+    WeasyPrint state shared by every render in one process.
+
+    Static files (logo, signature, fonts) are read once and served from
+    memory, the @font-face stylesheet is parsed once against a single
+    ``FontConfiguration``, and decoded static images stay in WeasyPrint's
+    image cache. Member photos are read per render and not kept.
+    """
+
+    def __init__(self, static_dir, allow_network=False):
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.static_dir = os.path.abspath(static_dir)
+        self.static_prefix = f"file://{self.static_dir}/"
+        self.allow_network = allow_network
+        self.static_files = self._load_static_files()
+        self.font_config = FontConfiguration()
+        self.stylesheets = [
+            CSS(string=self._font_face_css(), font_config=self.font_config, url_fetcher=self.fetch)
+        ]
+        self.image_cache = {}
+
+    def _load_static_files(self):
+        files = {}
+        for root, _dirs, names in os.walk(self.static_dir):
+            for name in names:
+                path = os.path.join(root, name)
+                with open(path, "rb") as f:
+                    files[path] = f.read()
+        return files
+
+    def _font_face_css(self):
+        rules = []
+        for family, weight, filename in FONT_FILES:
+            path = os.path.join(self.static_dir, "fonts", filename)
+            if path in self.static_files:
+                rules.append(
+                    f'@font-face {{ font-family: "{family}"; font-weight: {weight}; '
+                    f'src: url("file://{path}"); }}'
+                )
+        return "\n".join(rules)
+
+    def fetch(self, url):
+        from weasyprint import default_url_fetcher
+
+        if url.startswith("file://"):
+            path = unquote(urlparse(url).path)
+            data = self.static_files.get(path)
+            if data is None:
+                with open(path, "rb") as f:
+                    data = f.read()
+            return {"string": data, "mime_type": mimetypes.guess_type(path)[0], "redirected_url": url}
+        if url.startswith("data:") or self.allow_network:
+            return default_url_fetcher(url, timeout=5)
+        raise ValueError(f"Network access disabled for card rendering: {url}")
+
+    def write_pdf(self, html, base_url, target):
+        """Render ``html`` and atomically place the PDF at ``target``."""
+        from weasyprint import HTML
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        try:
+            HTML(string=html, base_url=base_url, url_fetcher=self.fetch).write_pdf(
+                tmp_path,
+                stylesheets=self.stylesheets,
+                font_config=self.font_config,
+                cache=self.image_cache,
+            )
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            # Keep decoded static images, drop member photos
+            for key in [k for k in self.image_cache if not str(k).startswith(self.static_prefix)]:
+                del self.image_cache[key]
+        return target
+
+
+# Pool-process side: one renderer per process, built by the pool initializer
+_renderer = None
+_renderer_error = None
+
+
+def _init_worker(static_dir, allow_network):
+    global _renderer, _renderer_error
+    try:
+        _renderer = CardRenderer(static_dir, allow_network)
+    except Exception as e:
+        # Reported per job instead of breaking the whole pool
+        _renderer_error = e
+
+
+def write_pdf(html, base_url, target):
+    if _renderer is None:
+        raise RuntimeError(f"Card renderer unavailable: {_renderer_error}")
+    return _renderer.write_pdf(html, base_url, target)
+
+
+def write_pdf_batch(jobs):
+    """Render ``[(html, base_url, target), ...]``; returns ``[error or None, ...]``."""
+    errors = []
+    for html, base_url, target in jobs:
+        try:
+            write_pdf(html, base_url, target)
+            errors.append(None)
+        except Exception as e:
+            errors.append(str(e))
+    return errors
+
+
+# -----------------------------
+# Queue
+# -----------------------------
+def _get_executor():
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        # spawn: pool processes must not inherit Mongo clients or locks
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.LICENSE_CARD_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(_static_dir(), settings.LICENSE_CARD_ALLOW_NETWORK),
+        )
+        _executor_pid = pid
+    return _executor
+
+
+def _submit(fn, *args):
+    """Submit to the pool, replacing it once if a worker died."""
+    global _executor
+    try:
+        return _get_executor().submit(fn, *args)
+    except BrokenProcessPool:
+        _executor = None
+        return _get_executor().submit(fn, *args)
+
+
+def _on_rendered(license_id, digest, future):
+    from putsf_backend.mongo import get_collection
+    from putsf_backend.cache import invalidate
+
+    with _lock:
+        _inflight.pop(digest, None)
+
+    collection = get_collection("licenses")
+    if collection is None:
+        return
+
+    error = future.exception()
+    if error is not None:
+        logger.error(f"❌ Membership card render failed for {license_id}: {error}")
+        collection.update_one(
+            {"_id": license_id, "card_hash": digest},
+            {"$set": {"card_status": "failed", "card_error": str(error)}},
+        )
+    else:
+        # Only mark ready if the member wasn't edited again in the meantime
+        previous = collection.find_one_and_update(
+            {"_id": license_id, "card_hash": digest},
+            {"$set": {"card_status": "ready", "license_pdf": artifact_url(digest)}, "$unset": {"card_error": ""}},
+            projection={"license_pdf": 1},
+        )
+        if previous is not None:
+            _remove_stale(previous.get("license_pdf"), digest)
+    invalidate("licenses")
+
+
+def _remove_stale(old_url, digest):
+    """Delete the card a member had before their data changed."""
+    old_path = media.media_path(old_url)
+    if old_path and os.path.basename(old_path) != f"{digest}.pdf":
+        try:
+            os.remove(old_path)
+        except OSError:
+            pass
+
+
+def enqueue(license_doc, collection=None):
+    """
+    Make sure an up-to-date card exists for ``license_doc``.
+
+    Returns ``(status, digest)``: ``"ready"`` if the artifact is already on
+    disk, otherwise ``"pending"`` after scheduling (or joining) a render.
+    When ``collection`` is given the document's card fields are updated.
+    """
+    digest = card_hash(license_doc)
+
+    if os.path.exists(artifact_path(digest)):
+        if collection is not None and license_doc.get("card_hash") != digest:
+            collection.update_one(
+                {"_id": license_doc["_id"]},
+                {"$set": {"card_hash": digest, "card_status": "ready", "license_pdf": artifact_url(digest)}},
+            )
+        return "ready", digest
+
+    if collection is not None:
+        collection.update_one(
+            {"_id": license_doc["_id"]},
+            {"$set": {"card_hash": digest, "card_status": "pending"}},
+        )
+
+    with _lock:
+        future = _inflight.get(digest)
+        submitted = future is None
+        if submitted:
+            html, base_url = render_html(license_doc)
+            future = _submit(write_pdf, html, base_url, artifact_path(digest))
+            _inflight[digest] = future
+    if submitted:
+        # Outside the lock: the callback may run immediately in this thread
+        license_id = license_doc["_id"]
+        future.add_done_callback(lambda f: _on_rendered(license_id, digest, f))
+    return "pending", digest
+
+
+def remove(license_doc):
+    """Delete the stored card of a license that is being removed."""
+    path = media.media_path(license_doc.get("license_pdf"))
+    if path:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def render_batch(license_docs, collection=None, chunk_size=25, force=False):
+    """
+    Render cards for many licenses in one pass.
+
+    Cards already on disk are skipped unless ``force``; the rest are sent to
+    the pool in chunks so each process renders many cards with its warm
+    assets. Returns ``{"ready": n, "rendered": n, "failed": {id: error}}``.
+    """
+    from pymongo import UpdateOne
+
+    summary = {"ready": 0, "rendered": 0, "failed": {}}
+    max_inflight = settings.LICENSE_CARD_WORKERS * 2
+    inflight = {}  # Future -> [(license_id, digest, old_pdf), ...]
+    updates = []
+
+    def save():
+        if collection is not None and updates:
+            collection.bulk_write(updates, ordered=False)
+        updates.clear()
+
+    def collect(done):
+        for future in done:
+            keys = inflight.pop(future)
+            try:
+                errors = future.result()
+            except Exception as e:
+                errors = [str(e)] * len(keys)
+            for (license_id, digest, old_pdf), error in zip(keys, errors):
+                if error:
+                    summary["failed"][str(license_id)] = error
+                    fields = {"card_hash": digest, "card_status": "failed", "card_error": error}
+                else:
+                    summary["rendered"] += 1
+                    fields = {"card_hash": digest, "card_status": "ready", "license_pdf": artifact_url(digest)}
+                    _remove_stale(old_pdf, digest)
+                updates.append(UpdateOne({"_id": license_id}, {"$set": fields}))
+        save()
+
+    def flush(chunk):
+        jobs = [job for _key, job in chunk]
+        inflight[_submit(write_pdf_batch, jobs)] = [key for key, _job in chunk]
+        if len(inflight) >= max_inflight:
+            done, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+            collect(done)
+
+    chunk = []
+    for license_doc in license_docs:
+        digest = card_hash(license_doc)
+        target = artifact_path(digest)
+        if not force and os.path.exists(target):
+            summary["ready"] += 1
+            if license_doc.get("card_hash") != digest:
+                fields = {"card_hash": digest, "card_status": "ready", "license_pdf": artifact_url(digest)}
+                updates.append(UpdateOne({"_id": license_doc["_id"]}, {"$set": fields}))
+            continue
+        html, base_url = render_html(license_doc)
+        key = (license_doc["_id"], digest, license_doc.get("license_pdf"))
+        chunk.append((key, (html, base_url, target)))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    collect(wait(list(inflight)).done)
+    save()
+    if collection is not None:
+        from putsf_backend.cache import invalidate
+        invalidate("licenses")
+    return summary
+
+
+def _render_batch_logged(license_docs, collection):
+    try:
+        summary = render_batch(license_docs, collection=collection)
+    except Exception as e:
+        logger.error(f"❌ Membership card batch failed: {e}")
+        return
+    if summary["failed"]:
+        logger.error(f"❌ {len(summary['failed'])} membership cards failed to render")
+
+
+def enqueue_batch(license_docs, collection):
+    """Run ``render_batch`` for ``license_docs`` from a background thread."""
+    thread = threading.Thread(
+        target=_render_batch_logged, args=(list(license_docs), collection),
+        name="license-cards", daemon=True,
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,13 @@
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+MONGO_INDEXES = {
+    "licenses": [
+        # One membership per phone; also serves check_phone and download_license
+        IndexModel([("phone", ASCENDING)], name="phone_unique", unique=True),
+        IndexModel([("phone", ASCENDING), ("is_approved", ASCENDING)], name="phone_is_approved"),
+        # Admin listing filtered by status, newest first
+        IndexModel([("is_approved", ASCENDING), ("_id", DESCENDING)], name="is_approved_id"),
+        # gc_media: is a stored card still some license's current card?
+        IndexModel([("card_hash", ASCENDING)], name="card_hash", sparse=True),
+    ],
+}
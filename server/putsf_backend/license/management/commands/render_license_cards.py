@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from putsf_backend.license import cards
+
+
+class Command(BaseCommand):
+    help = "Render membership cards for approved licenses whose card is missing or out of date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Re-render cards that are already up to date.")
+        parser.add_argument("--chunk-size", type=int, default=25, help="Cards per pool job.")
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many licenses (0 = all).")
+
+    def handle(self, *args, **options):
+        from putsf_backend.mongo import get_collection
+
+        collection = get_collection("licenses")
+        if collection is None:
+            raise CommandError("MongoDB not connected")
+
+        docs = collection.find({"is_approved": True}).sort("_id", 1)
+        if options["limit"]:
+            docs = docs.limit(options["limit"])
+
+        started = time.perf_counter()
+        summary = cards.render_batch(
+            docs, collection=collection, chunk_size=options["chunk_size"], force=options["force"],
+        )
+        elapsed = time.perf_counter() - started
+
+        for license_id, error in summary["failed"].items():
+            self.stderr.write(self.style.ERROR(f"{license_id}: {error}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['rendered']} rendered, {summary['ready']} already up to date, "
+            f"{len(summary['failed'])} failed in {elapsed:.1f}s"
+        ))
+        if summary["failed"]:
+            raise CommandError("Some cards could not be rendered")
@@ -0,0 +1,192 @@
+# putsf_backend/license/phones.py
+"""
+In-process registry of the phone numbers that have a license.
+
+``check_phone`` is called every time the membership form's phone field
+loses focus, and almost every answer is "not registered". The registry
+answers those from memory in microseconds, without a round trip to Atlas.
+
+Numbers are kept as a sorted ``array('Q')`` of 10-digit integers (8 bytes
+per member), with small ``added``/``removed`` sets for changes made by
+this process since the last full load. A daemon thread per server
+process (started by putsf_backend/background.py, or by the first
+``contains()``) loads the array on startup. Every
+``PHONE_REGISTRY_REFRESH`` seconds it picks up licenses created by other
+workers (an ``_id`` range scan), and every ``PHONE_REGISTRY_RESYNC``
+seconds it rebuilds the array from scratch.
+
+``contains()`` answers True, False or None:
+- None means the registry has not loaded yet, and callers fall back to Mongo.
+- False is served from memory.
+- True may be stale after a delete in another worker, so callers confirm
+  it with a ``find_one``.
+The ``phone_unique`` index stays the authority on duplicates.
+"""
+import bisect
+import datetime
+import logging
+import os
+import threading
+import time
+from array import array
+
+from bson import ObjectId
+from django.conf import settings
+from pymongo.errors import PyMongoError
+
+from putsf_backend.mongo import get_collection
+
+logger = logging.getLogger(__name__)
+
+# Licenses created this long before a refresh started are scanned again,
+# covering ObjectIds generated slightly out of order across workers
+_OVERLAP = datetime.timedelta(seconds=60)
+
+
+def _key(phone):
+    phone = str(phone or "")
+    return int(phone) if len(phone) == 10 and phone.isdigit() else None
+
+
+def _in_array(numbers, key):
+    i = bisect.bisect_left(numbers, key)
+    return i < len(numbers) and numbers[i] == key
+
+
+class PhoneRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._numbers = None  # sorted array('Q'); None until the first load
+        self._added = set()
+        self._removed = set()
+        self._refresh_from = None
+        self.loaded_at = None
+
+    # ---------------------------
+    # Lookups and updates
+    # ---------------------------
+    def contains(self, phone):
+        """True/False from memory, or None while the registry is cold."""
+        numbers = self._numbers
+        if numbers is None:
+            return None
+        key = _key(phone)
+        if key is None:
+            return False
+        if key in self._added:
+            return True
+        if key in self._removed:
+            return False
+        return _in_array(numbers, key)
+
+    def add(self, phone):
+        key = _key(phone)
+        if key is None:
+            return
+        with self._lock:
+            self._removed.discard(key)
+            self._added.add(key)
+
+    def discard(self, phone):
+        key = _key(phone)
+        if key is None:
+            return
+        with self._lock:
+            self._added.discard(key)
+            self._removed.add(key)
+
+    def stats(self):
+        with self._lock:
+            numbers, added, removed = self._numbers, set(self._added), set(self._removed)
+        size = 0
+        if numbers is not None:
+            # refresh() re-adds numbers already in the array, and discard() may
+            # remove ones that never were: count each number once
+            size = (
+                len(numbers)
+                - sum(1 for key in removed if _in_array(numbers, key))
+                + sum(1 for key in added if not _in_array(numbers, key))
+            )
+        return {
+            "loaded": numbers is not None,
+            "size": size,
+            "bytes": numbers.itemsize * len(numbers) if numbers is not None else 0,
+            "loaded_at": self.loaded_at,
+        }
+
+    # ---------------------------
+    # Sync with Mongo
+    # ---------------------------
+    def load(self, collection):
+        """Rebuild the sorted array from every license."""
+        started = datetime.datetime.utcnow()
+        keys = (_key(doc.get("phone")) for doc in collection.find({}, {"phone": 1, "_id": 0}).batch_size(10000))
+        numbers = array("Q", sorted(key for key in keys if key is not None))
+        with self._lock:
+            self._numbers = numbers
+            self._added = set()
+            self._removed = set()
+            # Changes made while the scan ran are picked up by the next refresh
+            self._refresh_from = started - _OVERLAP
+            self.loaded_at = time.time()
+        return len(numbers)
+
+    def refresh(self, collection):
+        """Add licenses created since the last load or refresh (by any worker)."""
+        started = datetime.datetime.utcnow()
+        query = {"_id": {"$gte": ObjectId.from_datetime(self._refresh_from)}} if self._refresh_from else {}
+        keys = [_key(doc.get("phone")) for doc in collection.find(query, {"phone": 1, "_id": 0})]
+        with self._lock:
+            # Documents found now exist, even if this process deleted an earlier one
+            for key in keys:
+                if key is not None:
+                    self._removed.discard(key)
+                    self._added.add(key)
+            self._refresh_from = started - _OVERLAP
+        return len(keys)
+
+
+registry = PhoneRegistry()
+
+_thread = None
+_thread_pid = None
+_start_lock = threading.Lock()
+
+
+def _run():
+    last_load = None
+    while True:
+        collection = get_collection("licenses")
+        try:
+            if collection is None:
+                pass
+            elif last_load is None or time.monotonic() - last_load >= settings.PHONE_REGISTRY_RESYNC:
+                count = registry.load(collection)
+                last_load = time.monotonic()
+                logger.info(f"Phone registry loaded: {count} numbers")
+            else:
+                registry.refresh(collection)
+        except PyMongoError as e:
+            logger.warning(f"⚠️ Phone registry not synced: {e}")
+        time.sleep(settings.PHONE_REGISTRY_REFRESH)
+
+
+def start():
+    """Start this process's sync thread (again after a fork)."""
+    global _thread, _thread_pid
+    if not settings.PHONE_REGISTRY_ENABLED:
+        return None
+    thread = _thread
+    if thread is not None and _thread_pid == os.getpid() and thread.is_alive():
+        return thread
+    with _start_lock:
+        if _thread is None or _thread_pid != os.getpid() or not _thread.is_alive():
+            _thread = threading.Thread(target=_run, name="phone-registry", daemon=True)
+            _thread.start()
+            _thread_pid = os.getpid()
+        return _thread
+
+
+def contains(phone):
+    start()
+    return registry.contains(phone)
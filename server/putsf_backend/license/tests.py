@@ -1,3 +1,490 @@
-from django.test import TestCase
+import os
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from bson import ObjectId
+from django.conf import settings
+from django.core.management import CommandError, call_command
+
+from putsf_backend import media
+from putsf_backend.core.indexes import ensure_indexes
+from putsf_backend.testing import MongoTestCase
+
+from . import cards, phones
+
+
+def license_doc(phone, **fields):
+    return {
+        "_id": ObjectId(),
+        "name": f"Member {phone}",
+        "gender": "F",
+        "education": "BA",
+        "phone": phone,
+        "address": "Hyderabad",
+        "photo": None,
+        "is_approved": False,
+        **fields,
+    }
+
+
+class LicenseTestCase(MongoTestCase):
+    """Fresh phone registry per test; membership cards are never rendered."""
+
+    def setUp(self):
+        super().setUp()
+        self.registry = phones.PhoneRegistry()
+        for patcher in (
+            mock.patch.object(phones, "registry", self.registry),
+            mock.patch("putsf_backend.license.cards.enqueue", return_value=("pending", "digest")),
+            mock.patch("putsf_backend.license.cards.enqueue_batch"),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class LicenseListTests(LicenseTestCase):
+    def setUp(self):
+        super().setUp()
+        # ObjectIds increase with insertion order, so the last one is the newest
+        self.docs = [license_doc(f"98765432{i:02d}", is_approved=i % 2 == 0) for i in range(5)]
+        self.db.licenses.insert_many(self.docs)
+        self.newest_first = [str(doc["_id"]) for doc in reversed(self.docs)]
+
+    def test_pages_follow_after_cursor(self):
+        seen = []
+        after = None
+        for _ in range(3):
+            params = {"limit": 2, **({"after": after} if after else {})}
+            response = self.client.get("/api/license/", params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertEqual(body["count"], 5)
+            seen += [doc["_id"] for doc in body["results"]]
+            after = body["next"]
+            if after is None:
+                break
+
+        self.assertEqual(seen, self.newest_first)
+        self.assertIsNone(after)
+
+    def test_next_is_last_id_of_page(self):
+        body = self.client.get("/api/license/", {"limit": 2}).json()
+        self.assertEqual(body["next"], self.newest_first[1])
+
+    def test_is_approved_filter_counts_matches(self):
+        body = self.client.get("/api/license/", {"is_approved": "true"}).json()
+        self.assertEqual(body["count"], 3)
+        self.assertTrue(all(doc["is_approved"] for doc in body["results"]))
+
+    def test_fields_projection(self):
+        body = self.client.get("/api/license/", {"fields": "name,bogus"}).json()
+        self.assertEqual(set(body["results"][0]), {"_id", "name"})
+
+    def test_listing_is_private_and_revalidated(self):
+        response = self.client.get("/api/license/")
+        self.assertIn("private", response["Cache-Control"])
+        self.assertEqual(self.client.get("/api/license/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+        self.login()
+        self.client.post("/api/license/approve_bulk/", {"ids": [self.newest_first[1]]}, format="json")
+        self.assertEqual(self.client.get("/api/license/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 200)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/license/", {"after": "not-an-id"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Invalid cursor."})
+
+
+class LicenseBulkTests(LicenseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pending = license_doc("9000000001")
+        self.approved = license_doc("9000000002", is_approved=True)
+        self.other = license_doc("9000000003")
+        self.db.licenses.insert_many([self.pending, self.approved, self.other])
+        self.missing = str(ObjectId())
+        self.login()
+
+    def ids(self):
+        return [str(self.pending["_id"]), str(self.approved["_id"]), self.missing, "bad-id"]
+
+    def test_approve_bulk_reports_every_id(self):
+        response = self.client.post("/api/license/approve_bulk/", {"ids": self.ids()}, format="json")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["approved"], 1)
+        self.assertEqual(body["results"], {
+            str(self.pending["_id"]): "approved",
+            str(self.approved["_id"]): "already_approved",
+            self.missing: "not_found",
+            "bad-id": "invalid_id",
+        })
+        self.assertEqual([link["_id"] for link in body["whatsapp_links"]], [str(self.pending["_id"])])
+        self.assertTrue(self.db.licenses.find_one({"_id": self.pending["_id"]})["is_approved"])
+        self.assertFalse(self.db.licenses.find_one({"_id": self.other["_id"]})["is_approved"])
+
+    def test_approve_bulk_by_filter(self):
+        response = self.client.post("/api/license/approve_bulk/", {"filter": {"is_approved": False}}, format="json")
+        self.assertEqual(response.json()["approved"], 2)
+        self.assertEqual(self.db.licenses.count_documents({"is_approved": False}), 0)
+
+    def test_destroy_bulk_reports_every_id(self):
+        self.registry.load(self.db.licenses)
+        response = self.client.post("/api/license/destroy_bulk/", {"ids": self.ids()}, format="json")
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body["deleted"], 2)
+        self.assertEqual(body["results"], {
+            str(self.pending["_id"]): "deleted",
+            str(self.approved["_id"]): "deleted",
+            self.missing: "not_found",
+            "bad-id": "invalid_id",
+        })
+        self.assertEqual([doc["_id"] for doc in self.db.licenses.find()], [self.other["_id"]])
+        self.assertIs(self.registry.contains("9000000001"), False)
+
+    @mock.patch("putsf_backend.license.views.LICENSE_BULK_MAX", 2)
+    def test_bulk_max_caps_ids(self):
+        response = self.client.post("/api/license/approve_bulk/", {"ids": self.ids()[:3]}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "At most 2 ids per request."})
+
+    @mock.patch("putsf_backend.license.views.LICENSE_BULK_MAX", 2)
+    def test_bulk_max_caps_filter_matches(self):
+        for path in ("/api/license/approve_bulk/", "/api/license/destroy_bulk/"):
+            response = self.client.post(path, {"filter": {"gender": "F"}}, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), {"error": "Filter matches more than 2 licenses."})
+        self.assertEqual(self.db.licenses.count_documents({"is_approved": True}), 1)
+        self.assertEqual(self.db.licenses.count_documents({}), 3)
+
+    def test_bulk_actions_require_login(self):
+        self.client.force_authenticate(None)
+        for path in ("/api/license/approve_bulk/", "/api/license/destroy_bulk/"):
+            response = self.client.post(path, {"filter": {"is_approved": False}}, format="json")
+            self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.db.licenses.count_documents({"is_approved": False}), 2)
+        self.assertEqual(self.db.licenses.count_documents({}), 3)
+
+    def test_bulk_requires_ids_or_filter(self):
+        response = self.client.post("/api/license/approve_bulk/", {}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "Provide either ids or filter."})
+
+
+class LicenseDuplicatePhoneTests(LicenseTestCase):
+    def setUp(self):
+        super().setUp()
+        # Warm but empty: the number below was registered by another worker
+        self.registry.load(self.db.licenses)
+        self.db.licenses.insert_one(license_doc("9876543210"))
+
+    def create(self, phone="98765 43210"):
+        return self.client.post("/api/license/", {"name": "New Member", "phone": phone})
+
+    def test_rejected_without_unique_index(self):
+        response = self.create()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"error": "This phone number is already registered with PUTSF."})
+        self.assertEqual(self.db.licenses.count_documents({"phone": "9876543210"}), 1)
+
+    def test_rejected_by_unique_index(self):
+        ensure_indexes(self.db)
+        with mock.patch.object(self.db.licenses, "find_one", wraps=self.db.licenses.find_one) as find_one:
+            response = self.create()
+        find_one.assert_not_called()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.db.licenses.count_documents({"phone": "9876543210"}), 1)
+        self.assertIs(self.registry.contains("9876543210"), True)
+
+    def test_new_phone_is_created(self):
+        ensure_indexes(self.db)
+        response = self.create("9123456780")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.db.licenses.count_documents({"phone": "9123456780"}), 1)
+        self.assertIs(self.registry.contains("9123456780"), True)
+
+
+class CheckPhoneTests(LicenseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db.licenses.insert_one(license_doc("9876543210"))
+        patcher = mock.patch.object(self.db.licenses, "find_one", wraps=self.db.licenses.find_one)
+        self.find_one = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def check(self, phone):
+        response = self.client.get("/api/license/check_phone/", {"phone": phone})
+        self.assertEqual(response.status_code, 200)
+        return response.json()["exists"]
+
+    def test_cold_registry_asks_mongo(self):
+        self.assertTrue(self.check("9876543210"))
+        self.assertFalse(self.check("9123456780"))
+        self.assertEqual(self.find_one.call_count, 2)
+
+    def test_warm_registry_answers_misses_from_memory(self):
+        self.registry.load(self.db.licenses)
+        self.assertFalse(self.check("9123456780"))
+        self.find_one.assert_not_called()
+
+    def test_warm_registry_confirms_hits(self):
+        self.registry.load(self.db.licenses)
+        self.assertTrue(self.check("9876543210"))
+        # Deleted by another worker: the registry is stale, Mongo has the last word
+        self.db.licenses.delete_one({"phone": "9876543210"})
+        self.assertFalse(self.check("9876543210"))
+        self.assertEqual(self.find_one.call_count, 2)
+
+    def test_invalid_phone(self):
+        response = self.client.get("/api/license/check_phone/", {"phone": "12345"})
+        self.assertEqual(response.status_code, 400)
+
+
+class PhoneRegistryTests(LicenseTestCase):
+    def size(self):
+        return self.registry.stats()["size"]
+
+    def test_stats_before_load(self):
+        self.assertEqual(self.registry.stats(), {"loaded": False, "size": 0, "bytes": 0, "loaded_at": None})
+
+    def test_size_counts_each_number_once(self):
+        self.db.licenses.insert_many([license_doc("9876543210"), license_doc("9123456780")])
+        self.registry.load(self.db.licenses)
+        self.assertEqual(self.registry.stats()["bytes"], 16)
+        self.assertEqual(self.size(), 2)
+
+        # The refresh overlap finds numbers that are already in the array
+        self.registry.refresh(self.db.licenses)
+        self.assertEqual(self.size(), 2)
+
+        self.registry.add("9000000001")
+        self.registry.add("9000000001")
+        self.assertEqual(self.size(), 3)
+
+        self.registry.discard("9876543210")
+        self.registry.discard("9000000001")
+        # Never registered here
+        self.registry.discard("9000000002")
+        self.assertEqual(self.size(), 1)
+
+        self.registry.add("9876543210")
+        self.assertEqual(self.size(), 2)
+
+
+class FakePool:
+    """Stands in for the card process pool; jobs run in this process, now or on ``finish()``."""
+
+    def __init__(self, run_now=True):
+        self.run_now = run_now
+        self.jobs = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.jobs.append((future, fn, args))
+        if self.run_now:
+            self.finish()
+        return future
+
+    def finish(self):
+        for future, fn, args in self.jobs:
+            if not future.done():
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+
+
+class FakeRenderer:
+    """Writes a stub PDF; cards of members named "BROKEN" fail like a WeasyPrint error."""
+
+    def __init__(self):
+        self.rendered = []
+
+    def write_pdf(self, html, base_url, target):
+        if "BROKEN" in html:
+            raise ValueError("WeasyPrint could not lay out the card")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, "wb") as f:
+            f.write(b"%PDF-1.7 test card")
+        self.rendered.append(target)
+        return target
+
+
+class CardTestCase(MongoTestCase):
+    def setUp(self):
+        super().setUp()
+        self.pool = FakePool()
+        self.renderer = FakeRenderer()
+        for patcher in (
+            mock.patch.object(cards, "_submit", side_effect=lambda fn, *args: self.pool.submit(fn, *args)),
+            mock.patch.object(cards, "_renderer", self.renderer),
+            mock.patch.dict(cards._inflight, clear=True),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def approved(self, phone="9876543210", **fields):
+        doc = license_doc(phone, is_approved=True, **fields)
+        self.db.licenses.insert_one(doc)
+        return doc
+
+    def stored(self, doc):
+        return self.db.licenses.find_one({"_id": doc["_id"]})
+
+
+class CardPipelineTests(CardTestCase):
+    def test_card_hash_covers_card_fields_only(self):
+        doc = license_doc("9876543210")
+        self.assertEqual(cards.card_hash(doc), cards.card_hash(dict(doc, card_status="ready")))
+        self.assertNotEqual(cards.card_hash(doc), cards.card_hash(dict(doc, name="Someone Else")))
+
+    def test_card_hash_follows_the_photo_file(self):
+        photo = os.path.join(settings.MEDIA_ROOT, "licenses", "photo.jpg")
+        os.makedirs(os.path.dirname(photo))
+        with open(photo, "wb") as f:
+            f.write(b"first")
+        doc = license_doc("9876543210", photo=media.media_url(photo))
+        before = cards.card_hash(doc)
+        with open(photo, "wb") as f:
+            f.write(b"second photo")
+        self.assertNotEqual(cards.card_hash(doc), before)
+
+    def test_enqueue_renders_and_marks_ready(self):
+        doc = self.approved()
+        self.pool.run_now = False
+        status, digest = cards.enqueue(doc, self.db.licenses)
+        self.assertEqual(status, "pending")
+        self.assertEqual(self.stored(doc)["card_status"], "pending")
+        self.assertEqual(self.stored(doc)["card_hash"], digest)
+
+        self.pool.finish()
+        stored = self.stored(doc)
+        self.assertEqual(stored["card_status"], "ready")
+        self.assertEqual(stored["license_pdf"], cards.artifact_url(digest))
+        self.assertTrue(os.path.exists(cards.artifact_path(digest)))
+
+    def test_unchanged_card_is_not_rendered_again(self):
+        doc = self.approved()
+        cards.enqueue(doc, self.db.licenses)
+        self.assertEqual(cards.enqueue(self.stored(doc), self.db.licenses)[0], "ready")
+        self.assertEqual(len(self.renderer.rendered), 1)
+
+    def test_concurrent_requests_share_one_render(self):
+        doc = self.approved()
+        self.pool.run_now = False
+        cards.enqueue(doc, self.db.licenses)
+        cards.enqueue(doc, self.db.licenses)
+        self.assertEqual(len(self.pool.jobs), 1)
+
+    def test_changed_data_replaces_the_old_card(self):
+        doc = self.approved()
+        _status, old_digest = cards.enqueue(doc, self.db.licenses)
+        self.db.licenses.update_one({"_id": doc["_id"]}, {"$set": {"address": "Warangal"}})
+        _status, new_digest = cards.enqueue(self.stored(doc), self.db.licenses)
+
+        self.assertNotEqual(new_digest, old_digest)
+        self.assertEqual(self.stored(doc)["license_pdf"], cards.artifact_url(new_digest))
+        self.assertFalse(os.path.exists(cards.artifact_path(old_digest)))
+
+    def test_render_error_is_recorded(self):
+        doc = self.approved(name="BROKEN")
+        with self.assertLogs("putsf_backend.license.cards", "ERROR"):
+            cards.enqueue(doc, self.db.licenses)
+        stored = self.stored(doc)
+        self.assertEqual(stored["card_status"], "failed")
+        self.assertEqual(stored["card_error"], "WeasyPrint could not lay out the card")
+
+    def test_renderer_startup_error_is_reported_per_job(self):
+        with mock.patch.object(cards, "CardRenderer", side_effect=OSError("cannot load library 'pango-1.0-0'")), \
+                mock.patch.object(cards, "_renderer_error", None):
+            cards._init_worker("/nonexistent", False)
+            self.assertIsInstance(cards._renderer_error, OSError)
+            with mock.patch.object(cards, "_renderer", None), self.assertLogs("putsf_backend.license.cards", "ERROR"):
+                doc = self.approved()
+                cards.enqueue(doc, self.db.licenses)
+        stored = self.stored(doc)
+        self.assertEqual(stored["card_status"], "failed")
+        self.assertIn("Card renderer unavailable: cannot load library", stored["card_error"])
+
+    def test_download_pdf_is_202_until_ready(self):
+        self.approved()
+        self.pool.run_now = False
+        url = "/api/license-download/?phone=9876543210&pdf=1"
+
+        for _ in range(2):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json()["status"], "rendering")
+        self.assertEqual(len(self.pool.jobs), 1)
+
+        self.pool.finish()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn("PUTSF_Member 9876543210.pdf", response["Content-Disposition"])
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.7 test card")
+        response.close()
+
+    def test_download_requires_an_approved_license(self):
+        self.db.licenses.insert_one(license_doc("9123456780"))
+        response = self.client.get("/api/license-download/?phone=9123456780&pdf=1")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.pool.jobs, [])
+
+
+class RenderBatchTests(CardTestCase):
+    def setUp(self):
+        super().setUp()
+        self.docs = [self.approved(f"98765432{i:02d}", name=f"Member {i}") for i in range(5)]
+
+    def chunk_sizes(self):
+        return [len(args[0]) for _future, _fn, args in self.pool.jobs]
+
+    def test_cards_are_rendered_in_chunks(self):
+        summary = cards.render_batch(self.docs, collection=self.db.licenses, chunk_size=2)
+        self.assertEqual(summary, {"ready": 0, "rendered": 5, "failed": {}})
+        self.assertEqual(self.chunk_sizes(), [2, 2, 1])
+        for doc in self.docs:
+            stored = self.stored(doc)
+            self.assertEqual(stored["card_status"], "ready")
+            self.assertEqual(stored["license_pdf"], cards.artifact_url(cards.card_hash(doc)))
+
+    def test_one_bad_card_does_not_fail_its_chunk(self):
+        self.db.licenses.update_one({"_id": self.docs[1]["_id"]}, {"$set": {"name": "BROKEN"}})
+        docs = list(self.db.licenses.find().sort("_id", 1))
+        summary = cards.render_batch(docs, collection=self.db.licenses, chunk_size=2)
+
+        self.assertEqual(summary["rendered"], 4)
+        self.assertEqual(summary["failed"], {str(self.docs[1]["_id"]): "WeasyPrint could not lay out the card"})
+        self.assertEqual(self.stored(self.docs[1])["card_status"], "failed")
+        self.assertEqual(self.stored(self.docs[0])["card_status"], "ready")
+
+    def test_up_to_date_cards_are_skipped_unless_forced(self):
+        cards.render_batch(self.docs[:2], collection=self.db.licenses)
+        summary = cards.render_batch(self.docs, collection=self.db.licenses)
+        self.assertEqual((summary["ready"], summary["rendered"]), (2, 3))
+        self.assertEqual(len(self.renderer.rendered), 5)
+
+        summary = cards.render_batch(self.docs, collection=self.db.licenses, force=True)
+        self.assertEqual((summary["ready"], summary["rendered"]), (0, 5))
+
+    def test_command_renders_approved_licenses(self):
+        self.db.licenses.insert_one(license_doc("9123456780"))
+        out = StringIO()
+        call_command("render_license_cards", "--chunk-size", "2", stdout=out)
+        self.assertIn("5 rendered, 0 already up to date, 0 failed", out.getvalue())
+        self.assertEqual(self.chunk_sizes(), [2, 2, 1])
+        self.assertEqual(self.db.licenses.count_documents({"card_status": "ready"}), 5)
+
+        call_command("render_license_cards", "--limit", "3", stdout=out)
+        self.assertIn("0 rendered, 3 already up to date, 0 failed", out.getvalue())
+
+    def test_command_fails_when_a_card_fails(self):
+        self.db.licenses.update_one({"_id": self.docs[2]["_id"]}, {"$set": {"name": "BROKEN"}})
+        out, err = StringIO(), StringIO()
+        with self.assertRaisesMessage(CommandError, "Some cards could not be rendered"):
+            call_command("render_license_cards", stdout=out, stderr=err)
+        self.assertIn("4 rendered, 0 already up to date, 1 failed", out.getvalue())
+        self.assertIn(str(self.docs[2]["_id"]), err.getvalue())
@@ -250,42 +250,183 @@
 from urllib.parse import quote
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from bson import ObjectId
-from putsf_backend.settings import get_db
-from django.core.files.storage import default_storage
+from bson.errors import InvalidId
+from pymongo.errors import DuplicateKeyError
+from putsf_backend.mongo import get_collection
+from putsf_backend.cache import invalidate, conditional
+from putsf_backend.core.indexes import has_index
+from putsf_backend import media
+from putsf_backend.uploads import UploadLimitMixin, UploadLimits
+from putsf_backend.throttling import IPTokenBucket, PhoneTokenBucket, ThrottleMixin
+from django.http import FileResponse
+from . import cards, phones
 
 # =========================================
-# MongoDB Collection
+# Listing (keyset pagination)
 # =========================================
-mongo_db = get_db()
-license_collection = mongo_db["licenses"] if mongo_db is not None else None
+LICENSE_PAGE_SIZE = 50
+LICENSE_MAX_PAGE_SIZE = 200
+
+# Fields a client may request through ?fields= (``_id`` is always returned)
+LICENSE_LIST_FIELDS = (
+    "name", "gender", "education", "phone", "address",
+    "photo", "is_approved", "created_at", "license_pdf",
+)
+
+
+def _parse_bool(value):
+    """Parse a query-string boolean, returning None when it is not one."""
+    value = (value or "").strip().lower()
+    if value in ("true", "1", "yes"):
+        return True
+    if value in ("false", "0", "no"):
+        return False
+    return None
+
+
+def _page_size(value):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return LICENSE_PAGE_SIZE
+    return max(1, min(size, LICENSE_MAX_PAGE_SIZE))
+
+
+def _projection(value):
+    """Build a Mongo projection from ``?fields=a,b``; None means all fields."""
+    if not value:
+        return None
+    fields = [f.strip() for f in value.split(",") if f.strip() in LICENSE_LIST_FIELDS]
+    if not fields:
+        return None
+    return {field: 1 for field in fields}
+
+
+# =========================================
+# Bulk actions
+# =========================================
+LICENSE_BULK_MAX = 5000
+
+# Keys accepted in a bulk ``filter`` instead of an explicit ``ids`` list
+LICENSE_BULK_FILTERS = ("is_approved", "gender", "education")
+
+FRONTEND_DOWNLOAD_PAGE = "https://putsf.com/#/membership-download"
+
+
+def _whatsapp_link(license_doc):
+    message = (
+        f"🎉 Hello {license_doc.get('name', '')}!\n\n"
+        f"Your membership card has been approved.\n\n"
+        f"Download here:\n{FRONTEND_DOWNLOAD_PAGE}"
+    )
+    return f"https://wa.me/91{license_doc.get('phone', '')}?text={quote(message)}"
+
+
+def _bulk_query(data):
+    """
+    Build the Mongo query for a bulk action from ``{"ids": [...]}`` or
+    ``{"filter": {...}}``.
+
+    Returns ``(query, invalid_ids, error)``.
+    """
+    ids = data.get("ids")
+    filters = data.get("filter")
+
+    if ids is not None:
+        if not isinstance(ids, list) or not ids:
+            return None, [], "ids must be a non-empty list."
+        if len(ids) > LICENSE_BULK_MAX:
+            return None, [], f"At most {LICENSE_BULK_MAX} ids per request."
+        object_ids, invalid = [], []
+        for value in ids:
+            try:
+                object_ids.append(ObjectId(value))
+            except (InvalidId, TypeError):
+                invalid.append(str(value))
+        return {"_id": {"$in": object_ids}}, invalid, None
+
+    if isinstance(filters, dict) and filters:
+        query = {}
+        for key, value in filters.items():
+            if key not in LICENSE_BULK_FILTERS:
+                return None, [], f"Unsupported filter: {key}."
+            if key == "is_approved":
+                value = value if isinstance(value, bool) else _parse_bool(str(value))
+                if value is None:
+                    return None, [], "is_approved must be a boolean."
+            query[key] = value
+        return query, [], None
+
+    return None, [], "Provide either ids or filter."
 
 
 # =========================================
 # License ViewSet (Using MongoDB)
 # =========================================
-class LicenseViewSet(viewsets.ViewSet):
+class LicenseViewSet(ThrottleMixin, UploadLimitMixin, viewsets.ViewSet):
     http_method_names = ["get", "post", "delete"]
+    upload_limits = UploadLimits("license_photo")
+    throttle_classes = [IPTokenBucket, PhoneTokenBucket]
+
+    @property
+    def throttle_scope(self):
+        return {"create": "license_create", "check_phone": "check_phone"}.get(self.action)
 
     # ---------------------------
-    # GET - List all licenses
+    # GET - List licenses (paginated)
+    # ?limit=50&after=<_id>&is_approved=true&fields=name,phone
     # ---------------------------
+    @conditional("licenses", private=True)
     def list(self, request):
+        license_collection = get_collection("licenses")
         if license_collection is None:
             return Response({"error": "MongoDB not connected"}, status=500)
 
-        data = []
-        for item in license_collection.find():
-            item["_id"] = str(item["_id"])
-            data.append(item)
+        params = request.query_params
+        query = {}
+
+        is_approved = _parse_bool(params.get("is_approved"))
+        if is_approved is not None:
+            query["is_approved"] = is_approved
+
+        # Keyset pagination: newest first, ``after`` is the last _id of the previous page
+        after = params.get("after")
+        if after:
+            try:
+                query["_id"] = {"$lt": ObjectId(after)}
+            except (InvalidId, TypeError):
+                return Response({"error": "Invalid cursor."}, status=400)
+
+        limit = _page_size(params.get("limit"))
+        cursor = (
+            license_collection.find(query, _projection(params.get("fields")))
+            .sort("_id", -1)
+            .limit(limit + 1)
+        )
+
+        data = list(cursor)
 
-        return Response(data)
+        next_cursor = None
+        if len(data) > limit:
+            data = data[:limit]
+            next_cursor = str(data[-1]["_id"])
+
+        # Unfiltered totals come from collection metadata instead of a scan
+        if is_approved is None:
+            count = license_collection.estimated_document_count()
+        else:
+            count = license_collection.count_documents({"is_approved": is_approved})
+
+        return Response({"count": count, "next": next_cursor, "results": data})
 
     # ---------------------------
     # POST - Create a new license
     # ---------------------------
     def create(self, request):
+        license_collection = get_collection("licenses")
         if license_collection is None:
             return Response({"error": "MongoDB not connected"}, status=500)
 
@@ -300,27 +441,42 @@ class LicenseViewSet(viewsets.ViewSet):
         if len(phone) != 10:
             return Response({"error": "Please enter a valid 10-digit phone number."}, status=400)
 
-        if license_collection.find_one({"phone": phone}):
+        # Known numbers are turned away before the photo is stored. Until the
+        # phone_unique index exists, every sign-up is checked against Mongo.
+        check = phones.contains(phone) or not has_index(license_collection, "phone_unique")
+        if check and license_collection.find_one({"phone": phone}, {"_id": 1}):
             return Response({"error": "This phone number is already registered with PUTSF."}, status=400)
 
         # Handle Photo Upload
+        license_id = ObjectId()
+        owner = media.owner("licenses", license_id)
         photo = request.FILES.get("photo")
-        photo_path = None
+        photo_url = None
         if photo:
-            photo_path = default_storage.save(f"licenses/photos/{photo.name}", photo)
+            _path, photo_url = media.store(photo, owner)
 
         # Prepare document
         license_doc = {
+            "_id": license_id,
             "name": data.get("name"),
             "education": data.get("education"),
             "gender": data.get("gender"),
             "phone": phone,
             "address": data.get("address"),
-            "photo": request.build_absolute_uri(f"/media/{photo_path}") if photo_path else None,
+            "photo": photo_url,
             "is_approved": False,
         }
 
-        result = license_collection.insert_one(license_doc)
+        # The phone_unique index (see license/indexes.py) also catches concurrent sign-ups
+        try:
+            result = license_collection.insert_one(license_doc)
+        except DuplicateKeyError:
+            phones.registry.add(phone)
+            if photo_url:
+                media.release(photo_url, owner)
+            return Response({"error": "This phone number is already registered with PUTSF."}, status=400)
+        phones.registry.add(phone)
+        invalidate("licenses")
         license_doc["_id"] = str(result.inserted_id)
 
         return Response(
@@ -333,6 +489,7 @@ class LicenseViewSet(viewsets.ViewSet):
     # ---------------------------
     @action(detail=False, methods=["get"])
     def check_phone(self, request):
+        license_collection = get_collection("licenses")
         if license_collection is None:
             return Response({"error": "MongoDB not connected"}, status=500)
 
@@ -344,7 +501,10 @@ class LicenseViewSet(viewsets.ViewSet):
         if len(phone) != 10:
             return Response({"error": "Invalid phone number."}, status=400)
 
-        exists = license_collection.find_one({"phone": phone})
+        # Unregistered numbers are answered from memory; Mongo confirms hits and covers a cold registry
+        exists = phones.contains(phone)
+        if exists is not False:
+            exists = license_collection.find_one({"phone": phone}, {"_id": 1}) is not None
 
         return Response({
             "exists": bool(exists),
@@ -355,17 +515,69 @@ class LicenseViewSet(viewsets.ViewSet):
     # DELETE License
     # ---------------------------
     def destroy(self, request, pk=None):
+        license_collection = get_collection("licenses")
         if license_collection is None:
             return Response({"error": "MongoDB not connected"}, status=500)
 
-        license_collection.delete_one({"_id": ObjectId(pk)})
+        license_doc = license_collection.find_one_and_delete(
+            {"_id": ObjectId(pk)}, projection={"license_pdf": 1, "photo": 1, "phone": 1}
+        )
+        invalidate("licenses")
+        if license_doc:
+            phones.registry.discard(license_doc.get("phone"))
+            cards.remove(license_doc)
+            if license_doc.get("photo"):
+                media.release(license_doc["photo"], media.owner("licenses", license_doc["_id"]))
         return Response({"message": "License deleted"}, status=204)
 
     # ---------------------------
-    # POST - Approve license (NO PDF)
+    # POST - Delete many licenses (admin only)
+    # {"ids": [...]} or {"filter": {"is_approved": false}}
+    # ---------------------------
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    def destroy_bulk(self, request):
+        license_collection = get_collection("licenses")
+        if license_collection is None:
+            return Response({"error": "MongoDB not connected"}, status=500)
+
+        query, invalid_ids, error = _bulk_query(request.data)
+        if error:
+            return Response({"error": error}, status=400)
+
+        license_docs = list(
+            license_collection.find(query, {"license_pdf": 1, "photo": 1, "phone": 1}).limit(LICENSE_BULK_MAX + 1)
+        )
+        if len(license_docs) > LICENSE_BULK_MAX:
+            return Response({"error": f"Filter matches more than {LICENSE_BULK_MAX} licenses."}, status=400)
+
+        deleted_count = 0
+        if license_docs:
+            result = license_collection.delete_many({"_id": {"$in": [doc["_id"] for doc in license_docs]}})
+            deleted_count = result.deleted_count
+            invalidate("licenses")
+            for license_doc in license_docs:
+                phones.registry.discard(license_doc.get("phone"))
+                cards.remove(license_doc)
+                if license_doc.get("photo"):
+                    media.release(license_doc["photo"], media.owner("licenses", license_doc["_id"]))
+
+        results = {str(doc["_id"]): "deleted" for doc in license_docs}
+        for value in request.data.get("ids") or []:
+            results.setdefault(str(value), "not_found")
+        results.update({value: "invalid_id" for value in invalid_ids})
+
+        return Response({
+            "message": f"{deleted_count} licenses deleted",
+            "deleted": deleted_count,
+            "results": results,
+        })
+
+    # ---------------------------
+    # POST - Approve license (PDF card is rendered in the background)
     # ---------------------------
     @action(detail=True, methods=["post"])
     def approve(self, request, pk=None):
+        license_collection = get_collection("licenses")
         if license_collection is None:
             return Response({"error": "MongoDB not connected"}, status=500)
 
@@ -378,19 +590,13 @@ class LicenseViewSet(viewsets.ViewSet):
             {"_id": ObjectId(pk)},
             {"$set": {"is_approved": True}}
         )
+        license_doc["is_approved"] = True
 
-        # WhatsApp link
-        name = license_doc.get("name", "")
-        phone = license_doc.get("phone", "")
-        frontend_download_page = "https://putsf.com/#/membership-download"
-
-        message = (
-            f"🎉 Hello {name}!\n\n"
-            f"Your membership card has been approved.\n\n"
-            f"Download here:\n{frontend_download_page}"
-        )
+        # Queue the membership card; it is stored keyed by its content hash
+        card_status, card_digest = cards.enqueue(license_doc, license_collection)
+        invalidate("licenses")
 
-        whatsapp_link = f"https://wa.me/91{phone}?text={quote(message)}"
+        whatsapp_link = _whatsapp_link(license_doc)
 
         return Response({
             "message": "License approved successfully!",
@@ -404,12 +610,68 @@ class LicenseViewSet(viewsets.ViewSet):
                 "photo": license_doc.get("photo"),
                 "is_approved": True,
             },
-            "whatsapp_link": whatsapp_link
+            "whatsapp_link": whatsapp_link,
+            "card_status": card_status,
+            "license_pdf": cards.artifact_url(card_digest) if card_status == "ready" else None,
+        })
+
+    # ---------------------------
+    # POST - Approve many licenses (admin only)
+    # {"ids": [...]} or {"filter": {"is_approved": false}}
+    # ---------------------------
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    def approve_bulk(self, request):
+        license_collection = get_collection("licenses")
+        if license_collection is None:
+            return Response({"error": "MongoDB not connected"}, status=500)
+
+        query, invalid_ids, error = _bulk_query(request.data)
+        if error:
+            return Response({"error": error}, status=400)
+
+        license_docs = list(license_collection.find(query).limit(LICENSE_BULK_MAX + 1))
+        if len(license_docs) > LICENSE_BULK_MAX:
+            return Response({"error": f"Filter matches more than {LICENSE_BULK_MAX} licenses."}, status=400)
+
+        pending = [doc for doc in license_docs if not doc.get("is_approved")]
+        approved_count = 0
+        if pending:
+            # One write for the whole batch; cards render in the background
+            result = license_collection.update_many(
+                {"_id": {"$in": [doc["_id"] for doc in pending]}},
+                {"$set": {"is_approved": True, "card_status": "pending"}},
+            )
+            approved_count = result.modified_count
+            for license_doc in pending:
+                license_doc["is_approved"] = True
+            cards.enqueue_batch(pending, license_collection)
+            invalidate("licenses")
+
+        results = {str(doc["_id"]): "already_approved" for doc in license_docs}
+        results.update({str(doc["_id"]): "approved" for doc in pending})
+        for value in request.data.get("ids") or []:
+            results.setdefault(str(value), "not_found")
+        results.update({value: "invalid_id" for value in invalid_ids})
+
+        return Response({
+            "message": f"{approved_count} licenses approved successfully!",
+            "approved": approved_count,
+            "results": results,
+            "whatsapp_links": [
+                {
+                    "_id": str(doc["_id"]),
+                    "name": doc.get("name"),
+                    "phone": doc.get("phone"),
+                    "whatsapp_link": _whatsapp_link(doc),
+                }
+                for doc in pending
+            ],
         })
 
 
 # =========================================
-# DOWNLOAD LICENSE (Return JSON, No PDF)
+# DOWNLOAD LICENSE
+# JSON for the React card view; ?pdf=1 serves the pre-rendered PDF
 # =========================================
 @api_view(["GET"])
 def download_license(request):
@@ -418,6 +680,10 @@ def download_license(request):
         if not phone:
             return Response({"error": "Phone required"}, status=400)
 
+        license_collection = get_collection("licenses")
+        if license_collection is None:
+            return Response({"error": "MongoDB not connected"}, status=500)
+
         license_doc = license_collection.find_one({
             "phone": phone,
             "is_approved": True
@@ -426,9 +692,18 @@ def download_license(request):
         if not license_doc:
             return Response({"error": "Not found or not approved"}, status=404)
 
-        license_doc["_id"] = str(license_doc["_id"])
+        if request.GET.get("pdf"):
+            pdf_path = cards.cached_artifact(license_doc)
+            if pdf_path is None:
+                # Not rendered yet (or data/template changed): queue it, client retries
+                cards.enqueue(license_doc, license_collection)
+                return Response({"status": "rendering", "message": "Membership card is being generated."}, status=202)
+
+            name = "".join(c for c in license_doc.get("name", "Member") if c.isalnum() or c in " _-")
+            return FileResponse(open(pdf_path, "rb"), as_attachment=True,
+                                filename=f"PUTSF_{name}.pdf", content_type="application/pdf")
 
-        # ❗ No PDF — return JSON for frontend React view
+        # JSON for frontend React view
         return Response({
             "message": "Approved license data",
             "data": license_doc
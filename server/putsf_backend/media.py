@@ -0,0 +1,210 @@
+# putsf_backend/media.py
+"""
+Content-addressed storage for uploaded media.
+
+Uploads are stored once under ``MEDIA_ROOT/blobs/<aa>/<sha256><ext>``: the
+same photo uploaded to the gallery and a blog post is one file, and two
+different files that happen to share a name no longer overwrite each
+other. Because a blob's URL changes whenever its bytes do, blob URLs are
+immutable and can be cached forever.
+
+Every document that points at a blob is recorded in the ``media_blobs``
+collection (``{"_id": sha256, "path": ..., "refs": ["gallery_images:<id>",
+...]}``); ``release`` unlinks the file only when its last reference goes.
+
+Usage::
+
+    from putsf_backend import media
+
+    owner = media.owner("gallery_images", image_id)
+    path, url = media.store(request.FILES["image"], owner)
+    ...
+    media.release(url, owner)
+"""
+import datetime
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from urllib.parse import urlparse
+
+from django.conf import settings
+
+from putsf_backend.mongo import get_collection
+
+logger = logging.getLogger(__name__)
+
+BLOB_DIR = "blobs"
+BLOB_COLLECTION = "media_blobs"
+
+_BLOB_NAME = re.compile(r"^([0-9a-f]{64})(\.[a-z0-9]{1,8})?$")
+_CARD_NAME = re.compile(r"^[0-9a-f]{64}\.pdf$")
+
+
+# -----------------------------
+# Paths
+# -----------------------------
+def media_url(path):
+    """Public URL of a file under ``MEDIA_ROOT``."""
+    rel = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, "/")
+    return f"{settings.SITE_DOMAIN}{settings.MEDIA_URL}{rel}"
+
+
+def media_path(url):
+    """File under ``MEDIA_ROOT`` behind a ``/media/...`` URL, or None."""
+    if not url or "/media/" not in url:
+        return None
+    rel = urlparse(url).path.split("/media/", 1)[-1]
+    path = os.path.normpath(os.path.join(settings.MEDIA_ROOT, rel))
+    if not path.startswith(os.path.normpath(settings.MEDIA_ROOT) + os.sep):
+        return None
+    return path
+
+
+def blob_path(digest, ext=""):
+    return os.path.join(settings.MEDIA_ROOT, BLOB_DIR, digest[:2], f"{digest}{ext}")
+
+
+def blob_digest(path):
+    """sha256 of the blob at ``path``, or None for files outside the blob store."""
+    root = os.path.join(os.path.normpath(settings.MEDIA_ROOT), BLOB_DIR) + os.sep
+    if not path or not path.startswith(root):
+        return None
+    match = _BLOB_NAME.match(os.path.basename(path))
+    return match.group(1) if match else None
+
+
+def is_fingerprinted(rel):
+    """
+    True for files whose name changes whenever their bytes do (blobs,
+    image variants, membership cards), so their URLs can be cached forever.
+    """
+    from putsf_backend import images
+
+    name = os.path.basename(rel)
+    parent = os.path.dirname(rel)
+    if parent.split("/", 1)[0] == BLOB_DIR and _BLOB_NAME.match(name):
+        return True
+    if os.path.basename(parent) == images.VARIANT_DIR and images.VARIANT_NAME.match(name):
+        return True
+    return parent == settings.LICENSE_CARD_DIR and bool(_CARD_NAME.match(name))
+
+
+def _extension(filename):
+    ext = os.path.splitext(filename or "")[1].lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,8}", ext) else ""
+
+
+def owner(collection, doc_id):
+    """Reference key of one document."""
+    return f"{collection}:{doc_id}"
+
+
+# Document fields holding media URLs, per collection (``image_variants`` is handled separately)
+MEDIA_FIELDS = {
+    "gallery_images": ("image_url",),
+    "blog_posts": ("image_url",),
+    "banners": ("image_url",),
+    "licenses": ("photo", "license_pdf"),
+}
+
+
+# -----------------------------
+# Store / release
+# -----------------------------
+def store(upload, ref):
+    """
+    Store an uploaded file by content and record ``ref`` as a user of it.
+
+    Returns ``(path, url)``. Uploads spooled by ``MediaUploadHandler`` are
+    already hashed and sit in the blob directory, so they are renamed into
+    place. Anything else is hashed while it is copied into a temp file
+    there first. Either way the blob appears atomically, and an existing
+    blob is never rewritten.
+    """
+    blob_root = os.path.join(os.path.normpath(settings.MEDIA_ROOT), BLOB_DIR)
+    ext = _extension(upload.name)
+
+    digest = getattr(upload, "sha256", None)
+    if digest and os.path.dirname(os.path.normpath(upload.temporary_file_path())) == blob_root:
+        # The request's file close unlinks the spool if it wasn't moved
+        return _place(upload.temporary_file_path(), digest, ext, ref)
+
+    os.makedirs(blob_root, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=blob_root, suffix=".upload")
+    try:
+        sha = hashlib.sha256()
+        with os.fdopen(fd, "wb") as f:
+            for chunk in upload.chunks():
+                sha.update(chunk)
+                f.write(chunk)
+        return _place(tmp_path, sha.hexdigest(), ext, ref)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _place(tmp_path, digest, ext, ref):
+    path = blob_path(digest, ext)
+    # Reference first, so a concurrent release can't delete a blob we are about to use
+    acquire(digest, ref, path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if not os.path.exists(path):
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    return path, media_url(path)
+
+
+def acquire(digest, ref, path):
+    blobs = get_collection(BLOB_COLLECTION)
+    if blobs is None:
+        return
+    now = datetime.datetime.utcnow()
+    blobs.update_one(
+        {"_id": digest},
+        {
+            "$addToSet": {"refs": ref},
+            # touched_at lets gc_media skip blobs claimed by an upload still in flight
+            "$set": {"touched_at": now},
+            "$setOnInsert": {"path": os.path.relpath(path, settings.MEDIA_ROOT), "created_at": now},
+        },
+        upsert=True,
+    )
+
+
+def release(url, ref):
+    """
+    Drop ``ref``'s claim on the file behind ``url``; unlink it if unused.
+
+    Files stored before the blob store existed have no reference record
+    and are removed directly, as the upload views used to do.
+    """
+    path = media_path(url)
+    if path is None:
+        return False
+
+    digest = blob_digest(path)
+    if digest is not None:
+        blobs = get_collection(BLOB_COLLECTION)
+        if blobs is None:
+            return False
+        blobs.update_one({"_id": digest}, {"$pull": {"refs": ref}})
+        # Only the caller whose delete matches an empty ref list removes the file
+        if not blobs.delete_one({"_id": digest, "refs": {"$size": 0}}).deleted_count:
+            return False
+
+    _unlink(path)
+    return True
+
+
+def _unlink(path):
+    from putsf_backend import images
+
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"❌ Could not remove media file {path}: {e}")
+    images.remove_variants(path)
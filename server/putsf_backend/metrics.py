@@ -0,0 +1,200 @@
+# putsf_backend/metrics.py
+"""
+Prometheus metrics, served at ``/metrics`` in the text exposition format.
+
+- ``putsf_http_requests_total{view,method,status}`` and
+  ``putsf_http_request_duration_seconds{view,method}``: labelled by URL
+  name (``gallery-list``, ``blog_posts``, ``license-list`` ...), never by
+  path. Requests that match no URL are counted as ``unresolved``.
+- ``putsf_http_requests_in_progress``: requests being handled right now.
+- ``putsf_mongo_pool_checkout_wait_seconds``: time spent waiting for a
+  pooled connection, plus checkout failures and connections checked out.
+- ``putsf_cache_requests_total{cache,result}``: hits and misses of the
+  listing cache, the conditional GET validators and the resize cache
+  (ratio: ``hit / (hit + miss)``).
+- ``putsf_upload_bytes{endpoint}``: size of each uploaded file.
+
+With several gunicorn workers each process only sees its own requests.
+Set ``PROMETHEUS_MULTIPROC_DIR`` to an empty directory writable by every
+worker: each process then writes its samples to files in it, ``/metrics``
+sums them, and the hooks in gunicorn.conf.py clear the directory on start
+and drop the gauges of dead workers.
+
+Only scrapers may read ``/metrics``: requests from ``METRICS_ALLOWED_IPS``
+(addresses or networks, checked against REMOTE_ADDR) that did not come
+through a proxy, or requests carrying ``Authorization: Bearer
+<METRICS_TOKEN>``. Everyone else gets a 403.
+
+Everything here is a no-op when prometheus_client is not installed.
+"""
+import hmac
+import ipaddress
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from pymongo import monitoring
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+except ImportError:  # pragma: no cover - metrics are optional
+    prometheus_client = None
+
+UNRESOLVED = "unresolved"
+# Anything else is counted as "other", so odd clients can't add label values
+_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+if prometheus_client is not None:
+    REQUESTS = Counter(
+        "putsf_http_requests_total", "HTTP requests by URL name, method and status.",
+        ["view", "method", "status"],
+    )
+    LATENCY = Histogram(
+        "putsf_http_request_duration_seconds", "Time to produce the response, by URL name.",
+        ["view", "method"], buckets=settings.METRICS_LATENCY_BUCKETS,
+    )
+    IN_PROGRESS = Gauge(
+        "putsf_http_requests_in_progress", "Requests being handled.",
+        multiprocess_mode="livesum",
+    )
+    CHECKOUT_WAIT = Histogram(
+        "putsf_mongo_pool_checkout_wait_seconds", "Time waiting to check a connection out of the Mongo pool.",
+        buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+    )
+    CHECKOUT_FAILURES = Counter(
+        "putsf_mongo_pool_checkout_failures_total", "Failed Mongo pool checkouts by reason.", ["reason"],
+    )
+    CHECKED_OUT = Gauge(
+        "putsf_mongo_pool_checked_out", "Mongo connections currently checked out.",
+        multiprocess_mode="livesum",
+    )
+    CACHE = Counter(
+        "putsf_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ["cache", "result"],
+    )
+    UPLOAD_BYTES = Histogram(
+        "putsf_upload_bytes", "Size of uploaded files by endpoint.", ["endpoint"],
+        buckets=(16 * 1024, 64 * 1024, 256 * 1024, 1024 ** 2, 2 * 1024 ** 2, 5 * 1024 ** 2, 10 * 1024 ** 2, 25 * 1024 ** 2),
+    )
+
+
+def cache_result(cache, hit):
+    if prometheus_client is not None:
+        CACHE.labels(cache, "hit" if hit else "miss").inc()
+
+
+def upload(endpoint, size):
+    if prometheus_client is not None:
+        UPLOAD_BYTES.labels(endpoint).observe(size)
+
+
+# -----------------------------
+# Mongo pool
+# -----------------------------
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """Checkout waits; a checkout starts and ends on the same thread."""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        if prometheus_client is None:
+            return
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            CHECKOUT_WAIT.observe(time.perf_counter() - started)
+            self._local.started = None
+        CHECKED_OUT.inc()
+
+    def connection_check_out_failed(self, event):
+        self._local.started = None
+        if prometheus_client is not None:
+            CHECKOUT_FAILURES.labels(event.reason).inc()
+
+    def connection_checked_in(self, event):
+        if prometheus_client is not None:
+            CHECKED_OUT.dec()
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+
+pool_metrics_listener = PoolMetricsListener()
+
+
+# -----------------------------
+# Requests
+# -----------------------------
+class MetricsMiddleware:
+    """Count and time every request; goes first so static files and errors are included."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if prometheus_client is None or not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        started = time.perf_counter()
+        IN_PROGRESS.inc()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            IN_PROGRESS.dec()
+            match = getattr(request, "resolver_match", None)
+            view = (match.view_name if match else None) or UNRESOLVED
+            method = request.method if request.method in _METHODS else "other"
+            LATENCY.labels(view, method).observe(time.perf_counter() - started)
+            REQUESTS.labels(view, method, str(status)).inc()
+
+
+def _scraper_allowed(request):
+    token = settings.METRICS_TOKEN
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    if token and header.startswith("Bearer ") and hmac.compare_digest(header[7:].strip(), token):
+        return True
+    # Behind a proxy on the same host every public request comes from an allowed address
+    if "HTTP_X_FORWARDED_FOR" in request.META:
+        return False
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics(request):
+    """Text exposition of every metric (summed over workers in multiprocess mode)."""
+    if prometheus_client is None or not settings.METRICS_ENABLED:
+        raise Http404("Metrics are not enabled.")
+    if not _scraper_allowed(request):
+        return HttpResponseForbidden("Forbidden")
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return HttpResponse(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
@@ -1,29 +1,302 @@
 # putsf_backend/mongo.py
-import os
-from pymongo import MongoClient
-from dotenv import load_dotenv
-from pathlib import Path
+"""
+Single MongoDB connection manager for the whole project.
+
+One ``MongoClient`` (and therefore one connection pool) is created per
+process and reused by every view. The client is rebuilt automatically in
+a forked child (gunicorn workers), because pymongo clients must not be
+shared across ``fork()``.
+
+Nothing here talks to the network at import time: the client is created
+with ``connect=False`` on first use, and ``warm_up_in_background()`` builds
+it and opens the first connection from a daemon thread, so worker boot
+never waits on Atlas. Building a client can still block: a
+``mongodb+srv://`` URI is resolved through DNS in the constructor. When
+that fails, the failure is remembered and the next attempt waits for a
+backoff (doubling up to ``MONGO_CONNECT_RETRY_MAX`` seconds) instead of
+repeating the lookup on every request. ``check_health()`` backs the ``/readyz`` endpoint.
+
+Usage::
+
+    from putsf_backend.mongo import get_collection
+
+    licenses = get_collection("licenses")   # None if Mongo is not configured
+"""
 import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from pymongo import MongoClient, monitoring
+from pymongo.read_concern import ReadConcern
+from pymongo.write_concern import WriteConcern
+
+from putsf_backend.metrics import pool_metrics_listener
+from putsf_backend.perf import command_listener
+from putsf_backend.slow_queries import slow_query_listener
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_client_error = None
+_client_retry_at = 0.0  # monotonic time before which a failed client is not rebuilt
+_client_retry_delay = 0.0
+_lock = threading.Lock()
+
+# Result of the most recent ping (see check_health)
+_health = {"ok": None, "latency_ms": None, "error": None, "checked_at": None}
+_health_lock = threading.Lock()
+_health_thread = None
+
+
+# -----------------------------
+# Pool statistics
+# -----------------------------
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Counts connection pool events for the current process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "checkout_failures": 0,
+            "checked_out": 0,
+            "pool_clears": 0,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+    def _incr(self, key, amount=1):
+        with self._lock:
+            self.stats[key] += amount
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._incr("pool_clears")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._incr("connections_created")
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._incr("connections_closed")
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._incr("checkout_failures")
+
+    def connection_checked_out(self, event):
+        self._incr("checkouts")
+        self._incr("checked_out")
+
+    def connection_checked_in(self, event):
+        self._incr("checked_out", -1)
+
+
+pool_listener = PoolStatsListener()
+
 
 # -----------------------------
-# Setup
+# Client
 # -----------------------------
-BASE_DIR = Path(__file__).resolve().parent.parent
-load_dotenv(os.path.join(BASE_DIR, ".env"))
+def _client_options():
+    options = {
+        "maxPoolSize": settings.MONGO_MAX_POOL_SIZE,
+        "minPoolSize": settings.MONGO_MIN_POOL_SIZE,
+        "maxIdleTimeMS": settings.MONGO_MAX_IDLE_TIME_MS,
+        "serverSelectionTimeoutMS": settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": settings.MONGO_CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": settings.MONGO_SOCKET_TIMEOUT_MS,
+        "waitQueueTimeoutMS": settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        # perf: per-request command counts and time; metrics: checkout waits
+        "event_listeners": [pool_listener, pool_metrics_listener, command_listener, slow_query_listener],
+    }
+    if settings.MONGO_READ_PREFERENCE:
+        options["readPreference"] = settings.MONGO_READ_PREFERENCE
+    return options
 
-MONGO_URI = os.getenv("MONGO_URI")
-MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 
-db = None
+def _connect():
+    # connect=False: no sockets are opened until the first operation
+    client = MongoClient(settings.MONGO_URI, connect=False, **_client_options())
+    logger.info(f"MongoDB client created for {settings.MONGO_DB_NAME} (pid {os.getpid()})")
+    return client
 
-if MONGO_URI and MONGO_DB_NAME:
+
+def get_client():
+    """Return this process's shared client, or None if Mongo is not configured."""
+    global _client, _client_pid, _client_error, _client_retry_at, _client_retry_delay
+
+    if not (settings.MONGO_URI and settings.MONGO_DB_NAME):
+        return None
+
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    if time.monotonic() < _client_retry_at:
+        return None
+
+    with _lock:
+        if (_client is None or _client_pid != pid) and time.monotonic() >= _client_retry_at:
+            try:
+                _client = _connect()
+                _client_pid = pid
+                _client_error = None
+                _client_retry_delay = 0.0
+            except Exception as e:
+                # e.g. an unresolvable mongodb+srv:// host
+                _client = None
+                _client_pid = None
+                _client_error = str(e)
+                _client_retry_delay = min(max(_client_retry_delay * 2, 1.0), settings.MONGO_CONNECT_RETRY_MAX)
+                _client_retry_at = time.monotonic() + _client_retry_delay
+                logger.error(f"❌ MongoDB Atlas connection error (retrying in {_client_retry_delay:.0f}s): {e}")
+    return _client
+
+
+def get_db():
+    """Return the configured database, or None if Mongo is not available."""
+    client = get_client()
+    if client is None:
+        return None
+
+    write_concern = None
+    if settings.MONGO_WRITE_CONCERN:
+        w = settings.MONGO_WRITE_CONCERN
+        write_concern = WriteConcern(w=int(w) if w.isdigit() else w)
+    read_concern = ReadConcern(settings.MONGO_READ_CONCERN) if settings.MONGO_READ_CONCERN else None
+
+    return client.get_database(
+        settings.MONGO_DB_NAME,
+        write_concern=write_concern,
+        read_concern=read_concern,
+    )
+
+
+def get_collection(name):
+    """Return a collection handle from the shared client, or None."""
+    db = get_db()
+    return db[name] if db is not None else None
+
+
+# -----------------------------
+# Health / warm-up
+# -----------------------------
+def ping():
+    """Ping the server and record reachability and round-trip latency."""
+    client = get_client()
+    started = time.monotonic()
     try:
-        client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-        client.admin.command('ping')  # Test connection
-        db = client[MONGO_DB_NAME]
-        logging.info(f"✅ Connected to MongoDB Atlas: {MONGO_DB_NAME}")
+        if client is None:
+            raise RuntimeError(_client_error or "MONGO_URI or MONGO_DB_NAME not set")
+        client.admin.command("ping")
+        result = {"ok": True, "error": None}
     except Exception as e:
-        logging.error(f"❌ MongoDB Atlas connection error: {e}")
-        db = None
-else:
-    logging.warning("⚠️ MONGO_URI or MONGO_DB_NAME not set. db is None")
+        result = {"ok": False, "error": str(e)}
+    result["latency_ms"] = round((time.monotonic() - started) * 1000, 2)
+    result["checked_at"] = time.time()
+
+    with _health_lock:
+        _health.update(result)
+    return dict(result)
+
+
+def _start_ping_thread():
+    """Start a background ping unless one is already running."""
+    global _health_thread
+    with _health_lock:
+        if _health_thread is not None and _health_thread.is_alive():
+            return _health_thread
+        _health_thread = threading.Thread(target=ping, name="mongo-ping", daemon=True)
+        _health_thread.start()
+        return _health_thread
+
+
+def warm_up_in_background():
+    """Build the client and open the first pooled connection off the request path."""
+    if not (settings.MONGO_URI and settings.MONGO_DB_NAME):
+        return None
+    return _start_ping_thread()
+
+
+def check_health(timeout=None, max_age=None):
+    """
+    Return the latest ping result, refreshing it when older than ``max_age``.
+
+    Waits at most ``timeout`` seconds for a fresh ping; a ping that takes
+    longer keeps running in the background and is reported as pending.
+    """
+    timeout = settings.MONGO_HEALTH_TIMEOUT if timeout is None else timeout
+    max_age = settings.MONGO_HEALTH_MAX_AGE if max_age is None else max_age
+
+    with _health_lock:
+        snapshot = dict(_health)
+    if snapshot["checked_at"] is not None and time.time() - snapshot["checked_at"] < max_age:
+        return snapshot
+
+    thread = _start_ping_thread()
+    thread.join(timeout)
+    with _health_lock:
+        snapshot = dict(_health)
+    if thread.is_alive():
+        snapshot.update({"ok": False, "error": f"ping still pending after {timeout}s"})
+    return snapshot
+
+
+def pool_stats():
+    """Connection pool counters for this process."""
+    stats = pool_listener.snapshot()
+    stats["pid"] = os.getpid()
+    stats["connected"] = _client is not None and _client_pid == os.getpid()
+    stats["max_pool_size"] = settings.MONGO_MAX_POOL_SIZE
+    return stats
+
+
+def close():
+    """Close this process's client (e.g. on worker shutdown)."""
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+
+def _after_fork_in_child():
+    # The parent's client (and its sockets/threads) must not be used here;
+    # drop the reference so the child lazily builds its own.
+    global _client, _client_pid, _client_error, _client_retry_at, _client_retry_delay
+    global _lock, _health_lock, _health_thread
+    _lock = threading.Lock()
+    _client = None
+    _client_pid = None
+    _client_error = None
+    _client_retry_at = 0.0
+    _client_retry_delay = 0.0
+    _health_lock = threading.Lock()
+    _health_thread = None
+    _health.update({"ok": None, "latency_ms": None, "error": None, "checked_at": None})
+    pool_listener._lock = threading.Lock()
+    pool_listener.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
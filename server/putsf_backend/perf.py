@@ -0,0 +1,173 @@
+# putsf_backend/perf.py
+"""
+Per-request performance accounting.
+
+``PerformanceMiddleware`` measures each request and reports:
+- wall time;
+- MongoDB commands and their time, taken from ``command_listener``, a
+  pymongo ``CommandListener`` on the shared client (see mongo.py);
+- SQL queries and their time;
+- time spent rendering the response, and the bytes it produced.
+
+The figures go out as a ``Server-Timing`` header (shown in the browser's
+network panel) and as one JSON log line per request on the
+``putsf_backend.perf`` logger::
+
+    {"view": "license-approve", "method": "POST", "status": 200, "wall_ms": 41.2,
+     "mongo": {"count": 3, "ms": 30.5, "commands": {"find": 1, "update": 2}},
+     "db": {"count": 0, "ms": 0.0}, "render_ms": 0.3, "bytes": 57}
+
+``mongo.commands`` makes find-then-update patterns and N+1 loops show
+up per endpoint. Work done by background threads (card rendering, the
+complaint outbox, the phone registry) runs outside any request and is
+not counted.
+"""
+import contextvars
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("putsf_request_stats", default=None)
+
+
+class RequestStats:
+    __slots__ = (
+        "request", "started", "mongo_count", "mongo_us", "mongo_commands",
+        "db_count", "db_seconds", "render_started", "render_seconds",
+    )
+
+    def __init__(self, request=None):
+        self.request = request
+        self.started = time.perf_counter()
+        self.mongo_count = 0
+        self.mongo_us = 0
+        self.mongo_commands = {}
+        self.db_count = 0
+        self.db_seconds = 0.0
+        self.render_started = None
+        self.render_seconds = 0.0
+
+    @property
+    def view_name(self):
+        match = getattr(self.request, "resolver_match", None)
+        return match.view_name if match else None
+
+
+def current():
+    """Stats of the request being handled by this thread, or None."""
+    return _current.get()
+
+
+# -----------------------------
+# Mongo
+# -----------------------------
+class CommandStatsListener(monitoring.CommandListener):
+    """Adds every command's duration to the current request's stats."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    def _record(self, event):
+        stats = _current.get()
+        if stats is None:
+            return
+        stats.mongo_count += 1
+        stats.mongo_us += event.duration_micros
+        stats.mongo_commands[event.command_name] = stats.mongo_commands.get(event.command_name, 0) + 1
+
+
+command_listener = CommandStatsListener()
+
+
+# -----------------------------
+# Middleware
+# -----------------------------
+def _sql_timer(stats):
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.db_count += 1
+            stats.db_seconds += time.perf_counter() - started
+    return wrapper
+
+
+def _response_bytes(response):
+    if not response.streaming:
+        return len(response.content)
+    length = response.get("Content-Length")
+    return int(length) if length else None
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.PERF_ENABLED:
+            return self.get_response(request)
+
+        stats = RequestStats(request)
+        token = _current.set(stats)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_sql_timer(stats)))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        wall = time.perf_counter() - stats.started
+        self._report(request, response, stats, wall)
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook
+        stats = _current.get()
+        if stats is not None:
+            stats.render_started = time.perf_counter()
+            response.add_post_render_callback(lambda r: self._rendered(stats))
+        return response
+
+    def _rendered(self, stats):
+        stats.render_seconds = time.perf_counter() - stats.render_started
+
+    def _report(self, request, response, stats, wall):
+        mongo_ms = stats.mongo_us / 1000
+        db_ms = stats.db_seconds * 1000
+        render_ms = stats.render_seconds * 1000
+
+        if settings.PERF_SERVER_TIMING:
+            response["Server-Timing"] = ", ".join((
+                f"app;dur={wall * 1000:.1f}",
+                f'mongo;dur={mongo_ms:.1f};desc="{stats.mongo_count} cmds"',
+                f'db;dur={db_ms:.1f};desc="{stats.db_count} queries"',
+                f"render;dur={render_ms:.1f}",
+            ))
+
+        if settings.PERF_LOG:
+            logger.info(json.dumps({
+                "view": stats.view_name,
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "wall_ms": round(wall * 1000, 1),
+                "mongo": {"count": stats.mongo_count, "ms": round(mongo_ms, 1), "commands": stats.mongo_commands},
+                "db": {"count": stats.db_count, "ms": round(db_ms, 1)},
+                "render_ms": round(render_ms, 1),
+                "bytes": _response_bytes(response),
+            }, separators=(",", ":")))
@@ -0,0 +1,68 @@
+# putsf_backend/renderers.py
+"""
+Project-wide JSON renderer.
+
+Mongo documents can be handed to ``Response`` as-is: ``ObjectId``,
+``datetime`` and ``Decimal`` are encoded natively, so views don't need
+to loop over results rewriting ``_id`` first. Uses orjson when it is
+installed and falls back to the standard library otherwise.
+"""
+import json
+from decimal import Decimal
+
+from bson import ObjectId
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+    # Naive datetimes stay naive; aware UTC ones end in "Z", both exactly as DRF writes them
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+class MongoJSONEncoder(JSONEncoder):
+    """DRF's encoder plus ``ObjectId``."""
+
+    def default(self, obj):
+        if isinstance(obj, ObjectId):
+            return str(obj)
+        return super().default(obj)
+
+
+_fallback_encoder = MongoJSONEncoder()
+
+
+def _default(obj):
+    """orjson hook for the types it doesn't handle itself."""
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    return _fallback_encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """Drop-in replacement for ``rest_framework.renderers.JSONRenderer``."""
+
+    encoder_class = MongoJSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        option = _ORJSON_OPTIONS
+        # The browsable API asks for indented output
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=option)
+
+
+def dumps(data):
+    """Encode ``data`` exactly as API responses are encoded (returns bytes)."""
+    if orjson is None:
+        return json.dumps(data, cls=MongoJSONEncoder, ensure_ascii=False, separators=(",", ":")).encode()
+    return orjson.dumps(data, default=_default, option=_ORJSON_OPTIONS)
@@ -0,0 +1,162 @@
+# putsf_backend/resize.py
+"""
+On-demand resized copies of media images with a bounded disk cache.
+
+``/media/resize/<w>x<h>/<path>`` crops and scales an image under
+``MEDIA_ROOT`` to exactly ``w`` x ``h`` (cover fit, centred) the first
+time it is requested. Only sizes listed in ``IMAGE_RESIZE_SIZES`` are
+accepted, and each process renders at most ``IMAGE_RESIZE_CONCURRENCY``
+images at once, so the endpoint can't be used to burn CPU.
+
+Results live in ``IMAGE_RESIZE_CACHE_DIR`` (outside ``MEDIA_ROOT``, so
+``gc_media`` never sees them) under a key derived from the source file's
+identity, the size and the output format. A hit bumps the file's mtime;
+when the cache grows past ``IMAGE_RESIZE_CACHE_MAX_BYTES`` the least
+recently used entries are removed.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+from putsf_backend import metrics
+
+logger = logging.getLogger(__name__)
+
+# Output format -> (Pillow format, extension, content type)
+FORMATS = {
+    "webp": ("WEBP", "webp", "image/webp"),
+    "jpeg": ("JPEG", "jpg", "image/jpeg"),
+}
+
+_render_slots = None
+_prune_lock = threading.Lock()
+_cache_bytes = None  # this process's running estimate of the cache size
+
+
+def allowed(width, height):
+    return f"{width}x{height}" in settings.IMAGE_RESIZE_SIZES
+
+
+def _slots():
+    global _render_slots
+    if _render_slots is None:
+        _render_slots = threading.BoundedSemaphore(settings.IMAGE_RESIZE_CONCURRENCY)
+    return _render_slots
+
+
+def cache_path(source, width, height, fmt):
+    """Cache entry for ``source`` at ``width`` x ``height``; changes when the source does."""
+    stat = os.stat(source)
+    key = hashlib.sha256(
+        f"{source}|{stat.st_size}|{stat.st_mtime_ns}|{width}x{height}|{fmt}".encode()
+    ).hexdigest()
+    return os.path.join(settings.IMAGE_RESIZE_CACHE_DIR, key[:2], f"{key}.{FORMATS[fmt][1]}")
+
+
+def render(source, target, width, height, fmt):
+    from PIL import Image, ImageOps
+
+    pil_format = FORMATS[fmt][0]
+    with Image.open(source) as image:
+        # Let the JPEG decoder downscale by powers of two while reading
+        image.draft("RGB", (max(width, height) * 2, max(width, height) * 2))
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        if pil_format == "JPEG" and image.mode != "RGB":
+            image = image.convert("RGB")
+        image = ImageOps.fit(image, (width, height), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+        try:
+            options = {"quality": settings.IMAGE_VARIANT_QUALITY}
+            if pil_format == "JPEG":
+                options.update(optimize=True, progressive=True)
+            else:
+                options.update(method=4)
+            with os.fdopen(fd, "wb") as f:
+                # Metadata of the original (EXIF, GPS) is dropped
+                image.save(f, pil_format, **options)
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, target)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return os.path.getsize(target)
+
+
+def _open(path):
+    # Opened by descriptor: the file object has no path for FileResponse to stat after a prune
+    return os.fdopen(os.open(path, os.O_RDONLY), "rb")
+
+
+def get(source, width, height, fmt):
+    """
+    Open file of the resized image, rendering it on a miss.
+
+    The file is opened before any pruning, so an entry evicted while it
+    is being sent stays readable until the response is done.
+    """
+    target = cache_path(source, width, height, fmt)
+    try:
+        f = _open(target)
+        os.utime(target)  # LRU: a hit counts as a use
+        metrics.cache_result("resize", True)
+        return f
+    except FileNotFoundError:
+        metrics.cache_result("resize", False)
+
+    with _slots():
+        size = None if os.path.exists(target) else render(source, target, width, height, fmt)
+        f = _open(target)
+    if size is not None:
+        _account(size)
+    return f
+
+
+# -----------------------------
+# Size bound
+# -----------------------------
+def _entries():
+    for root, _dirs, files in os.walk(settings.IMAGE_RESIZE_CACHE_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield stat.st_mtime, stat.st_size, path
+
+
+def _account(size):
+    global _cache_bytes
+    with _prune_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _mtime, size, _path in _entries())
+        else:
+            _cache_bytes += size
+        if _cache_bytes > settings.IMAGE_RESIZE_CACHE_MAX_BYTES:
+            _cache_bytes = prune()
+
+
+def prune(target_ratio=0.9):
+    """Drop least recently used entries until the cache is under ``target_ratio`` of its limit."""
+    entries = sorted(_entries())
+    total = sum(size for _mtime, size, _path in entries)
+    limit = settings.IMAGE_RESIZE_CACHE_MAX_BYTES * target_ratio
+    for _mtime, size, path in entries:
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            total -= size
+        except OSError as e:
+            logger.error(f"❌ Could not prune resize cache entry {path}: {e}")
+    return total
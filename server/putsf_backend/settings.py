@@ -1,6 +1,5 @@
 import os
 from pathlib import Path
-from pymongo import MongoClient
 from dotenv import load_dotenv
 
 # -----------------------------
@@ -54,20 +53,23 @@ INSTALLED_APPS = [
     'rest_framework',
 
     # Local apps
+    "putsf_backend.core.apps.CoreConfig",
     "putsf_backend.accounts",
     "putsf_backend.gallery",
     "putsf_backend.blog",
     "putsf_backend.banner",
-    "putsf_backend.license",
-    "putsf_backend.complaints",
+    "putsf_backend.license.apps.LicenseConfig",
+    "putsf_backend.complaints.apps.ComplaintsConfig",
 ]
 
 # -----------------------------
 # Middleware
 # -----------------------------
 MIDDLEWARE = [
+    'putsf_backend.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'putsf_backend.perf.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -113,6 +115,9 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Some SQL models are ahead of their migrations (that data lives in Mongo), so the
+        # test database can't be serialized table by model; no test needs serialized_rollback
+        'TEST': {'SERIALIZE': False},
     }
 }
 
@@ -122,32 +127,102 @@ DATABASES = {
 MONGO_URI = os.getenv("MONGO_URI")
 MONGO_DB_NAME = os.getenv("MONGO_DB_NAME")
 
-_db = None
-
-def get_db():
-    """Return MongoDB connection instance if configured"""
-    global _db
-    if _db is None:
-        if MONGO_URI and MONGO_DB_NAME:
-            try:
-                client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=5000)
-                client.admin.command('ping')
-                _db = client[MONGO_DB_NAME]
-                if DEBUG:
-                    print(f"✅ Connected to MongoDB: {MONGO_DB_NAME}")
-            except Exception as e:
-                _db = None
-                if DEBUG:
-                    print(f"⚠️ MongoDB connection failed: {e}. Skipping MongoDB.")
-        else:
-            if DEBUG:
-                print("⚠️ MONGO_URI or MONGO_DB_NAME not set. Skipping MongoDB.")
-    return _db
-
-
-# Make get_db accessible via settings
-from django.conf import settings as django_settings
-django_settings.get_db = get_db
+# Reconcile declared indexes when a server process starts (otherwise run `manage.py ensure_mongo_indexes`)
+MONGO_ENSURE_INDEXES = os.getenv("MONGO_ENSURE_INDEXES", "False").lower() in ["true", "1", "yes"]
+
+# Connection pool (one client per process, see putsf_backend/mongo.py)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv("MONGO_SOCKET_TIMEOUT_MS", "20000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+# Open the first connection in a background thread when a server process starts
+MONGO_WARM_UP = os.getenv("MONGO_WARM_UP", "True").lower() in ["true", "1", "yes"]
+# After a failed client build (e.g. SRV lookup), wait 1s, 2s, 4s ... up to this long before retrying
+MONGO_CONNECT_RETRY_MAX = float(os.getenv("MONGO_CONNECT_RETRY_MAX", "60"))
+# /readyz: reuse a ping result for this many seconds, wait at most this long for a new one
+MONGO_HEALTH_MAX_AGE = float(os.getenv("MONGO_HEALTH_MAX_AGE", "5"))
+MONGO_HEALTH_TIMEOUT = float(os.getenv("MONGO_HEALTH_TIMEOUT", "1"))
+
+# Empty values keep whatever the URI / server default is
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "")      # e.g. "majority" or "1"
+MONGO_READ_CONCERN = os.getenv("MONGO_READ_CONCERN", "")        # e.g. "local" or "majority"
+MONGO_READ_PREFERENCE = os.getenv("MONGO_READ_PREFERENCE", "")  # e.g. "primaryPreferred"
+
+# -----------------------------
+# Cache
+# -----------------------------
+# CACHE_BACKEND: "locmem" (per process), "file" (shared by workers on one host),
+# "memcached", or a dotted backend path for an external cache.
+_CACHE_BACKENDS = {
+    "locmem": "django.core.cache.backends.locmem.LocMemCache",
+    "file": "django.core.cache.backends.filebased.FileBasedCache",
+    "memcached": "django.core.cache.backends.memcached.MemcachedCache",
+}
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "file")
+CACHES = {
+    "default": {
+        "BACKEND": _CACHE_BACKENDS.get(CACHE_BACKEND, CACHE_BACKEND),
+        "LOCATION": os.getenv("CACHE_LOCATION", "/var/tmp/putsf_cache"),
+    }
+}
+
+# Public banner/gallery/blog listings (invalidated on every write, see putsf_backend/cache.py)
+LISTING_CACHE_ALIAS = "default"
+LISTING_CACHE_TTL = int(os.getenv("LISTING_CACHE_TTL", "600"))
+
+# Token-bucket throttles per endpoint and key (see putsf_backend/throttling.py)
+THROTTLE_ENABLED = os.getenv("THROTTLE_ENABLED", "True").lower() in ["true", "1", "yes"]
+THROTTLE_CACHE_ALIAS = "default"
+THROTTLE_RATES = {
+    "complaint": {
+        "ip": os.getenv("COMPLAINT_THROTTLE_IP", "10/min"),
+        "phone": os.getenv("COMPLAINT_THROTTLE_PHONE", "5/hour"),
+    },
+    # Members are often registered in batches from one office connection
+    "license_create": {"ip": os.getenv("LICENSE_CREATE_THROTTLE_IP", "60/hour")},
+    "check_phone": {
+        "ip": os.getenv("CHECK_PHONE_THROTTLE_IP", "60/min"),
+        "phone": os.getenv("CHECK_PHONE_THROTTLE_PHONE", "20/min"),
+    },
+    "admin_login": {"ip": os.getenv("ADMIN_LOGIN_THROTTLE_IP", "10/min")},
+}
+
+# Per-request timing (see putsf_backend/perf.py)
+PERF_ENABLED = os.getenv("PERF_ENABLED", "True").lower() in ["true", "1", "yes"]
+PERF_SERVER_TIMING = os.getenv("PERF_SERVER_TIMING", "True").lower() in ["true", "1", "yes"]
+# One JSON line per request on the putsf_backend.perf logger
+PERF_LOG = os.getenv("PERF_LOG", "True").lower() in ["true", "1", "yes"]
+
+# Slow Mongo operations issued by views (see putsf_backend/slow_queries.py)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_COMMANDS = {"find", "update", "delete", "aggregate", "findAndModify", "count", "distinct"}
+# Run explain("executionStats") in the background, once per query shape per interval
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "True").lower() in ["true", "1", "yes"]
+SLOW_QUERY_EXPLAIN_INTERVAL = int(os.getenv("SLOW_QUERY_EXPLAIN_INTERVAL", "600"))
+
+# Prometheus /metrics (see putsf_backend/metrics.py). With several gunicorn
+# workers also set PROMETHEUS_MULTIPROC_DIR (read by prometheus_client itself)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() in ["true", "1", "yes"]
+# Who may scrape it: REMOTE_ADDR in these addresses/networks (not via a proxy), or a bearer token
+METRICS_ALLOWED_IPS = [ip.strip() for ip in os.getenv("METRICS_ALLOWED_IPS", "127.0.0.1,::1").split(",") if ip.strip()]
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "putsf_backend.perf": {"handlers": ["console"], "level": os.getenv("PERF_LOG_LEVEL", "INFO"), "propagate": False},
+        "putsf_backend.slow_queries": {"handlers": ["console"], "level": "WARNING", "propagate": False},
+    },
+}
 
 # -----------------------------
 # Password Validation
@@ -176,6 +251,16 @@ STATICFILES_DIRS = [
     '/root/arshad/Putsf/server/putsf_backend/static',
 ]
 
+# Production: collectstatic writes content-hashed copies plus .gz/.br
+# variants, and WhiteNoise serves the hashed names with far-future caching.
+# DEBUG keeps plain names so no manifest is needed while developing.
+if DEBUG:
+    STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+else:
+    STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Cache lifetime of static files served under their unhashed names
+WHITENOISE_MAX_AGE = int(os.getenv("WHITENOISE_MAX_AGE", "3600"))
+
 
 
 
@@ -194,6 +279,67 @@ else:
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/var/www/putsf_media'
 
+# Serve MEDIA_URL through putsf_backend.views.serve_media (always on in DEBUG)
+MEDIA_SERVE = os.getenv("MEDIA_SERVE", str(DEBUG)).lower() in ["true", "1", "yes"]
+# "" (FileResponse), "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd)
+MEDIA_ACCEL = os.getenv("MEDIA_ACCEL", "").lower()
+# nginx `internal` location aliased to MEDIA_ROOT, used with x-accel-redirect
+MEDIA_ACCEL_PREFIX = os.getenv("MEDIA_ACCEL_PREFIX", "/_protected_media/")
+# Cache lifetime of media whose file name is not content-hashed
+MEDIA_CACHE_MAX_AGE = int(os.getenv("MEDIA_CACHE_MAX_AGE", "3600"))
+
+
+
+# In-process registry of licensed phone numbers (see putsf_backend/license/phones.py)
+PHONE_REGISTRY_ENABLED = os.getenv("PHONE_REGISTRY_ENABLED", "True").lower() in ["true", "1", "yes"]
+# Seconds between picking up other workers' new licenses / between full reloads
+PHONE_REGISTRY_REFRESH = float(os.getenv("PHONE_REGISTRY_REFRESH", "30"))
+PHONE_REGISTRY_RESYNC = float(os.getenv("PHONE_REGISTRY_RESYNC", "3600"))
+
+# Rendered membership cards (see putsf_backend/license/cards.py)
+LICENSE_CARD_DIR = "licenses/cards"
+LICENSE_CARD_WORKERS = int(os.getenv("LICENSE_CARD_WORKERS", "1"))
+# Let WeasyPrint fetch http(s) resources while rendering (off: cards are self-contained)
+LICENSE_CARD_ALLOW_NETWORK = os.getenv("LICENSE_CARD_ALLOW_NETWORK", "False").lower() in ["true", "1", "yes"]
+
+# Resized WebP/JPEG copies of gallery/blog/banner uploads (see putsf_backend/images.py)
+IMAGE_VARIANTS_ENABLED = os.getenv("IMAGE_VARIANTS_ENABLED", "True").lower() in ["true", "1", "yes"]
+IMAGE_VARIANT_WIDTHS = [int(w) for w in os.getenv("IMAGE_VARIANT_WIDTHS", "320,640,1280").split(",") if w.strip()]
+IMAGE_VARIANT_QUALITY = int(os.getenv("IMAGE_VARIANT_QUALITY", "80"))
+IMAGE_VARIANT_WORKERS = int(os.getenv("IMAGE_VARIANT_WORKERS", "1"))
+
+# On-demand crops served at MEDIA_URL + "resize/<w>x<h>/<path>" (see putsf_backend/resize.py)
+# Only these sizes are rendered: banner hero, gallery grid, license card photo
+IMAGE_RESIZE_SIZES = [
+    s.strip() for s in os.getenv("IMAGE_RESIZE_SIZES", "1600x600,1200x450,800x300,600x600,300x300,240x300").split(",")
+    if s.strip()
+]
+IMAGE_RESIZE_CACHE_DIR = os.getenv("IMAGE_RESIZE_CACHE_DIR", "/var/tmp/putsf_resize")
+IMAGE_RESIZE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_RESIZE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+# Renders running at once per worker process; further misses wait
+IMAGE_RESIZE_CONCURRENCY = int(os.getenv("IMAGE_RESIZE_CONCURRENCY", "2"))
+
+# Complaint SQLite -> Mongo outbox (see putsf_backend/complaints/outbox.py)
+# Run a drainer thread in each process (otherwise run `manage.py drain_complaint_outbox`)
+COMPLAINT_OUTBOX_DRAIN = os.getenv("COMPLAINT_OUTBOX_DRAIN", "True").lower() in ["true", "1", "yes"]
+COMPLAINT_OUTBOX_BATCH_SIZE = int(os.getenv("COMPLAINT_OUTBOX_BATCH_SIZE", "100"))
+# Seconds between drains when idle; retries back off from here up to the maximum
+COMPLAINT_OUTBOX_INTERVAL = float(os.getenv("COMPLAINT_OUTBOX_INTERVAL", "5"))
+COMPLAINT_OUTBOX_MAX_BACKOFF = float(os.getenv("COMPLAINT_OUTBOX_MAX_BACKOFF", "600"))
+
+# Per-endpoint upload limits (see putsf_backend/uploads.py)
+UPLOAD_MAX_BYTES = {
+    "gallery": int(os.getenv("GALLERY_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024))),
+    "blog": int(os.getenv("BLOG_UPLOAD_MAX_BYTES", str(10 * 1024 * 1024))),
+    "banner": int(os.getenv("BANNER_UPLOAD_MAX_BYTES", str(15 * 1024 * 1024))),
+    "license_photo": int(os.getenv("LICENSE_PHOTO_MAX_BYTES", str(5 * 1024 * 1024))),
+}
+UPLOAD_IMAGE_TYPES = ["image/jpeg", "image/png", "image/webp", "image/gif"]
+UPLOAD_IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp", ".gif"]
+
+# Where `manage.py gc_media` remembers how far its last run got
+GC_MEDIA_STATE_FILE = os.getenv("GC_MEDIA_STATE_FILE", "/var/tmp/putsf_gc_media.json")
+
 
 
 # -------------------se----------
@@ -242,12 +388,20 @@ AUTH_USER_MODEL = "accounts.AdminUser"
 # REST Framework
 # -----------------------------
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'putsf_backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ]
+    ],
+    # Proxies in front of gunicorn. Throttles key on the client IP: with 0 it is REMOTE_ADDR,
+    # otherwise the X-Forwarded-For entry this many hops back. Set it where the app is deployed
+    # (see Procfile); trusting X-Forwarded-For without a proxy lets clients pick their own key.
+    'NUM_PROXIES': int(os.getenv("NUM_PROXIES", "0")),
 }
 from datetime import timedelta
 
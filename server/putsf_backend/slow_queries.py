@@ -0,0 +1,193 @@
+# putsf_backend/slow_queries.py
+"""
+Slow MongoDB operation log with background ``explain``.
+
+``slow_query_listener`` is a pymongo ``CommandListener`` on the shared
+client (see mongo.py). It watches the commands in ``SLOW_QUERY_COMMANDS``
+that run inside a request (``PerformanceMiddleware`` must be on). Any
+that takes longer than ``SLOW_QUERY_MS`` is logged on the
+``putsf_backend.slow_queries`` logger with:
+- the calling view;
+- the collection;
+- the filter and sort shape, with values replaced by ``"?"`` so no
+  member data ends up in the logs.
+
+A background thread then runs ``explain`` (``executionStats``) for the
+same command and logs a summary: plan stages (``COLLSCAN`` vs
+``IXSCAN <index>``), keys and documents examined, and documents returned.
+Each shape is explained at most once per ``SLOW_QUERY_EXPLAIN_INTERVAL``
+seconds. Explaining a write never modifies data.
+"""
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+
+from putsf_backend import perf
+
+logger = logging.getLogger(__name__)
+
+# Where each command keeps its filter (first statement for update/delete)
+_FILTER_FIELDS = {
+    "find": "filter",
+    "findAndModify": "query",
+    "count": "query",
+    "distinct": "query",
+}
+# Parts of a command that belong to the connection, not the query
+_SESSION_FIELDS = {"lsid", "txnNumber", "$db", "$clusterTime", "$readPreference", "readConcern", "writeConcern"}
+
+_executor = None
+_executor_lock = threading.Lock()
+_explained = {}  # shape key -> monotonic time of the last explain
+
+
+# -----------------------------
+# Shapes
+# -----------------------------
+def shape(value):
+    """``value`` with every literal replaced by ``"?"`` (keys and operators kept)."""
+    if isinstance(value, dict):
+        return {key: shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        # $or/$and branches keep their shape; {"$in": [...]} and friends become "?"
+        return [shape(item) for item in value] if value and isinstance(value[0], dict) else "?"
+    return "?"
+
+
+def _statement(command_name, command):
+    """``(filter, sort)`` of a monitored command."""
+    if command_name in ("update", "delete"):
+        statements = command.get("updates" if command_name == "update" else "deletes") or [{}]
+        return statements[0].get("q", {}), None
+    if command_name == "aggregate":
+        pipeline = command.get("pipeline") or []
+        match = next((stage["$match"] for stage in pipeline if "$match" in stage), {})
+        sort = next((stage["$sort"] for stage in pipeline if "$sort" in stage), None)
+        return match, sort
+    return command.get(_FILTER_FIELDS.get(command_name, "filter"), {}), command.get("sort")
+
+
+# -----------------------------
+# Explain
+# -----------------------------
+def _plan_stages(plan):
+    """Flatten a winning plan into ``["IXSCAN phone_unique", "FETCH", ...]`` (leaf first)."""
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        stages.append(f"{stage} {plan['indexName']}" if plan.get("indexName") else stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages[::-1]
+
+
+def summarize(explain):
+    """The parts of an ``explain`` result worth logging."""
+    cursor = explain
+    for stage in explain.get("stages") or []:  # aggregate with a $cursor stage
+        if "$cursor" in stage:
+            cursor = stage["$cursor"]
+            break
+    planner = cursor.get("queryPlanner", {})
+    execution = cursor.get("executionStats", {})
+    return {
+        "plan": _plan_stages(planner.get("winningPlan", {})),
+        "keys_examined": execution.get("totalKeysExamined"),
+        "docs_examined": execution.get("totalDocsExamined"),
+        "returned": execution.get("nReturned"),
+        "explain_ms": execution.get("executionTimeMillis"),
+    }
+
+
+def _explainable(command_name, command):
+    command = {key: value for key, value in command.items() if key not in _SESSION_FIELDS}
+    for field in ("updates", "deletes"):
+        if field in command:
+            command[field] = command[field][:1]
+    return command
+
+
+def _explain(database_name, command_name, command, context):
+    from putsf_backend.mongo import get_client
+
+    client = get_client()
+    if client is None:
+        return
+    try:
+        result = client[database_name].command(
+            "explain", _explainable(command_name, command), verbosity="executionStats"
+        )
+    except PyMongoError as e:
+        logger.warning(f"⚠️ explain failed for slow {command_name}: {e}")
+        return
+    logger.warning(json.dumps({**context, "explain": summarize(result)}, separators=(",", ":"), default=str))
+
+
+def _submit(*args):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mongo-explain")
+        return _executor.submit(_explain, *args)
+
+
+def _should_explain(key):
+    now = time.monotonic()
+    with _executor_lock:
+        last = _explained.get(key)
+        if last is not None and now - last < settings.SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        _explained[key] = now
+        return True
+
+
+# -----------------------------
+# Listener
+# -----------------------------
+class SlowQueryListener(monitoring.CommandListener):
+    def __init__(self):
+        self._pending = {}
+
+    def started(self, event):
+        if event.command_name not in settings.SLOW_QUERY_COMMANDS or perf.current() is None:
+            return
+        self._pending[(event.connection_id, event.request_id)] = (event.database_name, event.command)
+
+    def succeeded(self, event):
+        self._finished(event)
+
+    def failed(self, event):
+        self._finished(event)
+
+    def _finished(self, event):
+        pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        duration_ms = event.duration_micros / 1000
+        if duration_ms < settings.SLOW_QUERY_MS:
+            return
+
+        database_name, command = pending
+        stats = perf.current()
+        query, sort = _statement(event.command_name, command)
+        context = {
+            "slow_query": event.command_name,
+            "collection": command.get(event.command_name),
+            "view": stats.view_name if stats else None,
+            "ms": round(duration_ms, 1),
+            "filter": shape(query),
+            "sort": dict(sort) if sort else None,
+        }
+        logger.warning(json.dumps(context, separators=(",", ":"), default=str))
+
+        key = json.dumps([context["slow_query"], context["collection"], context["filter"], context["sort"]], default=str)
+        if settings.SLOW_QUERY_EXPLAIN and _should_explain(key):
+            _submit(database_name, event.command_name, command, context)
+
+
+slow_query_listener = SlowQueryListener()
@@ -0,0 +1,72 @@
+# putsf_backend/testing.py
+"""
+Shared test case for views and helpers that talk to MongoDB.
+
+``MongoTestCase`` points the shared client at an in-memory mongomock
+database (``mongomock`` is only needed to run the tests). It also gives
+every test:
+- an empty local-memory cache;
+- its own temporary ``MEDIA_ROOT`` and resize cache;
+- no background threads or throttling, unless the test class or method
+  turns them on with ``override_settings``.
+
+Usage::
+
+    class LicenseListTests(MongoTestCase):
+        def test_first_page(self):
+            self.db.licenses.insert_one({...})
+            response = self.client.get("/api/license/")
+
+``login()`` authenticates the client as an admin for the endpoints that
+require it.
+"""
+import shutil
+import tempfile
+from unittest import mock
+
+import mongomock
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import override_settings
+from rest_framework.test import APITestCase
+
+from putsf_backend.core import indexes
+
+TEST_SETTINGS = {
+    "CACHES": {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "putsf-tests"}},
+    "MONGO_WARM_UP": False,
+    "PHONE_REGISTRY_ENABLED": False,
+    "COMPLAINT_OUTBOX_DRAIN": False,
+    "IMAGE_VARIANTS_ENABLED": False,
+    "THROTTLE_ENABLED": False,
+    "PERF_LOG": False,
+}
+
+
+@override_settings(**TEST_SETTINGS)
+class MongoTestCase(APITestCase):
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp(prefix="putsf-media-")
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        resize_cache = tempfile.mkdtemp(prefix="putsf-resize-")
+        self.addCleanup(shutil.rmtree, resize_cache, ignore_errors=True)
+
+        overrides = override_settings(MEDIA_ROOT=media_root, IMAGE_RESIZE_CACHE_DIR=resize_cache)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        caches["default"].clear()
+
+        self.db = mongomock.MongoClient()["putsf_test"]
+        patcher = mock.patch("putsf_backend.mongo.get_db", return_value=self.db)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        indexes._present.clear()
+
+    def login(self):
+        """Authenticate the test client as an admin user."""
+        user = get_user_model().objects.create_user(
+            email="admin@example.com", username="admin", password="unused"
+        )
+        self.client.force_authenticate(user)
+        return user
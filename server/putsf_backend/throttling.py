@@ -0,0 +1,157 @@
+# putsf_backend/throttling.py
+"""
+Token-bucket throttles for the public write endpoints.
+
+Each endpoint names a scope. ``settings.THROTTLE_RATES[scope]`` gives a
+rate per key kind, e.g. ``{"ip": "10/min", "phone": "3/hour"}``: a bucket
+holds up to N tokens and refills at N per period, so a client can burst N
+requests and then continues at the steady rate. Buckets live in the
+``THROTTLE_CACHE_ALIAS`` cache, so the limits hold across gunicorn
+workers on one host with the file cache, or across hosts with memcached.
+Bucket updates are read-modify-write, like DRF's own throttles; two
+workers racing on one key can let an extra request through.
+
+Throttles run in ``APIView.initial()``, before the body is parsed. The
+per-IP bucket is checked first, and a rejected request stops there.
+Rejections are counted per scope and kind (``rejection_counts()``, logged
+when ``/readyz`` fails).
+
+Usage::
+
+    class ComplaintViewSet(ThrottleMixin, viewsets.ModelViewSet):
+        throttle_classes = [IPTokenBucket, PhoneTokenBucket]
+
+        @property
+        def throttle_scope(self):
+            return "complaint" if self.action == "create" else None
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import exceptions
+from rest_framework.response import Response
+from rest_framework.throttling import BaseThrottle
+
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """``"10/min"`` -> ``(10, 60)``: capacity and the seconds it takes to refill."""
+    count, period = rate.split("/")
+    return int(count), _PERIODS[period.strip()[0]]
+
+
+def _cache():
+    return caches[settings.THROTTLE_CACHE_ALIAS]
+
+
+def _rejection_key(scope, kind):
+    return f"throttle:rejected:{scope}:{kind}"
+
+
+def rejection_counts():
+    """``{scope: {kind: rejected requests}}`` for every configured scope."""
+    cache = _cache()
+    keys = {
+        _rejection_key(scope, kind): (scope, kind)
+        for scope, rates in settings.THROTTLE_RATES.items()
+        for kind in rates
+    }
+    values = cache.get_many(list(keys))
+    counts = {}
+    for key, (scope, kind) in keys.items():
+        counts.setdefault(scope, {})[kind] = values.get(key, 0)
+    return counts
+
+
+class TokenBucketThrottle(BaseThrottle):
+    kind = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_seconds = None
+        if not settings.THROTTLE_ENABLED:
+            return True
+        scope = getattr(view, "throttle_scope", None)
+        rate = settings.THROTTLE_RATES.get(scope, {}).get(self.kind) if scope else None
+        if not rate:
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        refill = capacity / period  # tokens per second
+        cache_key = f"throttle:{scope}:{self.kind}:{key}"
+        cache = _cache()
+        now = time.time()
+
+        tokens, updated = cache.get(cache_key) or (capacity, now)
+        tokens = min(capacity, tokens + (now - updated) * refill)
+        if tokens < 1:
+            self.wait_seconds = (1 - tokens) / refill
+            self._count_rejection(cache, scope)
+            return False
+        # An untouched bucket is full again after one period
+        cache.set(cache_key, (tokens - 1, now), period)
+        return True
+
+    def _count_rejection(self, cache, scope):
+        key = _rejection_key(scope, self.kind)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 0, None)
+            cache.incr(key)
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class IPTokenBucket(TokenBucketThrottle):
+    """Keyed by client address (``X-Forwarded-For`` per ``REST_FRAMEWORK["NUM_PROXIES"]``)."""
+    kind = "ip"
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class PhoneTokenBucket(TokenBucketThrottle):
+    """
+    Keyed by the normalised ``phone`` of the query string or the body. The
+    bodies of upload views (``upload_limits``) are not parsed for it; those
+    endpoints rely on the per-IP bucket and on ``phone_unique``.
+    """
+    kind = "phone"
+
+    def get_key(self, request, view):
+        phone = request.query_params.get("phone")
+        if phone is None and getattr(view, "upload_limits", None) is None:
+            data = request.data
+            phone = data.get("phone") if hasattr(data, "get") else None
+        phone = "".join(filter(str.isdigit, str(phone or "")))
+        return phone or None
+
+
+class ThrottleMixin:
+    """
+    Check throttles in order and stop at the first rejection, so a request
+    refused per IP never has its body parsed or spends a phone token.
+    Rejections get the views' ``{"error": ...}`` shape and ``Retry-After``.
+    """
+
+    def check_throttles(self, request):
+        for throttle in self.get_throttles():
+            if not throttle.allow_request(request, self):
+                self.throttled(request, throttle.wait())
+
+    def handle_exception(self, exc):
+        if isinstance(exc, exceptions.Throttled):
+            response = Response({"error": "Too many requests. Please try again later."}, status=exc.status_code)
+            if exc.wait is not None:
+                response["Retry-After"] = str(int(exc.wait) + 1)
+            return response
+        return super().handle_exception(exc)
@@ -0,0 +1,150 @@
+# putsf_backend/uploads.py
+"""
+Streaming upload handling for the media endpoints.
+
+``MediaUploadHandler`` replaces Django's memory/temp-file handlers on the
+views that accept images. Each file part is written straight into a temp
+file inside the blob directory and hashed as it arrives, so
+``media.store`` only has to ``os.replace`` it into place: every byte hits
+the disk once, and nothing is left half-written if the request dies
+(the temp file is unlinked when the request's files are closed).
+
+Limits are checked before anything is buffered: the request's
+Content-Length against the endpoint's maximum, then each part's type and
+extension, then the running size of each file.
+
+Usage::
+
+    class GalleryImageAPIView(UploadLimitMixin, APIView):
+        upload_limits = UploadLimits("gallery")
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopFutureHandlers
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+
+from putsf_backend import metrics
+
+# Room for the multipart boundaries and the non-file form fields
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class RequestEntityTooLarge(exceptions.APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "Upload too large."
+    default_code = "too_large"
+
+
+class UploadLimits:
+    """Size and type limits of one endpoint (see ``settings.UPLOAD_MAX_BYTES``)."""
+
+    def __init__(self, endpoint, content_types=None, extensions=None):
+        self.endpoint = endpoint
+        self.content_types = tuple(content_types or settings.UPLOAD_IMAGE_TYPES)
+        self.extensions = tuple(extensions or settings.UPLOAD_IMAGE_EXTENSIONS)
+
+    @property
+    def max_bytes(self):
+        return settings.UPLOAD_MAX_BYTES[self.endpoint]
+
+    def check_size(self, size):
+        if size is not None and size > self.max_bytes:
+            raise RequestEntityTooLarge(
+                f"Upload exceeds the {self.max_bytes / (1024 * 1024):.1f} MB limit for {self.endpoint}."
+            )
+
+    def check_type(self, file_name, content_type):
+        ext = os.path.splitext(file_name or "")[1].lower()
+        if content_type not in self.content_types or ext not in self.extensions:
+            raise exceptions.UnsupportedMediaType(
+                content_type, detail=f"Unsupported file type: {content_type or 'unknown'} ({ext or 'no extension'})."
+            )
+
+
+class MediaUploadedFile(TemporaryUploadedFile):
+    """A spooled upload whose bytes are already hashed (``sha256``)."""
+
+    def __init__(self, file, name, content_type, charset, content_type_extra=None):
+        UploadedFile.__init__(self, file, name, content_type, 0, charset, content_type_extra)
+        self.sha256 = None
+
+
+def upload_dir():
+    """Where uploads are spooled: the blob directory, so placing them is a rename."""
+    from putsf_backend.media import BLOB_DIR
+
+    return os.path.join(settings.MEDIA_ROOT, BLOB_DIR)
+
+
+class MediaUploadHandler(FileUploadHandler):
+    def __init__(self, request=None, limits=None):
+        super().__init__(request)
+        self.limits = limits
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Reject oversized bodies before reading a single byte
+        if content_length is not None:
+            self.limits.check_size(content_length - FORM_OVERHEAD_BYTES)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.limits.check_type(self.file_name, self.content_type)
+
+        directory = upload_dir()
+        os.makedirs(directory, exist_ok=True)
+        spool = tempfile.NamedTemporaryFile(suffix=".upload", dir=directory)
+        self.file = MediaUploadedFile(spool, self.file_name, self.content_type, self.charset, self.content_type_extra)
+        self.sha = hashlib.sha256()
+        self.received = 0
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.limits.max_bytes:
+            self.file.close()
+            self.limits.check_size(self.received)
+        self.sha.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.sha.hexdigest()
+        metrics.upload(self.limits.endpoint, file_size)
+        return self.file
+
+    def upload_interrupted(self):
+        if hasattr(self, "file"):
+            self.file.close()
+
+
+class UploadLimitMixin:
+    """
+    Install ``MediaUploadHandler`` with the view's ``upload_limits``.
+
+    The body is parsed in ``initial()`` so a limit violation is answered
+    with 413/415 before the handler method runs.
+    """
+    upload_limits = None
+
+    def initialize_request(self, request, *args, **kwargs):
+        if self.upload_limits is not None:
+            request.upload_handlers = [MediaUploadHandler(request, self.upload_limits)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.upload_limits is not None and request.method in ("POST", "PUT", "PATCH"):
+            request.data
+
+    def handle_exception(self, exc):
+        # Same {"error": ...} shape as the views' own validation errors
+        if isinstance(exc, (RequestEntityTooLarge, exceptions.UnsupportedMediaType)):
+            return Response({"error": str(exc.detail)}, status=exc.status_code)
+        return super().handle_exception(exc)
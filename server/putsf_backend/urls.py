@@ -1,12 +1,19 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, re_path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from .views import home
+from .metrics import metrics
+from .views import home, healthz, readyz, export, serve_media, resize_media
 
 urlpatterns = [
     path("", home, name="home"),
+    path("healthz", healthz, name="healthz"),
+    path("readyz", readyz, name="readyz"),
+    path("metrics", metrics, name="metrics"),
     path("admin-django/", admin.site.urls),
+    path("api/export/<slug:dataset>.<slug:fmt>", export, name="export"),
     path("api/admin/", include("putsf_backend.accounts.urls")),
     path("api/gallery/", include("putsf_backend.gallery.urls")),
     path("api/", include("putsf_backend.banner.urls")),
@@ -15,6 +22,19 @@ urlpatterns = [
     path("api/", include("putsf_backend.complaints.urls")),
     ]
 
+# Crops are always rendered by Django; the proxy must pass MEDIA_URL/resize/ through
+urlpatterns += [
+    re_path(
+        rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}resize/(?P<width>\d{{1,4}})x(?P<height>\d{{1,4}})/(?P<path>.+)$",
+        resize_media,
+        name="media-resize",
+    ),
+]
+
+if settings.MEDIA_SERVE:
+    urlpatterns += [
+        re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.+)$", serve_media, name="media"),
+    ]
+
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATICFILES_DIRS[0])
\ No newline at end of file
@@ -1,4 +1,241 @@
-from django.http import HttpResponse
+import datetime
+import json
+import logging
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import DatabaseError
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+from pymongo.errors import PyMongoError
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from putsf_backend import media, mongo, resize, throttling
+from putsf_backend.exports import EXPORT_FORMATS, ExportError, export_chunks
+
+logger = logging.getLogger(__name__)
+
 
 def home(request):
     return HttpResponse("Welcome to Putsf!")
+
+
+def healthz(request):
+    """Liveness: the worker is up and serving. Never touches MongoDB."""
+    return JsonResponse({"status": "ok"})
+
+
+def readyz(request):
+    """
+    Readiness: MongoDB is reachable (ping result is cached for a few seconds).
+
+    The probe is public, so it only answers the status. The Mongo error
+    (which can name hosts), pool stats and throttle rejections are logged.
+    """
+    health = mongo.check_health()
+    if not health["ok"]:
+        logger.warning("⚠️ Not ready: %s", json.dumps({
+            "mongo_error": health["error"],
+            "latency_ms": health["latency_ms"],
+            "pool": mongo.pool_stats(),
+            "throttle_rejections": throttling.rejection_counts(),
+        }, default=str))
+    return JsonResponse(
+        {"status": "ok" if health["ok"] else "unavailable"},
+        status=200 if health["ok"] else 503,
+    )
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def export(request, dataset, fmt):
+    """
+    Stream a dataset as CSV or NDJSON (admin only).
+
+    GET /api/export/licenses.csv?is_approved=true&fields=name,phone
+    Every query parameter other than ``fields`` is a filter. The first
+    batch is read before the response starts, so a failing query gets a
+    503; a failure on a later batch cuts the download short.
+    """
+    params = request.query_params
+    fields = [f.strip() for f in params.get("fields", "").split(",") if f.strip()]
+    filters = {key: value for key, value in params.items() if key != "fields"}
+
+    try:
+        chunks = export_chunks(dataset, fmt, filters, fields)
+    except ExportError as e:
+        return Response({"error": str(e)}, status=400)
+    except (PyMongoError, DatabaseError) as e:
+        return Response({"error": f"Export failed: {e}"}, status=503)
+
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[fmt])
+    stamp = datetime.date.today().isoformat()
+    response["Content-Disposition"] = f'attachment; filename="putsf_{dataset}_{stamp}.{fmt}"'
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+# =========================================
+# Media delivery
+# =========================================
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class _FileRange:
+    """Read-only view of ``length`` bytes of ``file`` starting at ``start``."""
+
+    def __init__(self, file, start, length):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+
+    # No fileno(): gunicorn's sendfile would ignore the offset
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def _byte_range(header, size):
+    """``(start, end)`` (inclusive) for a single ``Range`` header, None to ignore, False if unsatisfiable."""
+    match = _RANGE.match(header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if match.group(1):
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    else:
+        start, end = max(size - int(match.group(2)), 0), size - 1
+    if start > end or start >= size:
+        return False
+    return start, end
+
+
+def _cache_headers(response, rel, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    if media.is_fingerprinted(rel):
+        # The URL changes whenever the bytes do
+        scope = "private" if rel.startswith(settings.LICENSE_CARD_DIR) else "public"
+        response["Cache-Control"] = f"{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response["Cache-Control"] = f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """
+    Serve a file from ``MEDIA_ROOT``.
+
+    With ``MEDIA_ACCEL`` set, Django only authorises the request and sets
+    the caching headers; the front proxy sends the bytes (nginx
+    ``X-Accel-Redirect`` to an ``internal`` location aliased to
+    ``MEDIA_ROOT``, or Apache/lighttpd ``X-Sendfile``). Otherwise the file
+    goes out through ``FileResponse`` (sendfile under gunicorn), with
+    single-range ``Range`` support.
+    """
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Not found")
+    rel = os.path.relpath(full_path, settings.MEDIA_ROOT)
+    if any(part.startswith(".") for part in rel.split(os.sep)) or not os.path.isfile(full_path):
+        raise Http404("Not found")
+
+    stat = os.stat(full_path)
+    etag = quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+    last_modified = int(stat.st_mtime)
+    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return _cache_headers(not_modified, rel, etag, last_modified)
+
+    if settings.MEDIA_ACCEL == "x-accel-redirect":
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = quote(settings.MEDIA_ACCEL_PREFIX + rel.replace(os.sep, "/"))
+        return _cache_headers(response, rel, etag, last_modified)
+    if settings.MEDIA_ACCEL == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = full_path
+        return _cache_headers(response, rel, etag, last_modified)
+
+    byte_range = None
+    if request.META.get("HTTP_RANGE") and request.META.get("HTTP_IF_RANGE", etag) == etag:
+        byte_range = _byte_range(request.META["HTTP_RANGE"], stat.st_size)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        response = FileResponse(_FileRange(open(full_path, "rb"), start, end - start + 1),
+                                content_type=content_type, status=206)
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    else:
+        response = FileResponse(open(full_path, "rb"), content_type=content_type)
+    response["Accept-Ranges"] = "bytes"
+    return _cache_headers(response, rel, etag, last_modified)
+
+
+@require_safe
+def resize_media(request, width, height, path):
+    """
+    A ``width`` x ``height`` crop of an image under ``MEDIA_ROOT``.
+
+    Only sizes in ``IMAGE_RESIZE_SIZES`` exist; anything else is a 404.
+    The first request renders the crop into the resize cache, later ones
+    are sent from there. WebP goes to clients that accept it, JPEG to the
+    rest. Crops of fingerprinted files are as immutable as their source.
+    """
+    if not resize.allowed(width, height):
+        raise Http404("Not found")
+    width, height = int(width), int(height)
+    try:
+        source = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Not found")
+    rel = os.path.relpath(source, settings.MEDIA_ROOT)
+    if (
+        any(part.startswith(".") for part in rel.split(os.sep))
+        or os.path.splitext(rel)[1].lower() not in settings.UPLOAD_IMAGE_EXTENSIONS
+        or not os.path.isfile(source)
+    ):
+        raise Http404("Not found")
+
+    fmt = "webp" if "image/webp" in request.META.get("HTTP_ACCEPT", "") else "jpeg"
+    cached = resize.cache_path(source, width, height, fmt)
+    etag = quote_etag(os.path.splitext(os.path.basename(cached))[0][:32])
+    last_modified = int(os.stat(source).st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        try:
+            f = resize.get(source, width, height, fmt)
+        except (OSError, ValueError) as e:
+            # Pillow raises OSError/ValueError for files it can't decode
+            raise Http404(f"Cannot resize: {e}")
+        response = FileResponse(f, content_type=resize.FORMATS[fmt][2])
+        response["Content-Length"] = os.fstat(f.fileno()).st_size
+    response["Vary"] = "Accept"
+    return _cache_headers(response, rel, etag, last_modified)
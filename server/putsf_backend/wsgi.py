@@ -27,6 +27,12 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'putsf_backend.settings')
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
 
+# ----------------------------
+# Background threads (server processes only)
+# ----------------------------
+from putsf_backend import background
+background.start()
+
 # ----------------------------
 # Optional: print Python version for debug
 # ----------------------------